@@ -109,7 +109,7 @@ class aMSNContactListManager:
         f = os.fdopen(fno, 'w+b')
         f.write(msn_object._data.read())
         f.close()
-        c.dp.load("Filename", tf)
+        c.dp = ImageView("Filename", tf)
         self.emit(self.AMSNCONTACT_UPDATED, c)
         #2nd/ update the ContactView
         cv = ContactView(self._core, c)
@@ -134,19 +134,32 @@ class aMSNContactListManager:
     They are stored in that structure so that there's no need to create them
     everytime
 """
-class aMSNContact():
+class aMSNContact(object):
+    __slots__ = ('uid', 'icon', 'dp', 'emblem', 'nickname', 'personal_message',
+                 'current_media', 'status', '_pymsn_contact')
+
+    # the views only depending on the presence are shared by all the
+    # contacts, they are replaced and never modified
+    _presence_views = {}
+    _default_dp = ImageView("Theme", "dp_nopic")
+
     def __init__(self, core, pymsn_contact):
         self.uid = pymsn_contact.id
+        #TODO: for the moment, use default dp
+        self.dp = self._default_dp
         self.fill(core, pymsn_contact)
 
     def fill(self, core, pymsn_contact):
-        self.icon = ImageView()
-        self.icon.load("Theme","buddy_" + core.p2s[pymsn_contact.presence])
-        self.dp = ImageView()
-        #TODO: for the moment, use default dp
-        self.dp.load("Theme", "dp_nopic")
-        self.emblem = ImageView()
-        self.emblem.load("Theme", "emblem_" + core.p2s[pymsn_contact.presence])
+        presence = core.p2s[pymsn_contact.presence]
+        views = self._presence_views.get(presence, None)
+        if views is None:
+            status = StringView()
+            status.appendText(presence)
+            views = (ImageView("Theme", "buddy_" + presence),
+                     ImageView("Theme", "emblem_" + presence),
+                     status)
+            self._presence_views[presence] = views
+        self.icon, self.emblem, self.status = views
         #TODO: PARSE ONLY ONCE
         self.nickname = StringView()
         self.nickname.appendText(pymsn_contact.display_name)
@@ -154,8 +167,6 @@ class aMSNContact():
         self.personal_message.appendText(pymsn_contact.personal_message)
         self.current_media = StringView()
         self.current_media.appendText(pymsn_contact.current_media)
-        self.status = StringView()
-        self.status.appendText(core.p2s[pymsn_contact.presence])
         #for the moment, we store the pymsn_contact object, but we shouldn't have to
         #TODO: getPymsnContact(self, core...) or _pymsn_contact?
         self._pymsn_contact = pymsn_contact
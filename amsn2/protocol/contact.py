@@ -8,6 +8,7 @@ class ContactEvents(pymsn.event.ContactEventInterface):
         self._contact_manager = contact_manager
         pymsn.event.ContactEventInterface.__init__(self, client)
         
-    def on_contact_presence_changed(self, contact):
+    def on_contact_properties_changed(self, contact, properties):
+        # a single view update for all the changes of a burst
         self._contact_manager.onContactPresenceChanged(contact)
 
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+"""Measures the memory used by the contacts of a large address book, as
+the growth of the resident set size while building them, and reports it
+in bytes per contact."""
+
+import os
+import resource
+import sys
+
+import pymsn.profile as profile
+
+CONTACTS = 100000
+DOMAINS = ("hotmail.com", "live.com", "msn.com", "example.com")
+PRESENCES = (profile.Presence.ONLINE, profile.Presence.AWAY,
+        profile.Presence.BUSY, profile.Presence.OFFLINE)
+
+def build_contacts(count):
+    contacts = []
+    for i in xrange(count):
+        account = "contact%d@%s" % (i, DOMAINS[i % len(DOMAINS)])
+        contact = profile.Contact("00000000-0000-0000-0000-%012d" % i,
+                profile.NetworkID.MSN, account, "Contact %d" % i,
+                memberships=profile.Membership.FORWARD |
+                    profile.Membership.ALLOW)
+        # presence strings come from the network, each one a new object
+        presence = "".join(PRESENCES[i % len(PRESENCES)])
+        contact._server_property_changed("presence", presence)
+        contacts.append(contact)
+    return contacts
+
+def measure(count):
+    """Returns the peak memory growth in bytes, measured in a child
+    process so that the runs do not share their heap"""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        contacts = build_contacts(count)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+        os.write(write_fd, "%d" % (peak * 1024))
+        os._exit(0)
+    os.close(write_fd)
+    result = os.read(read_fd, 64)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    return int(result)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    else:
+        count = CONTACTS
+    growth = measure(count)
+    print "%d contacts: %d KiB, %d bytes per contact" % (count,
+            growth / 1024, growth / count)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+
+"""Measures the cost of building the SOAP requests of every service, with
+the precompiled templates and with the former whole-request compress_xml
+pass, then the cost of parsing and decoding a large ABFindAll response
+with and without the namespace annotations, and when the contacts are
+decoded while parsing."""
+
+import os
+import resource
+import timeit
+
+import pymsn.service.SOAPService as SOAPService
+from pymsn.service.SOAPUtils import compress_xml
+from pymsn.service import description
+from pymsn.service.AddressBook import ab
+
+ITERATIONS = 5000
+
+TOKEN = "t=token&p=proof"
+
+headers = {
+    "AB" : (description.AB.common.soap_header, ("Initial", TOKEN)),
+    "Sharing" : (description.Sharing.common.soap_header, ("Initial", TOKEN)),
+    "SingleSignOn" : (description.SingleSignOn.RequestMultipleSecurityTokens.\
+        soap_header, ("alice@example.com", "password")),
+    "RSI" : (description.RSI.common.soap_header, (TOKEN,)),
+    "OIM" : (description.OIM.Store2.soap_header,
+        ("alice@example.com", "=?utf-8?B?QWxpY2U=?=", "MSNMSGR",
+            "MSNP15", "8.1.0178", "bob@example.com", 1, TOKEN,
+            "PROD0119GSJUC$18", "0123456789abcdef0123456789abcdef")),
+    "SchematizedStore" : (description.SchematizedStore.common.soap_header,
+        ("Initial", TOKEN)),
+    "Spaces" : (description.Spaces.GetXmlFeed.soap_header, (TOKEN,)),
+    }
+
+# every request built from the templates minified by compress_xml, the
+# arguments reaching every optional template
+LiveService = description.SingleSignOn.RequestMultipleSecurityTokens.\
+        LiveService
+requests = {
+    "ABAdd" : ("AB", description.AB.ABAdd, ("alice@example.com",)),
+    "ABFindAll" : ("AB", description.AB.ABFindAll,
+        ("true", "2008-01-01T00:00:00.0000000-08:00")),
+    "ABContactAdd" : ("AB", description.AB.ABContactAdd,
+        ("alice@example.com", "true", "LivePending", "Alice", "Smith",
+            "1980-01-01T00:00:00", {"ContactEmailPersonal" :
+                "alice@example.com"},
+            {"ContactPhonePersonal" : "0123456789"},
+            {"ContactLocationPersonal" : {"city" : "Paris"}}, None,
+            {"MSN.IM.GTC" : "1"}, "a comment", "2008/01/01",
+            "Bob", "Hi Alice, please add me", 0)),
+    "ABContactUpdate" : ("AB", description.AB.ABContactUpdate,
+        ("00000000-0000-0000-0000-000000000001", "Alice", "true", "Regular",
+            "Alice", "Smith", "1980-01-01T00:00:00",
+            {"ContactEmailPersonal" : "alice@example.com"},
+            {"ContactPhonePersonal" : "0123456789"},
+            {"ContactLocationPersonal" : {"city" : "Paris"}}, None,
+            {"MSN.IM.GTC" : "1", "MSN.IM.BLP" : ""}, "a comment",
+            "2008/01/01", "false")),
+    "ABContactDelete" : ("AB", description.AB.ABContactDelete,
+        ("00000000-0000-0000-0000-000000000001",)),
+    "ABGroupAdd" : ("AB", description.AB.ABGroupAdd, ("Friends",)),
+    "ABGroupDelete" : ("AB", description.AB.ABGroupDelete,
+        ("00000000-0000-0000-0000-000000000002",)),
+    "ABGroupUpdate" : ("AB", description.AB.ABGroupUpdate,
+        ("00000000-0000-0000-0000-000000000002", "Family")),
+    "ABGroupContactAdd" : ("AB", description.AB.ABGroupContactAdd,
+        ("00000000-0000-0000-0000-000000000002",
+            "00000000-0000-0000-0000-000000000001")),
+    "ABGroupContactDelete" : ("AB", description.AB.ABGroupContactDelete,
+        ("00000000-0000-0000-0000-000000000002",
+            "00000000-0000-0000-0000-000000000001")),
+    "FindMembership" : ("Sharing", description.Sharing.FindMembership,
+        (["Messenger", "Invitation", "SocialNetwork", "Space", "Profile"],
+            True, "2008-01-01T00:00:00.0000000-08:00")),
+    "AddMember" : ("Sharing", description.Sharing.AddMember,
+        ("Block", "Passport", "Accepted", "alice@example.com")),
+    "DeleteMember" : ("Sharing", description.Sharing.DeleteMember,
+        ("Allow", "Passport", "Accepted", "alice@example.com")),
+    "RequestMultipleSecurityTokens" : ("SingleSignOn",
+        description.SingleSignOn.RequestMultipleSecurityTokens,
+        (LiveService.MESSENGER_CLEAR, LiveService.CONTACTS,
+            LiveService.TB)),
+    "GetMetadata" : ("RSI", description.RSI.GetMetadata, ()),
+    "GetMessage" : ("RSI", description.RSI.GetMessage,
+        ("00000000-0000-0000-0000-000000000003", "false")),
+    "DeleteMessages" : ("RSI", description.RSI.DeleteMessages,
+        (["00000000-0000-0000-0000-000000000003",
+            "00000000-0000-0000-0000-000000000004"],)),
+    "Store2" : ("OIM", description.OIM.Store2,
+        ("text", "MIME-Version: 1.0\r\nContent-Type: text/plain; "
+            "charset=UTF-8\r\n\r\nSGVsbG8=")),
+    "GetProfile" : ("SchematizedStore",
+        description.SchematizedStore.GetProfile,
+        ("1234567890", "true", "true", "true", "true", "true", "true",
+            "true", "true", "true", "true", "true")),
+    "UpdateProfile" : ("SchematizedStore",
+        description.SchematizedStore.UpdateProfile,
+        ("1234567890!101", "Alice", "Hello", 0)),
+    "CreateDocument" : ("SchematizedStore",
+        description.SchematizedStore.CreateDocument,
+        ("1234567890", "tile.png", "image/png", "iVBORw0KGgo=")),
+    "CreateRelationships" : ("SchematizedStore",
+        description.SchematizedStore.CreateRelationships,
+        ("1234567890!101", "1234567890!205")),
+    "DeleteRelationships" : ("SchematizedStore",
+        description.SchematizedStore.DeleteRelationships,
+        ("1234567890", None, "1234567890!205")),
+    "FindDocuments" : ("SchematizedStore",
+        description.SchematizedStore.FindDocuments, ("1234567890",)),
+    "GetXmlFeed" : ("Spaces", description.Spaces.GetXmlFeed,
+        ("1234567890",)),
+    }
+
+def build_request(service, method, args):
+    soap_header, header_args = headers[service]
+    soap_body = method.soap_body(*args)
+    return SOAPService.soap_template % (soap_header(*header_args), soap_body)
+
+def build_compressed_request(service, method, args):
+    return compress_xml(build_request(service, method, args))
+
+CONTACTS = 10000
+
+contact_template = """<Contact><contactId>%(guid)s</contactId>
+<contactInfo><annotations><Annotation><Name>MSN.IM.MBEA</Name><Value>0</Value>
+</Annotation><Annotation><Name>MSN.IM.GTC</Name><Value>1</Value></Annotation>
+<Annotation><Name>MSN.IM.Display</Name><Value>1</Value></Annotation>
+</annotations><contactType>Regular</contactType><quickName>contact%(id)d</quickName>
+<passportName>contact%(id)d@example.com</passportName><IsPassportNameHidden>false
+</IsPassportNameHidden><displayName>Contact %(id)d</displayName><puid>0</puid>
+<CID>%(id)d</CID><IsNotMobileVisible>false</IsNotMobileVisible>
+<isMobileIMEnabled>false</isMobileIMEnabled><isMessengerUser>true</isMessengerUser>
+<isFavorite>false</isFavorite><isSmtp>false</isSmtp><hasSpace>false</hasSpace>
+<spotWatchState>NoDevice</spotWatchState><birthdate>0001-01-01T00:00:00</birthdate>
+<primaryEmailType>ContactEmailPersonal</primaryEmailType>
+<PrimaryLocation>ContactLocationPersonal</PrimaryLocation>
+<PrimaryPhone>ContactPhonePersonal</PrimaryPhone><IsPrivate>false</IsPrivate>
+<Gender>Unspecified</Gender><TimeZone>None</TimeZone></contactInfo>
+<propertiesChanged /><fDeleted>false</fDeleted>
+<lastChange>2008-01-01T00:00:00.0000000-08:00</lastChange></Contact>"""
+
+def find_all_response(contacts):
+    contacts = "".join([contact_template % \
+            {'id' : i, 'guid' : "00000000-0000-0000-0000-%012d" % i} \
+            for i in range(contacts)])
+    return """<?xml version="1.0" encoding="utf-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"
+xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+xmlns:xsd="http://www.w3.org/2001/XMLSchema"><soap:Header>
+<ServiceHeader xmlns="http://www.msn.com/webservices/AddressBook">
+<Version>12.01.1111.0000</Version></ServiceHeader></soap:Header><soap:Body>
+<ABFindAllResponse xmlns="http://www.msn.com/webservices/AddressBook">
+<ABFindAllResult><groups /><contacts>%s</contacts><ab>
+<abId>00000000-0000-0000-0000-000000000000</abId>
+<lastChange>2008-01-01T00:00:00.0000000-08:00</lastChange></ab>
+</ABFindAllResult></ABFindAllResponse></soap:Body></soap:Envelope>""" % contacts
+
+def parse_find_all(data, annotate_namespaces, streamed):
+    if streamed:
+        decoders = ab.AB.RESPONSE_DECODERS["ABFindAll"]
+    else:
+        decoders = None
+    response = SOAPService.SOAPResponse(data, annotate_namespaces, decoders)
+    assert response.is_valid()
+    result, groups, contacts = \
+            description.AB.ABFindAll.process_response(response)
+    if not streamed:
+        groups = [ab.Group(group) for group in groups]
+        contacts = [ab.Contact(contact) for contact in contacts]
+    assert len(contacts) == CONTACTS
+    # the fields read by AddressBook when building its contacts
+    for contact in contacts:
+        contact.Id, contact.Type, contact.Groups, contact.Emails
+        contact.IsMessengerUser, contact.PassportName, contact.CID
+        contact.DisplayName, contact.QuickName, contact.Annotations
+    return response, groups, contacts
+
+def measure_parse(data, annotate_namespaces, streamed):
+    """Returns the parse and decode time and the peak memory growth in
+    KiB, measured in a child process so that the runs do not share
+    their heap"""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        timer = timeit.default_timer()
+        result = parse_find_all(data, annotate_namespaces, streamed)
+        timer = timeit.default_timer() - timer
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+        os.write(write_fd, "%f %d" % (timer, peak))
+        os._exit(0)
+    os.close(write_fd)
+    result = os.read(read_fd, 64)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    timer, peak = result.split()
+    return float(timer), int(peak)
+
+if __name__ == "__main__":
+    print "%-30s %12s %12s %8s" % ("method", "compress_xml", "precompiled",
+            "speedup")
+    for name in sorted(requests.keys()):
+        service, method, args = requests[name]
+        assert build_request(service, method, args) == \
+                build_compressed_request(service, method, args), name
+        before = timeit.Timer(lambda: build_compressed_request(service,
+                method, args))
+        after = timeit.Timer(lambda: build_request(service, method, args))
+        before = min(before.repeat(3, ITERATIONS)) / ITERATIONS * 1e6
+        after = min(after.repeat(3, ITERATIONS)) / ITERATIONS * 1e6
+        print "%-30s %10.1fus %10.1fus %7.1fx" % (name, before, after,
+                before / after)
+
+    data = find_all_response(CONTACTS)
+    print
+    print "ABFindAll response with %d contacts (%d KiB)" % (CONTACTS,
+            len(data) / 1024)
+    print "%-20s %12s %12s" % ("parser", "time", "peak memory")
+    for name, annotate_namespaces, streamed in (
+            ("annotated", True, False),
+            ("plain", False, False),
+            ("streamed", False, True)):
+        timer, peak = measure_parse(data, annotate_namespaces, streamed)
+        print "%-20s %10.0fms %9d KiB" % (name, timer * 1000, peak)
@@ -80,6 +80,7 @@ password was wrong, this will lead us to use the L{pymsn.event} interfaces:
 
 import pymsn.profile as profile
 import pymsn.msnp as msnp
+import pymsn.storage
 
 import pymsn.service.SingleSignOn as SSO
 import pymsn.service.AddressBook as AB
@@ -96,6 +97,7 @@ from pymsn.conversation import SwitchboardConversation, \
 from pymsn.event import ClientState, ClientErrorType, \
     AuthenticationError, EventsDispatcher
 
+import gobject
 import logging
 
 __all__ = ['Client']
@@ -106,7 +108,13 @@ class Client(EventsDispatcher):
     """This class provides way to connect to the notification server as well
     as methods to manage the contact list, and the personnal settings.
         @sort: __init__, login, logout, state, profile, address_book,
-                msn_object_store, oim_box, spaces"""
+                msn_object_store, oim_box, spaces
+
+        @ivar contact_events_window: time in milliseconds during which the
+            changes of the contacts are gathered before being dispatched as
+            a single event per contact, 0 dispatches them once per main
+            loop iteration
+        @type contact_events_window: integer"""
 
     def __init__(self, server, proxies={}, transport_class=DirectConnection):
         """Initializer
@@ -143,6 +151,13 @@ class Client(EventsDispatcher):
 
         self._sso = None
 
+        self.contact_events_window = 0
+        self.__contact_changes = {}
+        self.__changed_contacts = []
+        self.__contact_changes_source = None
+        self.__contact_events = False
+        profile.Contact._add_change_listener(self)
+
         self._profile = None
         self._address_book = None
         self._oim_box = None
@@ -252,29 +267,52 @@ class Client(EventsDispatcher):
         self.profile.connect("notify::current-media", property_changed)
         self.profile.connect("notify::msn-object", property_changed)
 
-    def __connect_contact_signals(self, contact):
-        """Connect contact signals"""
-        def event(contact, *args):
-            event_name = args[-1]
-            event_args = args[:-1]
-            method_name = "on_contact_%s" % event_name.replace("-", "_")
-            self._dispatch(method_name, contact, *event_args)
-
-        def property_changed(contact, pspec):
-            method_name = "on_contact_%s_changed" % pspec.name.replace("-", "_")
-            self._dispatch(method_name, contact)
+    _CONTACT_PROPERTIES = ("memberships", "presence", "display-name",
+            "personal-message", "current-media", "msn-object",
+            "client-capabilities")
 
-        contact.connect("notify::memberships", property_changed)
-        contact.connect("notify::presence", property_changed)
-        contact.connect("notify::display-name", property_changed)
-        contact.connect("notify::personal-message", property_changed)
-        contact.connect("notify::current-media", property_changed)
-        contact.connect("notify::msn-object", property_changed)
-        contact.connect("notify::client-capabilities", property_changed)
-
-        def connect_signal(name):
-            contact.connect(name, event, name)
-        connect_signal("infos-changed")
+    def _contact_changed(self, contact, name, *args):
+        """Called by L{Contact<pymsn.profile.Contact>} for the changes of
+        every contact, this avoids connecting to the signals of each of
+        them"""
+        if not self.__contact_events or self._address_book is None or \
+                contact not in self._address_book.contacts:
+            return
+        if name == "infos-changed":
+            self._dispatch("on_contact_infos_changed", contact, *args)
+        elif name in self._CONTACT_PROPERTIES:
+            self.__queue_contact_change(contact, name)
+
+    def __queue_contact_change(self, contact, property_name):
+        """Gathers the changes of a contact so that a burst of changes, like
+        the presence notifications received at login, results in a single
+        event per contact"""
+        changes = self.__contact_changes.get(contact, None)
+        if changes is None:
+            changes = self.__contact_changes[contact] = []
+            self.__changed_contacts.append(contact)
+        if property_name not in changes:
+            changes.append(property_name)
+
+        if self.__contact_changes_source is None:
+            if self.contact_events_window > 0:
+                self.__contact_changes_source = gobject.timeout_add(
+                        self.contact_events_window,
+                        self.__dispatch_contact_changes)
+            else:
+                self.__contact_changes_source = \
+                        gobject.idle_add(self.__dispatch_contact_changes)
+
+    def __dispatch_contact_changes(self):
+        self.__contact_changes_source = None
+        changes = self.__contact_changes
+        contacts = self.__changed_contacts
+        self.__contact_changes = {}
+        self.__changed_contacts = []
+        for contact in contacts:
+            self._dispatch("on_contact_properties_changed", contact,
+                    tuple(changes[contact]))
+        return False
 
     def __connect_transport_signals(self):
         """Connect transport signals"""
@@ -282,7 +320,10 @@ class Client(EventsDispatcher):
             self._sso = SSO.SingleSignOn(self.profile.account,
                                          self.profile.password,
                                          self._proxies)
-            self._address_book = AB.AddressBook(self._sso, self._proxies)
+            storage = pymsn.storage.get_storage(self.profile.account,
+                    self.profile.password, "address-book")
+            self._address_book = AB.AddressBook(self._sso, self._proxies,
+                    storage)
             self.__connect_addressbook_signals()
             self._oim_box = OIM.OfflineMessagesBox(self._sso, self, self._proxies)
             self.__connect_oim_box_signals()
@@ -295,9 +336,12 @@ class Client(EventsDispatcher):
             self._state = ClientState.CLOSED
 
         def disconnected(transp, reason):
+            if self._sso is not None:
+                self._sso.close()
             if not self.__die:
                 self._dispatch("on_client_error", ClientErrorType.NETWORK, reason)
             self.__die = False
+            self.__contact_events = False
             self._state = ClientState.CLOSED
 
         self._transport.connect("connection-success", connect_success)
@@ -318,9 +362,8 @@ class Client(EventsDispatcher):
                 self._state = ClientState.SYNCHRONIZED
             elif state == msnp.ProtocolState.OPEN:
                 self._state = ClientState.OPEN
-                im_contacts = self.address_book.contacts
-                for contact in im_contacts:
-                    self.__connect_contact_signals(contact)
+                self.__contact_events = True
+                self._switchboard_manager.fill_pool()
 
         def authentication_failed(proto):
             self._dispatch("on_client_error", ClientErrorType.AUTHENTICATION,
@@ -359,8 +402,6 @@ class Client(EventsDispatcher):
         def event(address_book, *args):
             event_name = args[-1]
             event_args = args[:-1]
-            if event_name == "messenger-contact-added":
-                self.__connect_contact_signals(event_args[0])
             method_name = "on_addressbook_%s" % event_name.replace("-", "_")
             self._dispatch(method_name, *event_args)
         def error(address_book, error_code):
@@ -29,9 +29,12 @@ import p2p
 from switchboard_manager import SwitchboardClient
 from pymsn.event import EventsDispatcher
 from pymsn.profile import NetworkID
+from pymsn.util.cache import LRUCache
+from pymsn.util.guid import generate_guid
 
 import logging
 import gobject
+import time
 from urllib import quote, unquote
 
 __all__ = ['Conversation', 'ConversationInterface', 'ConversationMessage', 'TextFormat']
@@ -281,32 +284,72 @@ class TextFormat(object):
 
 
 class AbstractConversation(ConversationInterface, EventsDispatcher):
+    """Base class of the conversations
+
+        @ivar typing_interval: minimum number of seconds between two typing
+            notifications sent, the repeated notifications received from a
+            contact during that interval are only dispatched once
+        @type typing_interval: integer
+
+        @cvar MAX_CHUNK_SIZE: the text messages larger than this number of
+            bytes are sent in several chunks, None if the protocol does not
+            support chunked messages
+        @cvar MAX_CHUNKS: the number of chunks above which a received
+            message is dropped"""
+
+    MAX_CHUNK_SIZE = None
+    MAX_CHUNKS = 64
+
     def __init__(self, client):
         self._client = client
         ConversationInterface.__init__(self)
         EventsDispatcher.__init__(self)
 
-        self.__last_received_msn_objects = {}
+        # account -> {alias -> MSNObject} announced to the participant
+        self.__announced_msn_objects = {}
+        # account -> {alias -> (xml, MSNObject)} announced by the participant
+        self.__received_msn_objects = {}
+
+        self.typing_interval = 5
+        self.__last_typing_sent = 0
+        # account -> time of the last typing notification dispatched
+        self.__last_typing_received = {}
+        # (account, message id) -> [first chunk, bodies, chunks count]
+        self.__partial_messages = LRUCache(8)
 
     def send_text_message(self, message):
         if len(message.msn_objects) > 0:
-            body = []
-            for alias, msn_object in message.msn_objects.iteritems():
-                self._client._msn_object_store.publish(msn_object)
-                body.append(alias.encode("utf-8"))
-                body.append(str(msn_object))
-                # FIXME : we need to distinguish animemoticon and emoticons
-                # and send the related msn objects in separated messages
-            self._send_message(("text/x-mms-animemoticon",), '\t'.join(body))
+            self.__announce_msn_objects(message.msn_objects)
+
+        # typing again after a message is notified right away
+        self.__last_typing_sent = 0
 
         content_type = ("text/plain","utf-8")
         body = message.content.encode("utf-8")
-        ack = msnp.MessageAcknowledgement.HALF
+        # acknowledged by the server, so that its delivery latency is
+        # measured and a lost message sent again
+        ack = msnp.MessageAcknowledgement.FULL
         headers = {}
         if message.formatting is not None: 
             headers["X-MMS-IM-Format"] = str(message.formatting)
 
-        self._send_message(content_type, body, headers, ack)
+        chunk_size = self.MAX_CHUNK_SIZE
+        if chunk_size is None or len(body) <= chunk_size:
+            self._send_message(content_type, body, headers, ack)
+            return
+
+        # the first chunk carries the headers, the others only the
+        # minimal ones, the id of the message and their index
+        message_id = "{%s}" % generate_guid()
+        chunks = (len(body) + chunk_size - 1) / chunk_size
+        headers["Message-ID"] = message_id
+        headers["Chunks"] = str(chunks)
+        self._send_message(content_type, body[:chunk_size], headers, ack)
+        for i in range(1, chunks):
+            headers = {"MIME-Version" : "1.0", "Message-ID" : message_id,
+                    "Chunk" : str(i)}
+            self._send_message(None,
+                    body[i * chunk_size:(i + 1) * chunk_size], headers, ack)
 
     def send_nudge(self):
         content_type = "text/x-msnmsgr-datacast"
@@ -315,6 +358,13 @@ class AbstractConversation(ConversationInterface, EventsDispatcher):
         self._send_message(content_type, body, ack=ack)
 
     def send_typing_notification(self):
+        now = time.time()
+        if now - self.__last_typing_sent < self.typing_interval:
+            return
+        # not worth opening a connection
+        if not self._can_send_control_message():
+            return
+        self.__last_typing_sent = now
         content_type = "text/x-msmsgscontrol"
         body = "\r\n\r\n".encode('UTF-8')
         headers = { "TypingUser" : self._client.profile.account.encode('UTF_8') }
@@ -331,13 +381,29 @@ class AbstractConversation(ConversationInterface, EventsDispatcher):
             ack=msnp.MessageAcknowledgement.HALF):
         raise NotImplementedError
 
+    def _can_send_control_message(self):
+        return True
+
+    def _recipients(self):
+        """Returns the contacts the messages are sent to"""
+        return self.participants
+
     def _on_contact_joined(self, contact):
+        # a new client of the contact does not know our emoticons
+        self.__announced_msn_objects.pop(contact.account, None)
+        self.__received_msn_objects.pop(contact.account, None)
         self._dispatch("on_conversation_user_joined", contact)
 
     def _on_contact_left(self, contact):
+        self.__announced_msn_objects.pop(contact.account, None)
+        self.__received_msn_objects.pop(contact.account, None)
         self._dispatch("on_conversation_user_left", contact)
     
     def _on_message_received(self, message):
+        if 'Message-ID' in message.headers:
+            message = self.__reassemble_message(message)
+            if message is None:
+                return
         sender = message.sender
         message_type = message.content_type[0]
         message_encoding = message.content_type[1]
@@ -347,28 +413,42 @@ class AbstractConversation(ConversationInterface, EventsDispatcher):
             message_formatting = '='
 
         if message_type == 'text/plain':
-            msg = ConversationMessage(unicode(message.body, message_encoding),
-                    TextFormat.parse(message_formatting),
-                    self.__last_received_msn_objects)
+            # the emoticons are only announced once per conversation
+            msn_objects = {}
+            body = message.body
+            received = self.__received_msn_objects.get(sender.account, {})
+            for alias, (xml_data, msn_object) in received.iteritems():
+                if alias in body:
+                    msn_objects[alias] = msn_object
+            msg = ConversationMessage(unicode(body, message_encoding),
+                    TextFormat.parse(message_formatting), msn_objects)
             try:
                 display_name = message.get_header('P4-Context')
             except KeyError:
                 display_name = sender.display_name
             msg.display_name = display_name
+            self.__last_typing_received.pop(sender.account, None)
             self._dispatch("on_conversation_message_received", sender, msg)
-            self.__last_received_msn_objects = {}
         elif message_type == 'text/x-msmsgscontrol':
-            self._dispatch("on_conversation_user_typing", sender)
+            now = time.time()
+            last = self.__last_typing_received.get(sender.account, 0)
+            if now - last >= self.typing_interval:
+                self.__last_typing_received[sender.account] = now
+                self._dispatch("on_conversation_user_typing", sender)
         elif message_type in ['text/x-mms-emoticon', 
                               'text/x-mms-animemoticon']:
-            msn_objects = {}
+            received = self.__received_msn_objects.setdefault(
+                    sender.account, {})
             parts = message.body.split('\t')
             logger.debug(parts)
             for i in [i for i in range(len(parts)) if not i % 2]:
                 if parts[i] == '': break
-                msn_objects[parts[i]] = p2p.MSNObject.parse(self._client,
-                        parts[i+1])
-            self.__last_received_msn_objects = msn_objects
+                alias, xml_data = parts[i], parts[i+1]
+                known = received.get(alias, None)
+                if known is not None and known[0] == xml_data:
+                    continue
+                received[alias] = (xml_data,
+                        p2p.MSNObject.parse(self._client, xml_data))
         elif message_type == 'text/x-msnmsgr-datacast' and \
                 message.body.strip() == "ID: 1":
             self._dispatch("on_conversation_nudge_received", sender)
@@ -379,6 +459,73 @@ class AbstractConversation(ConversationInterface, EventsDispatcher):
     def _on_error(self, error_type, error):
         self._dispatch("on_conversation_error", error_type, error)
 
+    def __announce_msn_objects(self, msn_objects):
+        recipients = [contact.account for contact in self._recipients()]
+        entries = []
+        for alias, msn_object in msn_objects.iteritems():
+            for account in recipients:
+                announced = self.__announced_msn_objects.get(account, {})
+                if announced.get(alias, None) != msn_object:
+                    break
+            else:
+                continue
+            self._client._msn_object_store.publish(msn_object)
+            entries.append(alias.encode("utf-8") + '\t' + str(msn_object))
+            for account in recipients:
+                self.__announced_msn_objects.setdefault(account, {})\
+                        [alias] = msn_object
+        if len(entries) == 0:
+            return
+
+        # FIXME : we need to distinguish animemoticon and emoticons
+        # and send the related msn objects in separated messages
+        content_type = ("text/x-mms-animemoticon",)
+        size_limit = self.MAX_CHUNK_SIZE
+        body = []
+        size = 0
+        for entry in entries:
+            if size_limit is not None and len(body) > 0 and \
+                    size + len(entry) + 1 > size_limit:
+                self._send_message(content_type, '\t'.join(body))
+                body = []
+                size = 0
+            body.append(entry)
+            size += len(entry) + 1
+        self._send_message(content_type, '\t'.join(body))
+
+    def __reassemble_message(self, message):
+        """Returns the whole message once its last chunk is received, None
+        until then"""
+        key = (message.sender.account, message.headers['Message-ID'])
+        try:
+            if 'Chunks' in message.headers:
+                chunks = int(message.headers['Chunks'])
+                if chunks > self.MAX_CHUNKS:
+                    logger.warning("Dropping a message of %d chunks" % chunks)
+                    return None
+                self.__partial_messages[key] = [message, [message.body], chunks]
+            else:
+                partial = self.__partial_messages.get(key, None)
+                if partial is None:
+                    return None # the first chunks were lost
+                # the chunks arrive in order on the switchboard connection
+                if int(message.headers['Chunk']) != len(partial[1]):
+                    logger.warning("Dropping a message with missing chunks")
+                    del self.__partial_messages[key]
+                    return None
+                partial[1].append(message.body)
+        except (KeyError, ValueError):
+            logger.warning("Invalid message chunk")
+            self.__partial_messages.pop(key, None)
+            return None
+
+        message, bodies, chunks = self.__partial_messages[key]
+        if len(bodies) < chunks:
+            return None
+        del self.__partial_messages[key]
+        message.body = "".join(bodies)
+        return message
+
 
 class ExternalNetworkConversation(AbstractConversation):
     def __init__(self, client, contacts):
@@ -415,6 +562,15 @@ class ExternalNetworkConversation(AbstractConversation):
 
 
 class SwitchboardConversation(AbstractConversation, SwitchboardClient):
+    # the switchboard refuses the payloads larger than 1664 bytes
+    MAX_CHUNK_SIZE = 1400
+
+    _CONTENT_TYPES = ('text/plain', 'text/x-msmsgscontrol',
+            'text/x-msnmsgr-datacast', 'text/x-mms-emoticon',
+            'text/x-mms-animemoticon')
+    # the content types of the messages which may start a conversation
+    _OPENING_CONTENT_TYPES = ('text/plain', 'text/x-msnmsgr-datacast')
+
     def __init__(self, client, contacts):
         SwitchboardClient.__init__(self, client, contacts, priority=0)
         AbstractConversation.__init__(self, client)
@@ -423,11 +579,10 @@ class SwitchboardConversation(AbstractConversation, SwitchboardClient):
     def _can_handle_message(message, switchboard_client=None):
         content_type = message.content_type[0]
         if switchboard_client is None:
-            return content_type in ('text/plain', 'text/x-msnmsgr-datacast')
+            return content_type in \
+                    SwitchboardConversation._OPENING_CONTENT_TYPES
         # FIXME : we need to not filter those 'text/x-mms-emoticon', 'text/x-mms-animemoticon'
-        return content_type in ('text/plain', 'text/x-msmsgscontrol',
-                'text/x-msnmsgr-datacast', 'text/x-mms-emoticon',
-                'text/x-mms-animemoticon')
+        return content_type in SwitchboardConversation._CONTENT_TYPES
 
     def invite_user(self, contact):
         """Request a contact to join in the conversation.
@@ -444,4 +599,14 @@ class SwitchboardConversation(AbstractConversation, SwitchboardClient):
             ack=msnp.MessageAcknowledgement.HALF):
         SwitchboardClient._send_message(self, content_type, body, headers, ack)
 
+    def _recipients(self):
+        return self.total_participants
+
+    def _can_send_control_message(self):
+        try:
+            return self.switchboard is not None and \
+                    self.switchboard.state == msnp.ProtocolState.OPEN
+        except ReferenceError:
+            return False
+
 
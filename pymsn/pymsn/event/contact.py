@@ -37,6 +37,22 @@ class ContactEventInterface(BaseEventInterface):
             @type client: L{Client<pymsn.Client>}"""
         BaseEventInterface.__init__(self, client)
 
+    def on_contact_properties_changed(self, contact, properties):
+        """Called once for each contact whose properties changed during a
+        main loop iteration, or during the
+        L{contact_events_window<pymsn.Client.contact_events_window>}.
+
+        The default implementation calls the C{on_contact_*_changed}
+        method of each changed property, override it to handle a burst of
+        changes at once.
+            @param contact: the contact whose properties changed
+            @type contact: L{Contact<pymsn.profile.Contact>}
+            @param properties: the names of the changed properties
+            @type properties: tuple of strings"""
+        for name in properties:
+            self._dispatch_event("on_contact_%s_changed" % \
+                    name.replace("-", "_"), contact)
+
     def on_contact_memberships_changed(self, contact):
         """Called when the memberships of a contact changes.
             @param contact: the contact whose presence changed
@@ -38,13 +38,19 @@ class odict(DictMixin):
         self._keys.remove(key)
 
     def __setitem__(self, key, item):
-        self.data[key] = item
-        if key not in self._keys:
+        if key not in self.data:
             self._keys.append(key)
+        self.data[key] = item
 
     def keys(self):
         return self._keys[:]
 
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
 
 class HTTPMessage(object):
     """HTTP style message abstraction
@@ -83,13 +89,16 @@ class HTTPMessage(object):
             @type chunk: string"""
         self.clear()
 
-        lines = chunk.split("\r\n")
-        for i, line in enumerate(lines):
-            if line.strip() == "":
-                self.body = "\r\n".join(lines[i+1:])
-                break
-            name, value = line.split(":", 1)
-            self.add_header(name.rstrip(), value.lstrip())
+        # only the headers are split, the body may be large
+        if chunk.startswith("\r\n"):
+            head, body = "", chunk[2:]
+        else:
+            head, separator, body = chunk.partition("\r\n\r\n")
+        if head:
+            for line in head.split("\r\n"):
+                name, value = line.split(":", 1)
+                self.add_header(name.rstrip(), value.lstrip())
+        self.body = body
 
     def __str__(self):
         result = []
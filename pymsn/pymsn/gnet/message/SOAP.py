@@ -129,7 +129,8 @@ class SOAPRequest(object):
 
 
 class SOAPResponse(object):
-    def __init__(self, data):
+    def __init__(self, data, annotate_namespaces=False):
+        self._annotate_namespaces = annotate_namespaces
         self.tree = self._parse(data)
         self.header = self.tree.find(_SOAPSection.HEADER)
         self.body = self.tree.find(_SOAPSection.BODY)
@@ -138,6 +139,9 @@ class SOAPResponse(object):
         return self.tree.find(path)
 
     def _parse(self, data):
+        if not self._annotate_namespaces:
+            return ElementTree.XML(data)
+
         events = ("start", "end", "start-ns", "end-ns")
         ns = []
         data = StringIO.StringIO(data)
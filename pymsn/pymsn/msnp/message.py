@@ -53,17 +53,48 @@ class Message(HTTPMessage):
         @type headers: {header_name: string => header_value:string}
         
         @ivar content_type: the message content type
-        @type content_type: tuple(mime_type, encoding)"""
+        @type content_type: tuple(mime_type, encoding)
+
+        The received messages are only parsed when their headers or body
+        are first accessed."""
 
     def __init__(self, sender=None, message=""):
         """Initializer
             
             @param body: The body of the message, it is put after the headers
             @type body: string"""
+        self.__payload = None
+        self.__content_type_header = None
+        self.__content_type = None
         HTTPMessage.__init__(self)
         self.sender = sender
         if message:
-            self.parse(message)
+            self.__payload = message
+
+    def __parse_payload(self):
+        payload = self.__payload
+        self.__payload = None
+        HTTPMessage.parse(self, payload)
+
+    def parse(self, chunk):
+        self.__payload = None
+        HTTPMessage.parse(self, chunk)
+
+    def __get_headers(self):
+        if self.__payload is not None:
+            self.__parse_payload()
+        return self.__headers
+    def __set_headers(self, headers):
+        self.__headers = headers
+    headers = property(__get_headers, __set_headers)
+
+    def __get_body(self):
+        if self.__payload is not None:
+            self.__parse_payload()
+        return self.__body
+    def __set_body(self, body):
+        self.__body = body
+    body = property(__get_body, __set_body)
 
     def __repr__(self):
         """Represents the payload of the message"""
@@ -71,7 +102,8 @@ class Message(HTTPMessage):
         for header_name, header_value in self.headers.iteritems():
             message += '\t%s: %s\\r\\n\n' % (header_name, header_value)
         message += '\t\\r\\n\n'
-        if self.headers['Content-Type'] != "application/x-msnmsgrp2p":
+        # the continuation chunks have no Content-Type
+        if self.headers.get('Content-Type') != "application/x-msnmsgrp2p":
             message += '\t' + debug.escape_string(self.body).\
                     replace("\r\n", "\\r\\n\n\t")
         else:
@@ -92,8 +124,18 @@ class Message(HTTPMessage):
         return message.rstrip("\n\t")
 
     def __get_content_type(self):
-        if 'Content-Type' in self.headers:
-            content_type = self.headers['Content-Type'].split(';', 1)
+        header = self.headers.get('Content-Type', None)
+        # cached as long as the header is the same string
+        if header is not self.__content_type_header or \
+                self.__content_type is None:
+            self.__content_type_header = header
+            self.__content_type = self.__parse_content_type(header)
+        return self.__content_type
+
+    @staticmethod
+    def __parse_content_type(header):
+        if header is not None:
+            content_type = header.split(';', 1)
             if len(content_type) == 1:
                 return (content_type[0].strip(), 'UTF-8')
             mime_type = content_type[0].strip()
@@ -32,6 +32,7 @@ import pymsn
 from pymsn.gnet.message.HTTP import HTTPMessage
 from pymsn.util.queue import PriorityQueue, LastElementQueue
 from pymsn.util.decorator import throttled
+from pymsn.util.cache import LRUCache
 import pymsn.util.element_tree as ElementTree
 import pymsn.profile as profile
 import pymsn.service.SingleSignOn as SSO
@@ -39,6 +40,7 @@ import pymsn.service.AddressBook as AB
 import pymsn.service.OfflineIM as OIM
 
 import logging
+import re
 import urllib
 import gobject
 import xml.sax.saxutils as xml_utils
@@ -47,6 +49,83 @@ __all__ = ['NotificationProtocol']
 
 logger = logging.getLogger('protocol:notification')
 
+MAX_PAYLOAD_SIZE = 7500
+
+def _membership_payloads(groups, ml_attributes=""):
+    """Yields the <ml> payloads listing contacts, split so that each of
+    them is at most MAX_PAYLOAD_SIZE bytes long
+
+        @param groups: iterable of (start tag, end tag, contact nodes) where
+            the tags are those of a domain element or of a phone numbers
+            element
+        @param ml_attributes: the attributes of the <ml> elements"""
+    header = '<ml%s>' % ml_attributes
+    footer = '</ml>'
+    parts = [header]
+    size = len(header) + len(footer)
+    for container, container_end, nodes in groups:
+        opened = False
+        for node in nodes:
+            needed = len(node)
+            if not opened:
+                # the container is only opened along with its first contact
+                needed += len(container) + len(container_end)
+            if size + needed > MAX_PAYLOAD_SIZE and len(parts) > 1:
+                if opened:
+                    parts.append(container_end)
+                parts.append(footer)
+                payload = "".join(parts)
+                assert len(payload) <= MAX_PAYLOAD_SIZE
+                yield payload
+                parts = [header]
+                size = len(header) + len(footer)
+                needed = len(container) + len(container_end) + len(node)
+                opened = False
+            if not opened:
+                parts.append(container)
+                opened = True
+            parts.append(node)
+            size += needed
+        if opened:
+            parts.append(container_end)
+    parts.append(footer)
+    payload = "".join(parts)
+    assert len(payload) <= MAX_PAYLOAD_SIZE
+    yield payload
+
+_ubx_data = re.compile(r'<Data><PSM(?:/>|>([^<]*)</PSM>)'
+        r'<CurrentMedia(?:/>|>([^<]*)</CurrentMedia>)')
+
+def _parse_ubx_payload(payload):
+    """Returns the (property name, value) changes described by an UBX
+    payload, the common <Data><PSM/><CurrentMedia/>... payloads being
+    parsed without building an element tree"""
+    match = _ubx_data.match(payload)
+    if match is not None and '&#' not in payload:
+        psm, current_media = [xml_utils.unescape(text or '',
+                {"&quot;" : '"', "&apos;" : "'"}) for text in match.groups()]
+    else:
+        data = ElementTree.fromstring(payload)
+        psm = data.findtext("./PSM")
+        current_media = data.findtext("./CurrentMedia")
+        if psm is not None:
+            psm = psm.encode("utf-8")
+        if current_media is not None:
+            current_media = current_media.encode("utf-8")
+
+    changes = []
+    if current_media:
+        parts = current_media.split('\\0')
+        if parts[1] == 'Music' and parts[2] == '1':
+            # the personal message is not shown while playing music
+            return (("current-media", (parts[4], parts[5])),)
+        elif parts[2] == '0':
+            changes.append(("current-media", None))
+    else:
+        changes.append(("current-media", None))
+    changes.append(("personal-message", psm or ""))
+    return tuple(changes)
+
 
 class NotificationProtocol(BaseProtocol, gobject.GObject):
     """Protocol used to communicate with the Notification Server
@@ -101,6 +180,15 @@ class NotificationProtocol(BaseProtocol, gobject.GObject):
         self.__state = ProtocolState.CLOSED
         self._protocol_version = 0
 
+        self.__membership_updates = {"ADL" : {}, "RML" : {}}
+        self.__membership_updates_source = None
+        self.__initial_payloads = None
+        self.__initial_payloads_source = None
+        self.__ubx_cache = LRUCache(1024)
+        self.__switchboard_callbacks = PriorityQueue()
+        self.__switchboard_requests = set()
+        self.__profile_updates = set()
+
     # Properties ------------------------------------------------------------
     def __get_state(self):
         return self.__state
@@ -134,6 +222,7 @@ class NotificationProtocol(BaseProtocol, gobject.GObject):
         else:
             if msn_object:
                 self._client._msn_object_store.publish(msn_object)
+            self.__profile_updates.add(self._transport.transaction_id)
             self._send_command('CHG',
                     (presence, str(client_id), urllib.quote(str(msn_object))))
 
@@ -143,6 +232,7 @@ class NotificationProtocol(BaseProtocol, gobject.GObject):
 
             @param friendly_name: the new friendly name
             @type friendly_name: string"""
+        self.__profile_updates.add(self._transport.transaction_id)
         self._send_command('PRP',
                 ('MFN', urllib.quote(display_name)))
 
@@ -164,6 +254,7 @@ class NotificationProtocol(BaseProtocol, gobject.GObject):
                 '<CurrentMedia>%s</CurrentMedia>'\
                 '<MachineGuid>{CAFEBABE-DEAD-BEEF-BAAD-FEEDDEADC0DE}</MachineGuid>'\
             '</Data>' % (message, cm)
+        self.__profile_updates.add(self._transport.transaction_id)
         self._send_command('UUX', payload=pm)
         self._client.profile._server_property_changed("personal-message",
                 personal_message)
@@ -173,12 +264,20 @@ class NotificationProtocol(BaseProtocol, gobject.GObject):
 
     def signoff(self):
         """Logout from the server"""
-        self._send_command('OUT')
-        self._transport.lose_connection()
+        if self._transport.queue_depth == 0:
+            self._send_command('OUT')
+            self._transport.lose_connection()
+        else:
+            # the commands held by the rate limits are sent first
+            self._send_command('OUT', (), None, True,
+                    self._transport.lose_connection)
 
     @throttled(7600, list())
     def request_switchboard(self, priority, callback, *callback_args):
+        """Requests a new switchboard session, the callback is called with
+        the session, or with None if the request failed"""
         self.__switchboard_callbacks.add((callback, callback_args), priority)
+        self.__switchboard_requests.add(self._transport.transaction_id)
         self._send_command('XFR', ('SB',))
 
     def add_contact_to_membership(self, account,
@@ -186,6 +285,9 @@ class NotificationProtocol(BaseProtocol, gobject.GObject):
             membership=profile.Membership.FORWARD):
         """Add a contact to a given membership.
 
+            The membership changes made during a main loop iteration are
+            sent together, in as few commands as possible.
+
             @param account: the contact identifier
             @type account: string
 
@@ -196,22 +298,17 @@ class NotificationProtocol(BaseProtocol, gobject.GObject):
             @param membership: the list to be added to
             @type membership: integer
             @see L{pymsn.profile.Membership}"""
-
-        if network_id == profile.NetworkID.MOBILE:
-            payload = '<ml><t><c n="tel:%s" l="%d" /></t></ml>' % \
-                    (contact, membership)
-            self._send_command("ADL", payload=payload)
-        else:
-            contact, domain = account.split("@", 1)
-            payload = '<ml><d n="%s"><c n="%s" l="%d" t="%d"/></d></ml>' % \
-                    (domain, contact, membership, network_id)
-            self._send_command("ADL", payload=payload)
+        self.__update_membership("ADL", "RML", account, network_id,
+                membership)
 
     def remove_contact_from_membership(self, account,
             network_id=profile.NetworkID.MSN,
             membership=profile.Membership.FORWARD):
         """Remove a contact from a given membership.
 
+            The membership changes made during a main loop iteration are
+            sent together, in as few commands as possible.
+
             @param account: the contact identifier
             @type account: string
 
@@ -222,16 +319,54 @@ class NotificationProtocol(BaseProtocol, gobject.GObject):
             @param membership: the list to be added to
             @type membership: integer
             @see L{pymsn.profile.Membership}"""
-
-        if network_id == profile.NetworkID.MOBILE:
-            payload = '<ml><t><c n="tel:%s" l="%d" /></t></ml>' % \
-                    (contact, membership)
-            self._send_command("RML", payload=payload)
-        else:
-            contact, domain = account.split("@", 1)
-            payload = '<ml><d n="%s"><c n="%s" l="%d" t="%d"/></d></ml>' % \
-                    (domain, contact, membership, network_id)
-            self._send_command("RML", payload=payload)
+        self.__update_membership("RML", "ADL", account, network_id,
+                membership)
+
+    def __update_membership(self, command, opposite_command, account,
+            network_id, membership):
+        key = (account, network_id)
+        # a later change to the same list supersedes an earlier one
+        opposite_updates = self.__membership_updates[opposite_command]
+        if key in opposite_updates:
+            opposite_updates[key] &= ~membership
+            if opposite_updates[key] == 0:
+                del opposite_updates[key]
+
+        updates = self.__membership_updates[command]
+        updates[key] = updates.get(key, 0) | membership
+        if self.__membership_updates_source is None:
+            self.__membership_updates_source = \
+                    gobject.idle_add(self.__send_membership_updates)
+
+    def __send_membership_updates(self):
+        self.__membership_updates_source = None
+        # removals first, a contact cannot be in both the allow and
+        # the block lists
+        for command in ("RML", "ADL"):
+            updates = self.__membership_updates[command]
+            if len(updates) == 0:
+                continue
+            self.__membership_updates[command] = {}
+
+            domains = {}
+            phones = []
+            for (account, network_id), membership in updates.iteritems():
+                if network_id == profile.NetworkID.MOBILE:
+                    phones.append('<c n="tel:%s" l="%d"/>' % \
+                            (account, membership))
+                    continue
+                user, domain = account.split("@", 1)
+                domains.setdefault(domain, []).append(
+                        '<c n="%s" l="%d" t="%d"/>' % \
+                        (user, membership, network_id))
+
+            groups = [('<d n="%s">' % domain, '</d>', nodes) \
+                    for domain, nodes in domains.iteritems()]
+            if len(phones) > 0:
+                groups.append(('<t>', '</t>', phones))
+            for payload in _membership_payloads(groups):
+                self._send_command(command, payload=payload)
+        return False
 
     def send_unmanaged_message(self, contact, message):
         content_type = message.content_type[0]
@@ -278,9 +413,23 @@ class NotificationProtocol(BaseProtocol, gobject.GObject):
                 host = command.arguments[1]
                 port = self._transport.server[1]
             session_id = command.arguments[3]
+            self.__switchboard_requests.discard(command.transaction_id)
             callback, callback_args = self.__switchboard_callbacks.pop(0)
             callback(((host, port), session_id, None), *callback_args)
 
+    def _error_handler(self, error):
+        BaseProtocol._error_handler(self, error)
+        if error.transaction_id in self.__switchboard_requests:
+            self.__switchboard_requests.discard(error.transaction_id)
+            # the sessions go to the most important requests first, the
+            # least important one is the one left without a session
+            if len(self.__switchboard_callbacks) > 0:
+                callback, callback_args = self.__switchboard_callbacks.pop(-1)
+                callback(None, *callback_args)
+        elif error.transaction_id in self.__profile_updates:
+            self.__profile_updates.discard(error.transaction_id)
+            self._client.profile._forget_sent_updates()
+
     def _handle_USR(self, command):
         args_len = len(command.arguments)
 
@@ -295,10 +444,14 @@ class NotificationProtocol(BaseProtocol, gobject.GObject):
         elif command.arguments[1] == "S":
             self._state = ProtocolState.AUTHENTICATING
             if command.arguments[0] == "SSO":
+                # warm up the tokens needed by the services during login
                 self._client._sso.RequestMultipleSecurityTokens(
                     (self._sso_cb, command.arguments[3]),
                     (lambda *args: self.emit("authentication-failed"),),
-                    SSO.LiveService.MESSENGER_CLEAR)
+                    SSO.LiveService.MESSENGER_CLEAR,
+                    SSO.LiveService.CONTACTS,
+                    SSO.LiveService.MESSENGER,
+                    SSO.LiveService.MESSENGER_SECURE)
                 
                 self._client.address_book.connect("notify::state",
                     self._address_book_state_changed_cb)
@@ -331,6 +484,7 @@ class NotificationProtocol(BaseProtocol, gobject.GObject):
                 command.arguments[0])
 
     def _handle_CHG(self, command):
+        self.__profile_updates.discard(command.transaction_id)
         self._client.profile._server_property_changed("presence",
                 command.arguments[0])
         if len(command.arguments) > 2:
@@ -393,6 +547,7 @@ class NotificationProtocol(BaseProtocol, gobject.GObject):
 
     # --------- Display name and co ------------------------------------------
     def _handle_PRP(self, command):
+        self.__profile_updates.discard(command.transaction_id)
         ctype = command.arguments[0]
         if len(command.arguments) < 2: return
         if ctype == 'MFN':
@@ -401,7 +556,7 @@ class NotificationProtocol(BaseProtocol, gobject.GObject):
         # TODO: add support for other stuff
 
     def _handle_UUX(self, command):
-        pass
+        self.__profile_updates.discard(command.transaction_id)
 
     def _handle_UBN(self,command): # contact infos
         if not command.payload:
@@ -422,24 +577,13 @@ class NotificationProtocol(BaseProtocol, gobject.GObject):
         if len(contacts) == 0:
             logger.warning("Contact (network_id=%d) %s not found" % \
                     (network_id, account))
+        changes = self.__ubx_cache.get(command.payload, None)
+        if changes is None:
+            changes = _parse_ubx_payload(command.payload)
+            self.__ubx_cache[command.payload] = changes
         for contact in contacts:
-            cm = ElementTree.fromstring(command.payload).find("./CurrentMedia")
-            if cm is not None and cm.text is not None:
-                parts = cm.text.split('\\0')
-                if parts[1] == 'Music' and parts[2] == '1':
-                    cm = (parts[4].encode("utf-8"), parts[5].encode("utf-8"))
-                    contact._server_property_changed("current-media", cm)
-                    continue
-                elif parts[2] == '0':
-                    contact._server_property_changed("current-media", None)
-            else:
-                contact._server_property_changed("current-media", None)
-            pm = ElementTree.fromstring(command.payload).find("./PSM")
-            if pm is not None and pm.text is not None:
-                pm = pm.text.encode("utf-8")
-            else:
-                pm = ""
-            contact._server_property_changed("personal-message", pm)
+            for name, value in changes:
+                contact._server_property_changed(name, value)
     # --------- Contact List -------------------------------------------------
     def _handle_ADL(self, command):
         if command.transaction_id == 0: # incoming ADL from the server
@@ -530,10 +674,29 @@ class NotificationProtocol(BaseProtocol, gobject.GObject):
     # callbacks --------------------------------------------------------------
     def _connect_cb(self, transport):
         self.__switchboard_callbacks = PriorityQueue()
+        # transaction ids of the XFR SB waiting for an answer
+        self.__switchboard_requests = set()
         self._state = ProtocolState.OPENING
         self._send_command('VER', ProtocolConstant.VER)
 
     def _disconnect_cb(self, transport, reason):
+        if self.__membership_updates_source is not None:
+            gobject.source_remove(self.__membership_updates_source)
+            self.__membership_updates_source = None
+        self.__membership_updates = {"ADL" : {}, "RML" : {}}
+        if self.__initial_payloads_source is not None:
+            gobject.source_remove(self.__initial_payloads_source)
+            self.__initial_payloads_source = None
+        self.__initial_payloads = None
+        # the switchboard requests will never be answered
+        callbacks = self.__switchboard_callbacks
+        self.__switchboard_callbacks = PriorityQueue()
+        self.__switchboard_requests = set()
+        self.__profile_updates = set()
+        self._client.profile._forget_sent_updates()
+        while len(callbacks) > 0:
+            callback, callback_args = callbacks.pop(0)
+            callback(None, *callback_args)
         self._state = ProtocolState.CLOSED
 
     def _sso_cb(self, tokens, nonce):
@@ -544,36 +707,47 @@ class NotificationProtocol(BaseProtocol, gobject.GObject):
                 ("SSO", "S", clear_token.security_token, blob))
 
     def _address_book_state_changed_cb(self, address_book, pspec):
-        MAX_PAYLOAD_SIZE = 7500
         if address_book.state != AB.AddressBookState.SYNCHRONIZED:
             return
         self._client.profile._server_property_changed("display-name",
                 address_book.profile.display_name)
 
-        contacts = address_book.contacts\
-                .search_by_memberships(profile.Membership.FORWARD)\
-                .group_by_domain()
-        
-        payloads = ['<ml l="1">']
+        # the server starts sending the presence of the contacts as soon as
+        # it gets the first payload, the others are built while it does
+        payloads = _membership_payloads(
+                self.__contact_list_groups(address_book.contacts), ' l="1"')
+        self._send_command("ADL", payload=payloads.next())
+        self.__initial_payloads = payloads
+        self.__initial_payloads_source = \
+                gobject.idle_add(self.__send_initial_payloads)
+
+    def __contact_list_groups(self, contacts):
+        # the nodes are produced as the payloads are filled, a domain
+        # without any node is never opened by _membership_payloads
+        for domain, contacts in contacts.iter_by_domain():
+            yield ('<d n="%s">' % domain, '</d>',
+                    self.__contact_list_nodes(contacts))
+
+    def __contact_list_nodes(self, contacts):
         mask = ~(profile.Membership.REVERSE | profile.Membership.PENDING)
-        for domain, contacts in contacts.iteritems():
-            payloads[-1] += '<d n="%s">' % domain
-            for contact in contacts:
-                user = contact.account.split("@", 1)[0]
-                lists = contact.memberships & mask
-                network_id = contact.network_id
-                node = '<c n="%s" l="%d" t="%d"/>' % (user, lists, network_id)
-                size = len(payloads[-1]) + len(node) + len('</d></ml>')
-                if size >= MAX_PAYLOAD_SIZE:
-                    payloads[-1] += '</d></ml>'
-                    payloads.append('<ml l="1"><d n="%s">' % domain)
-                payloads[-1] += node 
-            payloads[-1] += '</d>'
-        payloads[-1] += '</ml>'
-        
-        for payload in payloads:
-            self._send_command("ADL", payload=payload)
-        self._state = ProtocolState.SYNCHRONIZED
+        for contact in contacts:
+            if not contact.is_member(profile.Membership.FORWARD):
+                continue
+            user = contact.account.split("@", 1)[0]
+            lists = contact.memberships & mask
+            yield '<c n="%s" l="%d" t="%d"/>' % \
+                    (user, lists, contact.network_id)
+
+    def __send_initial_payloads(self):
+        try:
+            payload = self.__initial_payloads.next()
+        except StopIteration:
+            self.__initial_payloads = None
+            self.__initial_payloads_source = None
+            self._state = ProtocolState.SYNCHRONIZED
+            return False
+        self._send_command("ADL", payload=payload)
+        return True
 
     def _address_book_contact_added_cb(self, address_book, contact):
         self.add_contact_to_membership(contact.account, contact.network_id,
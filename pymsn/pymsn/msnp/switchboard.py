@@ -24,8 +24,9 @@
 Implements the protocol used to communicate with the Switchboard Server."""
 
 from base import BaseProtocol, ProtocolState
-from message import Message
+from message import Message, MessageAcknowledgement
 import pymsn.profile
+from pymsn.util.cache import LRUCache
 
 import logging
 import urllib 
@@ -115,6 +116,10 @@ class SwitchboardProtocol(BaseProtocol, gobject.GObject):
         self.__inviting = False
 
         self.__invitations = {}
+        # transaction id -> message waiting for its ACK/NAK, HALF messages
+        # are never ACKed so only the most recent ones are kept
+        self.__outstanding = {}
+        self.__outstanding_half = LRUCache(256)
     
     # Properties ------------------------------------------------------------
     def __get_state(self):
@@ -162,6 +167,10 @@ class SwitchboardProtocol(BaseProtocol, gobject.GObject):
             @param message: the message to send
             @type message: L{message.Message}"""
         assert(self.state == ProtocolState.OPEN)
+        if ack == MessageAcknowledgement.FULL:
+            self.__outstanding[self._transport.transaction_id] = message
+        elif ack == MessageAcknowledgement.HALF:
+            self.__outstanding_half[self._transport.transaction_id] = message
         self._send_command('MSG',
                 (ack,),
                 message,
@@ -242,24 +251,34 @@ class SwitchboardProtocol(BaseProtocol, gobject.GObject):
     # --------- Messenging ---------------------------------------------------
     def _handle_MSG(self, command):
         account = command.arguments[0]
-        display_name = urllib.unquote(command.arguments[1])
-        contacts = self._client.address_book.contacts.\
-                search_by_account(account)
-        if len(contacts) == 0:
-            contact = pymsn.profile.Contact(id=0,
-                    network_id=pymsn.profile.NetworkID.MSN,
-                    account=account,
-                    display_name=display_name)
-        else:
-            contact = contacts[0]
+        # the sender almost always joined the switchboard
+        contact = self.participants.get(account, None)
+        if contact is None:
+            display_name = urllib.unquote(command.arguments[1])
+            contacts = self._client.address_book.contacts.\
+                    search_by_account(account)
+            if len(contacts) == 0:
+                contact = pymsn.profile.Contact(id=0,
+                        network_id=pymsn.profile.NetworkID.MSN,
+                        account=account,
+                        display_name=display_name)
+            else:
+                contact = contacts[0]
         message = Message(contact, command.payload)
         self.emit("message-received", message)
         
     def _handle_ACK(self, command):
-        self.emit("message-delivered", command)
+        message = self.__pop_outstanding(command.transaction_id)
+        self.emit("message-delivered", message)
 
     def _handle_NAK(self, command):
-        self.emit("message-undelivered", command)
+        message = self.__pop_outstanding(command.transaction_id)
+        self.emit("message-undelivered", message)
+
+    def __pop_outstanding(self, transaction_id):
+        if transaction_id in self.__outstanding:
+            return self.__outstanding.pop(transaction_id)
+        return self.__outstanding_half.pop(transaction_id, None)
 
     def _error_handler(self, error):
         """Handles errors
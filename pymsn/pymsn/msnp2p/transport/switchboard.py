@@ -33,6 +33,8 @@ logger = logging.getLogger('msnp2p:transport')
 
 
 class SwitchboardP2PTransport(BaseP2PTransport, SwitchboardClient):
+    _CONTENT_TYPES = ('application/x-msnmsgrp2p',)
+
     def __init__(self, client, contacts, transport_manager):
         SwitchboardClient.__init__(self, client, contacts)
         BaseP2PTransport.__init__(self, transport_manager, "switchboard")
@@ -44,7 +46,7 @@ class SwitchboardP2PTransport(BaseP2PTransport, SwitchboardClient):
     @staticmethod
     def _can_handle_message(message, switchboard_client=None):
         content_type = message.content_type[0]
-        return content_type == 'application/x-msnmsgrp2p'
+        return content_type in SwitchboardP2PTransport._CONTENT_TYPES
 
     @property
     def peer(self):
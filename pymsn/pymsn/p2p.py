@@ -29,6 +29,7 @@ from msnp2p import OutgoingP2PSession, EufGuid, ApplicationID
 from msnp2p.exceptions import ParseError
 from profile import NetworkID
 
+from pymsn.util.cache import LRUCache
 import pymsn.util.element_tree as ElementTree
 import pymsn.util.string_io as StringIO
 
@@ -64,6 +65,7 @@ class MSNObjectType(object):
 
 class MSNObject(object):
     "Represents an MSNObject."
+
     def __init__(self, creator, size, type, location, friendly, 
                  shad=None, shac=None, data=None):
         """Initializer
@@ -135,19 +137,25 @@ class MSNObject(object):
 
     @staticmethod
     def parse(client, xml_data):
+        parse_cache = client._msn_object_store._parse_cache
+        result = parse_cache.get(xml_data, None)
+        if result is not None:
+            contacts = client.address_book.contacts
+            if result._creator is None:
+                result._creator = MSNObject.__find_creator(contacts,
+                        result._creator_account)
+                return result
+            elif result._creator in contacts:
+                return result
+
         data = StringIO.StringIO(xml_data)
         try:
             element = ElementTree.parse(data).getroot().attrib
         except:
             raise ParseError('Invalid MSNObject')
         
-        try:
-            creator = client.address_book.contacts.\
-                search_by_account(element["Creator"]).\
-                search_by_network_id(NetworkID.MSN)[0]
-        except IndexError:
-            creator = None
-
+        creator = MSNObject.__find_creator(client.address_book.contacts,
+                element["Creator"])
         size = int(element["Size"])
         type = int(element["Type"])
         location = xml.unescape(element["Location"])
@@ -162,8 +170,18 @@ class MSNObject(object):
         result = MSNObject(creator, size, type, location, \
                              friendly, shad, shac)
         result._repr = xml_data
+        result._creator_account = element["Creator"]
+        parse_cache[xml_data] = result
         return result
 
+    @staticmethod
+    def __find_creator(contacts, account):
+        try:
+            return contacts.search_by_account(account).\
+                search_by_network_id(NetworkID.MSN)[0]
+        except IndexError:
+            return None
+
     def __compute_data_hash(self, data):
         digest = sha.new()
         data.seek(0, 0)
@@ -204,6 +222,9 @@ class MSNObjectStore(object):
         self._outgoing_sessions = {} # session => (handle_id, callback, errback)
         self._incoming_sessions = {}
         self._published_objects = set()
+        # parsed MSNObjects, keyed by their xml representation, the same
+        # MSNObject being received with every presence update of its creator
+        self._parse_cache = LRUCache(1024)
         self._client._p2p_session_manager.connect("incoming-session",
                 self._incoming_session_received)
 
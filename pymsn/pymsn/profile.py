@@ -27,6 +27,7 @@ contacts in his/her contact list.
     @sort: Presence, Membership, Privacy, NetworkID"""
 
 from pymsn.util.decorator import rw_property
+from pymsn.util.weak import WeakSet
 
 import gobject
 
@@ -292,6 +293,19 @@ class ContactType(object):
 class Profile(gobject.GObject):
     """Profile of the User connecting to the service
 
+        The changes made to the presence, display picture, display name,
+        personal message and current media are sent together
+        C{update_window} milliseconds after the first of them, only the
+        final state being sent. The window is not extended by the later
+        changes, so that a steady stream of changes is still sent. The
+        properties are updated, and their notifications emitted, once the
+        server applied the change.
+
+        @ivar update_window: delay in milliseconds, from the first change,
+            during which the changes are collected, 0 to send them at the
+            end of the current main loop iteration
+        @type update_window: integer
+
         @undocumented: __gsignals__, __gproperties__, do_get_property"""
 
     __gproperties__ = {
@@ -360,6 +374,15 @@ class Profile(gobject.GObject):
 
         self.__pending_set_presence = [self._presence, self.client_id, self._msn_object]
         self.__pending_set_personal_message = [self._personal_message, self._current_media]
+        self.__pending_set_display_name = None
+
+        self.update_window = 500
+        self.__pending_updates = set()
+        self.__update_source = None
+        # the last values sent to or applied by the server
+        self.__sent_presence = self.__presence_state()
+        self.__sent_personal_message = tuple(self.__pending_set_personal_message)
+        self.__sent_display_name = None
 
     @property
     def account(self):
@@ -392,7 +415,8 @@ class Profile(gobject.GObject):
         def fset(self, display_name):
             if not display_name:
                 return
-            self._ns_client.set_display_name(display_name)
+            self.__pending_set_display_name = display_name
+            self.__queue_update("display-name")
         def fget(self):
             return self._display_name
         return locals()
@@ -402,10 +426,8 @@ class Profile(gobject.GObject):
         """The presence displayed to you contacts
             @type: L{Presence<pymsn.profile.Presence>}"""
         def fset(self, presence):
-            if presence == self._presence:
-                return
             self.__pending_set_presence[0] = presence
-            self._ns_client.set_presence(*self.__pending_set_presence)
+            self.__queue_update("presence")
         def fget(self):
             return self._presence
         return locals()
@@ -425,10 +447,8 @@ class Profile(gobject.GObject):
         """The personal message displayed to you contacts
             @type: utf-8 encoded string"""
         def fset(self, personal_message):
-            if personal_message == self._personal_message:
-                return
             self.__pending_set_personal_message[0] = personal_message
-            self._ns_client.set_personal_message(*self.__pending_set_personal_message)
+            self.__queue_update("personal-message")
         def fget(self):
             return self._personal_message
         return locals()
@@ -438,10 +458,8 @@ class Profile(gobject.GObject):
         """The current media displayed to you contacts
             @type: (artist: string, track: string)"""
         def fset(self, current_media):
-            if current_media == self._current_media:
-                return
             self.__pending_set_personal_message[1] = current_media
-            self._ns_client.set_personal_message(*self.__pending_set_personal_message)
+            self.__queue_update("personal-message")
         def fget(self):
             return self._current_media
         return locals()
@@ -452,10 +470,8 @@ class Profile(gobject.GObject):
         display picture to be shown to your peers
             @type: L{MSNObject<pymsn.p2p.MSNObject>}"""
         def fset(self, msn_object):
-            if msn_object == self._msn_object:
-                return
             self.__pending_set_presence[2] = msn_object
-            self._ns_client.set_presence(*self.__pending_set_presence)
+            self.__queue_update("presence")
         def fget(self):
             return self._msn_object
         return locals()
@@ -464,11 +480,9 @@ class Profile(gobject.GObject):
     def presence_msn_object():
         def fset(self, args):
             presence, msn_object = args
-            if presence == self._presence and msn_object == self._msn_object:
-                return
             self.__pending_set_presence[0] = presence
             self.__pending_set_presence[2] = msn_object
-            self._ns_client.set_presence(*self.__pending_set_presence)
+            self.__queue_update("presence")
         def fget(self):
             return self._presence, self._msn_object
         return locals()
@@ -477,20 +491,77 @@ class Profile(gobject.GObject):
     def personal_message_current_media():
         def fset(self, args):
             personal_message, current_media = args
-            if personal_message == self._personal_message and \
-                    current_media == self._current_media:
-                return
             self.__pending_set_personal_message[0] = personal_message
             self.__pending_set_personal_message[1] = current_media
-            self._ns_client.set_personal_message(*self.__pending_set_personal_message)
+            self.__queue_update("personal-message")
         def fget(self):
             return self._personal_message, self._current_media
         return locals()
 
+    def __queue_update(self, update):
+        self.__pending_updates.add(update)
+        if self.__update_source is not None:
+            return
+        if self.update_window > 0:
+            self.__update_source = gobject.timeout_add(self.update_window,
+                    self.__send_updates)
+        else:
+            self.__update_source = gobject.idle_add(self.__send_updates)
+
+    def __send_updates(self):
+        self.__update_source = None
+        updates = self.__pending_updates
+        self.__pending_updates = set()
+
+        # the intermediate states were dropped, and the final one is only
+        # sent if it differs from what the server was told last
+        if "presence" in updates:
+            presence = self.__presence_state()
+            if presence != self.__sent_presence:
+                self.__sent_presence = presence
+                self._ns_client.set_presence(*self.__pending_set_presence)
+        if "personal-message" in updates:
+            personal_message = tuple(self.__pending_set_personal_message)
+            if personal_message != self.__sent_personal_message:
+                self.__sent_personal_message = personal_message
+                self._ns_client.set_personal_message(*personal_message)
+        if "display-name" in updates:
+            display_name = self.__pending_set_display_name
+            if display_name != self.__sent_display_name:
+                self.__sent_display_name = display_name
+                self._ns_client.set_display_name(display_name)
+        return False
+
+    def __presence_state(self):
+        # the capabilities object is modified in place, keep its value
+        presence, client_id, msn_object = self.__pending_set_presence
+        return (presence, str(client_id), msn_object)
+
+    def _forget_sent_updates(self):
+        """Forgets what the server was told, the next updates are always
+        sent. Called when an update failed or the connection was lost."""
+        self.__sent_presence = (None, None, None)
+        self.__sent_personal_message = (None, None)
+        self.__sent_display_name = None
+
     def _server_property_changed(self, name, value):
         attr_name = "_" + name.lower().replace("-", "_")
         if attr_name == "_msn_object" and value is not None:
             value = self.__pending_set_presence[2]
+
+        if attr_name == "_presence":
+            self.__sent_presence = (value,) + self.__sent_presence[1:]
+        elif attr_name == "_msn_object":
+            self.__sent_presence = self.__sent_presence[:2] + (value,)
+        elif attr_name == "_personal_message":
+            self.__sent_personal_message = (value,
+                    self.__sent_personal_message[1])
+        elif attr_name == "_current_media":
+            self.__sent_personal_message = (self.__sent_personal_message[0],
+                    value)
+        elif attr_name == "_display_name":
+            self.__sent_display_name = value
+
         old_value = getattr(self, attr_name)
         if value != old_value:
             setattr(self, attr_name, value)
@@ -570,27 +641,62 @@ class Contact(gobject.GObject):
                 gobject.PARAM_READABLE),
             }
 
+    # Objects notified of the changes of every contact through their
+    # _contact_changed(contact, name, *args) method, the name being the
+    # name of the changed property or of the emitted signal. This avoids
+    # connecting handlers to the signals of each contact.
+    _change_listeners = WeakSet()
+
+    # The attributes most contacts never change are only stored on the
+    # instances which do, and the shared ones are replaced, not modified:
+    # the dictionaries are only exposed as copies.
+    _cid = "00000000-0000-0000-0000-000000000000"
+    _presence = Presence.OFFLINE
+    _personal_message = ""
+    _current_media = None
+    _groups = frozenset()
+    _contact_type = ContactType.REGULAR
+    _client_capabilities = None
+    _msn_object = None
+    _infos = {}
+    _attributes = {'icon_url' : None}
+
     def __init__(self, id, network_id, account, display_name, cid=None,
             memberships=Membership.NONE, contact_type=ContactType.REGULAR):
         """Initializer"""
         gobject.GObject.__init__(self)
         self._id = id
-        self._cid = cid or "00000000-0000-0000-0000-000000000000"
+        if cid:
+            self._cid = cid
         self._network_id = network_id
         self._account = account
+        # few different domains are shared by many contacts
+        domain = account.split('@', 1)
+        if len(domain) > 1:
+            self._domain = intern(domain[1])
+        else:
+            self._domain = ""
 
         self._display_name = display_name
-        self._presence = Presence.OFFLINE
-        self._personal_message = ""
-        self._current_media = None
-        self._groups = set()
-
         self._memberships = memberships
-        self._contact_type = contact_type
-        self._client_capabilities = ClientCapabilities()
-        self._msn_object = None
-        self._infos = {}
-        self._attributes = {'icon_url' : None}
+        if contact_type != ContactType.REGULAR:
+            self._contact_type = contact_type
+
+    @classmethod
+    def _add_change_listener(cls, listener):
+        cls._change_listeners.add(listener)
+
+    @classmethod
+    def _remove_change_listener(cls, listener):
+        cls._change_listeners.discard(listener)
+
+    def _changed(self, name, *args):
+        if name in self.__gproperties__:
+            self.notify(name)
+        else:
+            self.emit(name, *args)
+        for listener in list(Contact._change_listeners):
+            listener._contact_changed(self, name, *args)
 
     def __repr__(self):
         def memberships_str():
@@ -667,14 +773,14 @@ class Contact(gobject.GObject):
     @property
     def groups(self):
         """Contact list of groups
-            @type: set(L{Group<pymsn.profile.Group>}...)"""
+            @type: frozenset(L{Group<pymsn.profile.Group>}...)"""
         return self._groups
 
     @property
     def infos(self):
         """Contact informations
             @type: {key: string => value: string}"""
-        return self._infos
+        return self._infos.copy()
 
     @property
     def memberships(self):
@@ -692,6 +798,8 @@ class Contact(gobject.GObject):
     def client_capabilities(self):
         """Contact client capabilities
             @type: L{ClientCapabilities}"""
+        if self._client_capabilities is None:
+            return ClientCapabilities()
         return self._client_capabilities
 
     @property
@@ -704,11 +812,7 @@ class Contact(gobject.GObject):
     def domain(self):
         """Contact domain, which is basically the part after @ in the account
             @type: utf-8 encoded string"""
-        result = self._account.split('@', 1)
-        if len(result) > 1:
-            return result[1]
-        else:
-            return ""
+        return self._domain
 
     ### membership management
     def is_member(self, memberships):
@@ -718,11 +822,11 @@ class Contact(gobject.GObject):
 
     def _set_memberships(self, memberships):
         self._memberships = memberships
-        self.notify("memberships")
+        self._changed("memberships")
 
     def _add_membership(self, membership):
         self._memberships |= membership
-        self.notify("memberships")
+        self._changed("memberships")
 
     def _remove_membership(self, membership):
         """removes the given membership from the contact
@@ -730,31 +834,39 @@ class Contact(gobject.GObject):
             @param membership: the membership to remove
             @type membership: int L{Membership}"""
         self._memberships ^= membership
-        self.notify("memberships")
+        self._changed("memberships")
 
     def _server_property_changed(self, name, value): #FIXME, should not be used for memberships
         if name == "client-capabilities":
             value = ClientCapabilities(client_id=value)
+        elif name == "presence":
+            value = intern(value)
         attr_name = "_" + name.lower().replace("-", "_")
         old_value = getattr(self, attr_name)
         if value != old_value:
             setattr(self, attr_name, value)
-            self.notify(name)
+            self._changed(name)
 
     def _server_attribute_changed(self, name, value):
-        self._attributes[name] = value
+        attributes = self._attributes.copy()
+        attributes[name] = value
+        self._attributes = attributes
 
     def _server_infos_changed(self, updated_infos):
-        self._infos.update(updated_infos)
-        self.emit("infos-changed", updated_infos)
-        self.notify("infos")
+        infos = self._infos.copy()
+        infos.update(updated_infos)
+        self._infos = infos
+        self._changed("infos-changed", updated_infos)
+        self._changed("infos")
 
     ### group management
     def _add_group_ownership(self, group):
-        self._groups.add(group)
+        if group not in self._groups:
+            self._groups = self._groups | frozenset((group,))
 
     def _delete_group_ownership(self, group):
-        self._groups.discard(group)
+        if group in self._groups:
+            self._groups = self._groups - frozenset((group,))
 
     def do_get_property(self, pspec):
         name = pspec.name.lower().replace("-", "_")
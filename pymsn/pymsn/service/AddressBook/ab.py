@@ -60,13 +60,63 @@ class Group(object):
     def __repr__(self):
         return "<Group id=%s>" % self.Id
 
+class _Field(object):
+    """A record field, decoded from the text of its xml element on first
+    access and then stored in the record like a plain attribute.
+
+    The records keep the text of their fields in a _texts list, in the
+    order of the tags listed in their _TAGS attribute."""
+    def __init__(self, name, tag, type=None):
+        self.name = name
+        self.tag = tag
+        self.type = type
+        self.index = None
+
+    def __get__(self, record, owner):
+        if record is None:
+            return self
+        if self.index is None:
+            self.index = owner._TAGS.index(self.tag)
+        value = record._texts[self.index]
+        # a missing element is not decoded, as with findtext
+        if self.type is not None and value != "":
+            value = getattr(XMLTYPE, self.type).decode(value)
+        record.__dict__[self.name] = value
+        return value
+
+class _lazy_field(object):
+    """Decorator for the record fields that are computed, the method is
+    only called on first access, the result is then stored in the record
+    like a plain attribute."""
+    def __init__(self, decode):
+        self.decode = decode
+        self.name = decode.__name__
+
+    def __get__(self, record, owner):
+        if record is None:
+            return self
+        value = self.decode(record)
+        record.__dict__[self.name] = value
+        return value
+
+def _texts(fields, tags):
+    # missing elements read as an empty string, as with findtext
+    return [fields.get(tag, "") for tag in tags]
+
 class ContactEmail(object):
+    # part of the address book snapshot version
+    _TAGS = ("contactEmailType", "email", "isMessengerEnabled",
+             "Capability", "MessengerEnabledExternally")
+
     def __init__(self, email):
-        self.Type = email.findtext("./ab:contactEmailType")
-        self.Email = email.findtext("./ab:email")
-        self.IsMessengerEnabled = email.findtext("./ab:isMessengerEnabled", "bool")
-        self.Capability = email.findtext("./ab:Capability", "int")
-        self.MessengerEnabledExternally = email.findtext("./ab:MessengerEnabledExternally", "bool")
+        self._texts = _texts(email.children_text(), self._TAGS)
+
+    Type = _Field("Type", "contactEmailType")
+    Email = _Field("Email", "email")
+    IsMessengerEnabled = _Field("IsMessengerEnabled", "isMessengerEnabled", "bool")
+    Capability = _Field("Capability", "Capability", "int")
+    MessengerEnabledExternally = _Field("MessengerEnabledExternally",
+            "MessengerEnabledExternally", "bool")
 
 class ContactPhone(object):
     def __init__(self, phone):
@@ -85,10 +135,23 @@ class ContactLocation(object):
         self.Changes = location.findtext("./ab:Changes").split(' ')
 
 class Contact(object):
-    def __init__(self, contact):
-        self.Id = contact.findtext("./ab:contactId")
+    """A contact of the address book, only the text of its fields is read
+    when it is decoded, the fields are converted when first accessed."""
+
+    # part of the address book snapshot version
+    _TAGS = ("contactId", "fDeleted", "lastChanged", "contactType",
+             "quickName", "passportName", "displayName",
+             "IsPassportNameHidden", "firstName", "lastName", "puid", "CID",
+             "IsNotMobileVisible", "isMobileIMEnabled", "isMessengerUser",
+             "isFavorite", "isSmtp", "hasSpace", "spotWatchState",
+             "birthdate", "primaryEmailType", "PrimaryLocation",
+             "primaryPhone", "IsPrivate", "Gender", "TimeZone")
 
+    def __init__(self, contact):
         contact_info = contact.find("./ab:contactInfo")
+        fields = contact_info.children_text()
+        fields.update(contact.children_text())
+        self._texts = _texts(fields, self._TAGS)
 
         self.Groups = []
         groups = contact_info.find("./ab:groupIds")
@@ -96,49 +159,66 @@ class Contact(object):
             for group in groups:
                 self.Groups.append(group.text)
 
-        self.Type = contact_info.findtext("./ab:contactType")
-        self.QuickName = contact_info.findtext("./ab:quickName")
-        self.PassportName = contact_info.findtext("./ab:passportName")
-        self.DisplayName = contact_info.findtext("./ab:displayName")
-        self.IsPassportNameHidden = contact_info.findtext("./ab:IsPassportNameHidden", "bool")
+        self._annotations = []
+        annotations = contact_info.find("./ab:annotations")
+        if annotations is not None:
+            for annotation in annotations:
+                self._annotations.append((annotation.findtext("./ab:Name"),
+                    annotation.findtext("./ab:Value")))
 
-        self.FirstName = contact_info.findtext("./ab:firstName")
-        self.LastName = contact_info.findtext("./ab:lastName")
+        self.Emails = []
+        emails = contact_info.find("./ab:emails")
+        if emails is not None:
+            for contact_email in emails:
+                self.Emails.append(ContactEmail(contact_email))
 
-        self.PUID = contact_info.findtext("./ab:puid", "int")
-        self.CID = contact_info.findtext("./ab:CID", "int")
+        self.PropertiesChanged = [] #FIXME: implement this
 
-        self.IsNotMobileVisible = contact_info.findtext("./ab:IsNotMobileVisible", "bool")
-        self.IsMobileIMEnabled = contact_info.findtext("./ab:isMobileIMEnabled", "bool")
-        self.IsMessengerUser = contact_info.findtext("./ab:isMessengerUser", "bool")
-        self.IsFavorite = contact_info.findtext("./ab:isFavorite", "bool")
-        self.IsSmtp = contact_info.findtext("./ab:isSmtp", "bool")
-        self.HasSpace = contact_info.findtext("./ab:hasSpace", "bool")
+    Id = _Field("Id", "contactId")
+    Deleted = _Field("Deleted", "fDeleted", "bool")
+    LastChanged = _Field("LastChanged", "lastChanged", "datetime")
 
-        self.SpotWatchState = contact_info.findtext("./ab:spotWatchState")
-        self.Birthdate = contact_info.findtext("./ab:birthdate", "datetime")
+    Type = _Field("Type", "contactType")
+    QuickName = _Field("QuickName", "quickName")
+    PassportName = _Field("PassportName", "passportName")
+    DisplayName = _Field("DisplayName", "displayName")
+    IsPassportNameHidden = _Field("IsPassportNameHidden",
+            "IsPassportNameHidden", "bool")
 
-        self.PrimaryEmailType = contact_info.findtext("./ab:primaryEmailType")
-        self.PrimaryLocation = contact_info.findtext("./ab:PrimaryLocation")
-        self.PrimaryPhone = contact_info.findtext("./ab:primaryPhone")
+    FirstName = _Field("FirstName", "firstName")
+    LastName = _Field("LastName", "lastName")
 
-        self.IsPrivate = contact_info.findtext("./ab:IsPrivate", "bool")
-        self.Gender = contact_info.findtext("./ab:Gender")
-        self.TimeZone = contact_info.findtext("./ab:TimeZone")
+    PUID = _Field("PUID", "puid", "int")
+    CID = _Field("CID", "CID", "int")
 
-        self.Annotations = annotations_to_dict(contact_info.find("./ab:annotations"))
-        
-        self.Emails = []
-        emails = contact_info.find("./ab:emails") or []
-        for contact_email in emails:
-            self.Emails.append(ContactEmail(contact_email))
+    IsNotMobileVisible = _Field("IsNotMobileVisible", "IsNotMobileVisible", "bool")
+    IsMobileIMEnabled = _Field("IsMobileIMEnabled", "isMobileIMEnabled", "bool")
+    IsMessengerUser = _Field("IsMessengerUser", "isMessengerUser", "bool")
+    IsFavorite = _Field("IsFavorite", "isFavorite", "bool")
+    IsSmtp = _Field("IsSmtp", "isSmtp", "bool")
+    HasSpace = _Field("HasSpace", "hasSpace", "bool")
 
-        self.PropertiesChanged = [] #FIXME: implement this
-        self.Deleted = contact.findtext("./ab:fDeleted", "bool")
-        self.LastChanged = contact.findtext("./ab:lastChanged", "datetime")
+    SpotWatchState = _Field("SpotWatchState", "spotWatchState")
+    Birthdate = _Field("Birthdate", "birthdate", "datetime")
+
+    PrimaryEmailType = _Field("PrimaryEmailType", "primaryEmailType")
+    PrimaryLocation = _Field("PrimaryLocation", "PrimaryLocation")
+    PrimaryPhone = _Field("PrimaryPhone", "primaryPhone")
+
+    IsPrivate = _Field("IsPrivate", "IsPrivate", "bool")
+    Gender = _Field("Gender", "Gender")
+    TimeZone = _Field("TimeZone", "TimeZone")
+
+    @_lazy_field
+    def Annotations(self):
+        return dict(self._annotations)
 
 
 class AB(SOAPService):
+    RESPONSE_DECODERS = {
+        "ABFindAll" : {"ab:Group" : Group, "ab:Contact" : Contact}
+        }
+
     def __init__(self, sso, proxies=None):
         self._sso = sso
         self._tokens = {}
@@ -176,18 +256,15 @@ class AB(SOAPService):
                 callback, errback)
 
     def _HandleABFindAllResponse(self, callback, errback, response, user_data):
-        last_changes = response[0].find("./ab:lastChange")
-        if last_changes is not None:
-            self._last_changes = last_changes.text
+        if response[0] is not None:
+            last_changes = response[0].find("./ab:lastChange")
+            if last_changes is not None:
+                self._last_changes = last_changes.text
 
-        groups = []
-        contacts = []
-        for group in response[1]:
-            groups.append(Group(group))
+        # the groups and contacts were decoded while parsing
+        groups = response[1]
+        contacts = response[2]
 
-        for contact in response[2]:
-            contacts.append(Contact(contact))
-        
         address_book =  ABResult(None, contacts, groups) #FIXME: add support for the ab param
         callback[0](address_book, *callback[1:])
 
@@ -203,31 +280,56 @@ class AB(SOAPService):
             @param callback: tuple(callable, *args)
             @param errback: tuple(callable, *args)
         """
+        self.__soap_request(self._service.ABContactAdd, scenario,
+                self.__contact_add_args(contact_info, invite_info) + \
+                    (auto_manage_allow_list,),
+                callback, errback)
+
+    @RequireSecurityTokens(LiveService.CONTACTS)
+    def ContactsAdd(self, callback, errback, scenario,
+            contacts, auto_manage_allow_list=True):
+        """Adds several contacts to the contact list in a single request.
+
+            @param scenario: "ContactSave" | "ContactMsgrAPI"
+            @param contacts: a list of (contact_info, invite_info) tuples
+            @param auto_manage_allow_list: whether to auto add to Allow role or not
+            @param callback: tuple(callable, *args), called with the list of
+                the new contacts ids
+            @param errback: tuple(callable, *args)
+        """
+        self.__soap_request(self._service.ABContactAdd, scenario,
+                ([self.__contact_add_args(contact_info, invite_info) \
+                        for contact_info, invite_info in contacts],
+                    auto_manage_allow_list),
+                callback, errback, True)
+
+    def __contact_add_args(self, contact_info, invite_info):
         is_messenger_user = contact_info.get('is_messenger_user', None)
         if is_messenger_user is not None:
             is_messenger_user = XMLTYPE.bool.encode(is_messenger_user)
-        self.__soap_request(self._service.ABContactAdd, scenario,
-                (contact_info.get('passport_name', None), 
-                    is_messenger_user,
-                    contact_info.get('contact_type', None),
-                    contact_info.get('first_name', None),
-                    contact_info.get('last_name', None),
-                    contact_info.get('birth_date', None),
-                    contact_info.get('email', None),
-                    contact_info.get('phone', None),
-                    contact_info.get('location', None),
-                    contact_info.get('web_site', None),
-                    contact_info.get('annotation', None),
-                    contact_info.get('comment', None),
-                    contact_info.get('anniversary', None),
-                    invite_info.get('display_name', ''),
-                    invite_info.get('invite_message', ''),
-                    contact_info.get('capability', None),
-                    auto_manage_allow_list),
-                callback, errback)
+        return (contact_info.get('passport_name', None),
+                is_messenger_user,
+                contact_info.get('contact_type', None),
+                contact_info.get('first_name', None),
+                contact_info.get('last_name', None),
+                contact_info.get('birth_date', None),
+                contact_info.get('email', None),
+                contact_info.get('phone', None),
+                contact_info.get('location', None),
+                contact_info.get('web_site', None),
+                contact_info.get('annotation', None),
+                contact_info.get('comment', None),
+                contact_info.get('anniversary', None),
+                invite_info.get('display_name', ''),
+                invite_info.get('invite_message', ''),
+                contact_info.get('capability', None))
 
     def _HandleABContactAddResponse(self, callback, errback, response, user_data):
-        callback[0](response.text, *callback[1:])
+        guids = [guid.text for guid in response]
+        if user_data:
+            callback[0](guids, *callback[1:])
+        else:
+            callback[0](guids[0], *callback[1:])
 
     @RequireSecurityTokens(LiveService.CONTACTS)
     def ContactDelete(self, callback, errback, scenario,
@@ -351,6 +453,21 @@ class AB(SOAPService):
     def _HandleABGroupContactAddResponse(self, callback, errback, response, user_data):
         callback[0](*callback[1:])
 
+    @RequireSecurityTokens(LiveService.CONTACTS)
+    def GroupContactsAdd(self, callback, errback, scenario,
+            group_id, contact_ids):
+        """Adds several contacts to a group in a single request.
+
+            @param scenario: "GroupSave" | ...
+            @param group_id: the id of the group (a GUID)
+            @param contact_ids: the ids of the contacts to add to the
+                                group (GUIDs)
+            @param callback: tuple(callable, *args)
+            @param errback: tuple(callable, *args)
+        """
+        self.__soap_request(self._service.ABGroupContactAdd, scenario,
+                (group_id, contact_ids), callback, errback, True)
+
     @RequireSecurityTokens(LiveService.CONTACTS)
     def GroupContactDelete(self, callback, errback, scenario,
             group_id, contact_id):
@@ -369,26 +486,34 @@ class AB(SOAPService):
     def _HandleABGroupContactDeleteResponse(self, callback, errback, response, user_data):
         callback[0](*callback[1:])
 
-    def __soap_request(self, method, scenario, args, callback, errback):
+    def __soap_request(self, method, scenario, args, callback, errback,
+            multiple=False):
         token = str(self._tokens[LiveService.CONTACTS])
 
         http_headers = method.transport_headers()
         soap_action = method.soap_action()
 
         soap_header = method.soap_header(scenario, token)
-        soap_body = method.soap_body(*args)
+        if multiple:
+            soap_body = method.soap_body_multiple(*args)
+        else:
+            soap_body = method.soap_body(*args)
         
         method_name = method.__name__.rsplit(".", 1)[1]
         self._send_request(method_name,
                            self._service.url, 
                            soap_header, soap_body, soap_action, 
                            callback, errback,
-                           http_headers)
+                           http_headers, multiple)
 
     def _HandleSOAPFault(self, request_id, callback, errback,
             soap_response, user_data):
         errback[0](soap_response.fault.faultcode, *errback[1:])
 
+    def _HandleInvalidResponse(self, request_id, callback, errback,
+            user_data):
+        errback[0]("InvalidResponse", *errback[1:])
+
 if __name__ == '__main__':
     import sys
     import getpass
@@ -30,6 +30,7 @@ from pymsn.util.decorator import rw_property
 from pymsn.profile import ContactType
 from pymsn.service.AddressBook.constants import *
 from pymsn.service.description.AB.constants import *
+from pymsn.service.AddressBook.scenario.base import Scenario
 from pymsn.service.AddressBook.scenario.contacts import *
 
 import gobject
@@ -37,12 +38,171 @@ import gobject
 __all__ = ['AddressBook', 'AddressBookState']
 
 class AddressBookStorage(set):
+    """The set of contacts of the address book, indexed on the account and
+    the id of the contacts for the lookups done when applying changes, and
+    on their domain for building the contact list payloads."""
+
+    NULL_ID = "00000000-0000-0000-0000-000000000000"
+
     def __init__(self, initial_set=()):
         set.__init__(self, initial_set)
+        self._accounts = {}
+        self._ids = {}
+        self._domains = {}
+        for contact in self:
+            self.__index(contact)
 
     def __repr__(self):
         return "AddressBook : %d contact(s)" % len(self)
 
+    def __index(self, contact):
+        account = contact.account.lower()
+        if account not in self._accounts:
+            self._accounts[account] = set()
+        self._accounts[account].add(contact)
+        if contact.id != self.NULL_ID:
+            self._ids[contact.id] = contact
+        self._domains.setdefault(contact.domain, set()).add(contact)
+
+    def __unindex(self, contact):
+        account = contact.account.lower()
+        contacts = self._accounts.get(account, None)
+        if contacts is not None:
+            contacts.discard(contact)
+            if len(contacts) == 0:
+                del self._accounts[account]
+        if self._ids.get(contact.id, None) is contact:
+            del self._ids[contact.id]
+        contacts = self._domains.get(contact.domain, None)
+        if contacts is not None:
+            contacts.discard(contact)
+            if len(contacts) == 0:
+                del self._domains[contact.domain]
+
+    def add(self, contact):
+        set.add(self, contact)
+        self.__index(contact)
+
+    def discard(self, contact):
+        if contact in self:
+            set.discard(self, contact)
+            self.__unindex(contact)
+
+    def remove(self, contact):
+        set.remove(self, contact)
+        self.__unindex(contact)
+
+    def clear(self):
+        set.clear(self)
+        self._accounts.clear()
+        self._ids.clear()
+        self._domains.clear()
+
+    def __reindex(self):
+        self._accounts.clear()
+        self._ids.clear()
+        self._domains.clear()
+        for contact in self:
+            self.__index(contact)
+
+    # the set operations build their result without calling __init__,
+    # they are wrapped so that the results and the updated sets are indexed
+    def copy(self):
+        return AddressBookStorage(self)
+
+    def union(self, *others):
+        return AddressBookStorage(set.union(self, *others))
+
+    def intersection(self, *others):
+        return AddressBookStorage(set.intersection(self, *others))
+
+    def difference(self, *others):
+        return AddressBookStorage(set.difference(self, *others))
+
+    def symmetric_difference(self, other):
+        return AddressBookStorage(set.symmetric_difference(self, other))
+
+    def __or__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        return self.union(other)
+
+    def __and__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        return self.intersection(other)
+
+    def __sub__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        return self.difference(other)
+
+    def __xor__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        return self.symmetric_difference(other)
+
+    def update(self, *others):
+        for other in others:
+            for contact in other:
+                self.add(contact)
+
+    def intersection_update(self, *others):
+        set.intersection_update(self, *others)
+        self.__reindex()
+
+    def difference_update(self, *others):
+        for other in others:
+            for contact in other:
+                self.discard(contact)
+
+    def symmetric_difference_update(self, other):
+        set.symmetric_difference_update(self, other)
+        self.__reindex()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __iand__(self, other):
+        self.intersection_update(other)
+        return self
+
+    def __isub__(self, other):
+        self.difference_update(other)
+        return self
+
+    def __ixor__(self, other):
+        self.symmetric_difference_update(other)
+        return self
+
+    def pop(self):
+        contact = set.pop(self)
+        self.__unindex(contact)
+        return contact
+
+    def search_by_account(self, account):
+        return AddressBookStorage(self._accounts.get(account.lower(), ()))
+
+    def iter_by_domain(self):
+        """Yields (domain, contacts) tuples from the domain index, the
+        contacts of a domain are copied when it is reached so that the
+        address book may change while iterating."""
+        for domain in self._domains.keys():
+            contacts = self._domains.get(domain, None)
+            if contacts:
+                yield domain, list(contacts)
+
+    def search_by_id(self, id):
+        # the id of a contact changes once it is added to the address book
+        contact = self._ids.get(id, None)
+        if contact is not None and contact.id == id and contact in self:
+            return AddressBookStorage((contact,))
+        result = self.search_by('id', id)
+        if id != self.NULL_ID and len(result) > 0:
+            self._ids[id] = result[0]
+        return result
+
     def __getitem__(self, key):
         i = 0
         for contact in self:
@@ -187,12 +347,22 @@ class AddressBook(gobject.GObject):
                    gobject.PARAM_READABLE)
         }
 
-    def __init__(self, sso, proxies=None):
-        """The address book object."""
+    # the address book contacts are stored with their fields in the order
+    # of their _TAGS, changing these invalidates the stored snapshots
+    SNAPSHOT_VERSION = (2, ab.Contact._TAGS, ab.ContactEmail._TAGS)
+
+    def __init__(self, sso, proxies=None, storage=None):
+        """The address book object.
+
+            @param storage: the storage in which the address book is kept
+                between sessions, so that only the changes are requested
+                when synchronizing, or None to always do a full sync
+            @type storage: L{pymsn.storage.AbstractStorage}"""
         gobject.GObject.__init__(self)
 
         self._ab = ab.AB(sso, proxies)
         self._sharing = sharing.Sharing(sso, proxies)
+        self._storage = storage
 
         self.__state = AddressBookState.NOT_SYNCHRONIZED
 
@@ -222,15 +392,20 @@ class AddressBook(gobject.GObject):
         if self._state != AddressBookState.NOT_SYNCHRONIZED:
             return
         self._state = AddressBookState.SYNCHRONIZING
+        self.__sync(self.__load_snapshot())
 
+    def __sync(self, snapshot):
+        """Synchronizes the address book, only requesting the changes
+        since the given snapshot was taken if any."""
         def callback(address_book, memberships):
-            ab = address_book.ab
-            contacts = address_book.contacts
-            groups = address_book.groups
-            for group in groups:
+            new_snapshot = self.__update_snapshot(snapshot,
+                    address_book, memberships)
+            self.__store_snapshot(new_snapshot)
+
+            for group in new_snapshot['groups'].itervalues():
                 g = profile.Group(group.Id, group.Name.encode("utf-8"))
                 self.groups.add(g)
-            for contact in contacts:
+            for contact in new_snapshot['contacts'].itervalues():
                 c = self.__build_contact(contact)
                 if c is None:
                     continue
@@ -238,14 +413,104 @@ class AddressBook(gobject.GObject):
                     self._profile = c
                 else:
                     self.contacts.add(c)
-            self.__update_memberships(memberships)
+            self.__update_memberships(new_snapshot['memberships'].itervalues())
             self._state = AddressBookState.SYNCHRONIZED
 
+        def errback(error_code, *args):
+            if snapshot is not None and \
+                    error_code == AddressBookError.FULL_SYNC_REQUIRED:
+                # the server refused the deltas, do a full sync instead
+                self.__discard_snapshot()
+                self.__sync(None)
+                return
+            self.__common_errback(error_code, *args)
+
         initial_sync = scenario.InitialSyncScenario(self._ab, self._sharing,
                 (callback,),
-                (self.__common_errback,))
+                (errback,))
+        if snapshot is not None:
+            self._ab._last_changes = snapshot['ab_last_change']
+            self._sharing._last_changes = snapshot['membership_last_change']
+            initial_sync.deltas_only = True
         initial_sync()
 
+    def __load_snapshot(self):
+        if self._storage is None:
+            return None
+        try:
+            snapshot = self._storage.get('snapshot', None)
+        except Exception:
+            # undecryptable, truncated or referring to classes that
+            # changed since it was stored
+            snapshot = None
+        if snapshot is None:
+            return None
+
+        if not isinstance(snapshot, dict) or \
+                snapshot.get('version', None) != self.SNAPSHOT_VERSION:
+            self.__discard_snapshot()
+            return None
+        for key in ('groups', 'contacts', 'memberships'):
+            if not isinstance(snapshot.get(key, None), dict):
+                self.__discard_snapshot()
+                return None
+        for key in ('ab_last_change', 'membership_last_change'):
+            if not isinstance(snapshot.get(key, None), basestring):
+                self.__discard_snapshot()
+                return None
+        return snapshot
+
+    def __store_snapshot(self, snapshot):
+        if self._storage is not None:
+            self._storage['snapshot'] = snapshot
+
+    def __discard_snapshot(self):
+        if self._storage is not None and 'snapshot' in self._storage:
+            del self._storage['snapshot']
+
+    def __update_snapshot(self, snapshot, address_book, memberships):
+        """Applies the result of a FindAll and a FindMembership on a
+        snapshot, a new snapshot is returned when doing a full sync."""
+        if snapshot is None:
+            snapshot = {'version' : self.SNAPSHOT_VERSION,
+                        'groups' : {},
+                        'contacts' : {},
+                        'memberships' : {}}
+
+        groups = snapshot['groups']
+        for group in address_book.groups:
+            if group.Deleted:
+                groups.pop(group.Id, None)
+            else:
+                groups[group.Id] = group
+
+        contacts = snapshot['contacts']
+        for contact in address_book.contacts:
+            if contact.Deleted:
+                contacts.pop(contact.Id, None)
+            else:
+                contacts[contact.Id] = contact
+
+        members = snapshot['memberships']
+        for member in memberships:
+            key = member.Key
+            stored_member = members.get(key, None)
+            if stored_member is not None:
+                roles = stored_member.Roles.copy()
+                for role in member.DeletedRoles:
+                    roles.pop(role, None)
+                roles.update(member.Roles)
+                member.Roles = roles
+            member.DeletedRoles = {}
+            if len(member.Roles) > 0:
+                members[key] = member
+            else:
+                members.pop(key, None)
+
+        snapshot['ab_last_change'] = self._ab._last_changes
+        snapshot['membership_last_change'] = self._sharing._last_changes
+        return snapshot
+
     # Public API
     def accept_contact_invitation(self, pending_contact, add_to_contact_list=True):
         def callback(contact_infos, memberships):
@@ -280,42 +545,16 @@ class AddressBook(gobject.GObject):
     def add_messenger_contact(self, account, invite_display_name='', 
             invite_message='', groups=[], network_id=NetworkID.MSN):
         def callback(contact_guid, address_book_delta):
-            contacts = address_book_delta.contacts
-            for contact in contacts:
-                if contact.Id != contact_guid:
-                    continue
-                try:
-                    c = self.contacts.search_by_account(contact.PassportName).\
-                            search_by_network_id(NetworkID.MSN)[0]
-                    c.freeze_notify()
-                    c._id = contact.Id
-                    c._cid = contact.CID
-                    c._display_name = contact.DisplayName
-                    for group in self.groups:
-                        if group.id in contact.Groups:
-                            c._add_group_ownership(group)
-                    c._add_membership(profile.Membership.FORWARD)
-                    c._add_membership(profile.Membership.ALLOW)
-
-                    annotations = contact.Annotations
-                    for key in annotations:
-                        annotations[key] = annotations[key].encode("utf-8")
-                    contact_infos = {ContactGeneral.ANNOTATIONS : annotations}
-
-                    c._server_infos_changed(contact_infos)
-                    c.thaw_notify()
-                    self.unblock_contact(c)
-                except IndexError:
-                    c = self.__build_contact(contact)
-                    if c.is_member(profile.Membership.FORWARD):
-                        c._add_membership(profile.Membership.ALLOW)
-                    if c is None:
-                        continue
-                    self.contacts.add(c)
-                    self.emit('messenger-contact-added', c)
-                    self.unblock_contact(c)
-                for group in groups:
-                    self.add_contact_to_group(group, c)
+            self.apply_delta(address_book_delta)
+            try:
+                c = self.contacts.search_by_id(contact_guid)[0]
+            except IndexError:
+                return
+            if not c.is_member(profile.Membership.ALLOW):
+                c._add_membership(profile.Membership.ALLOW)
+            self.unblock_contact(c)
+            for group in groups:
+                self.add_contact_to_group(group, c)
 
         try:
             contact = self.contacts.search_by_account(account).\
@@ -464,14 +703,254 @@ class AddressBook(gobject.GObject):
         dc.group_guid = group.id
         dc.contact_guid = contact.id
         dc()
+
+    def add_messenger_contacts(self, accounts, invite_display_name='',
+            invite_message='', groups=[]):
+        """Adds many messenger contacts using multi-item requests.
+
+            The accounts already in the contact list as messenger contacts
+            are skipped, a single delta synchronization is done once every
+            contact was added."""
+        contacts = []
+        for account in accounts:
+            try:
+                contact = self.contacts.search_by_account(account).\
+                    search_by_network_id(NetworkID.MSN)[0]
+            except IndexError:
+                contact = None
+            if contact is not None and \
+                    contact.id != AddressBookStorage.NULL_ID:
+                if not contact.is_member(profile.Membership.FORWARD):
+                    self.__upgrade_mail_contact(contact, groups)
+                continue
+            invite_info = { 'display_name' : invite_display_name,
+                            'invite_message' : invite_message }
+            contacts.append(({ 'passport_name' : account }, invite_info))
+
+        bu = self.__bulk_update()
+        bu.add_contacts(contacts, [group.id for group in groups])
+        bu()
+
+    def add_contacts_to_group(self, group, contacts):
+        """Adds many contacts to a group using multi-item requests."""
+        bu = self.__bulk_update()
+        bu.add_contacts_to_group(group.id, [contact.id for contact in contacts])
+        bu()
+
+    def block_contacts(self, contacts):
+        """Blocks many contacts using multi-item requests."""
+        bu = self.__bulk_update(contacts, 'contact-blocked')
+        bu.scenario = Scenario.BLOCK_UNBLOCK
+        self.__queue_memberships(bu.delete_members, "Allow",
+                [c for c in contacts if c.is_member(profile.Membership.ALLOW)])
+        self.__queue_memberships(bu.add_members, "Block",
+                [c for c in contacts if not c.is_member(profile.Membership.BLOCK)])
+        bu()
+
+    def unblock_contacts(self, contacts):
+        """Unblocks many contacts using multi-item requests."""
+        bu = self.__bulk_update(contacts, 'contact-unblocked')
+        bu.scenario = Scenario.BLOCK_UNBLOCK
+        self.__queue_memberships(bu.delete_members, "Block",
+                [c for c in contacts if c.is_member(profile.Membership.BLOCK)])
+        self.__queue_memberships(bu.add_members, "Allow",
+                [c for c in contacts if not c.is_member(profile.Membership.ALLOW)])
+        bu()
     # End of public API
 
+    def __bulk_update(self, contacts=(), signal=None):
+        def callback(address_book_delta, memberships_delta, failed):
+            self.apply_delta(address_book_delta, memberships_delta)
+            for item, error_code in failed:
+                self.emit('error', error_code)
+            if signal is None:
+                return
+            failed_accounts = set()
+            for item, error_code in failed:
+                if isinstance(item, tuple): # (contact_info, invite_info)
+                    item = item[0].get('passport_name', None)
+                failed_accounts.add(item)
+            for contact in contacts:
+                if contact.account not in failed_accounts:
+                    self.emit(signal, contact)
+        return scenario.BulkUpdateScenario(self._ab, self._sharing,
+                (callback,),
+                (self.__common_errback,))
+
+    def __queue_memberships(self, queue, role, contacts):
+        for network, type in ((NetworkID.MSN, "Passport"),
+                              (NetworkID.EXTERNAL, "Email")):
+            accounts = [c.account for c in contacts if c.network_id == network]
+            if len(accounts) > 0:
+                queue(role, type, accounts)
+
     def check_pending_invitations(self):
         cp = scenario.CheckPendingInviteScenario(self._sharing,
                  (self.__update_memberships,),
                  (self.__common_errback,))
         cp()
 
+    def apply_delta(self, address_book_delta, memberships_delta=()):
+        """Merges changes returned by the server into the address book.
+
+            Only the properties that actually changed are notified, and the
+            notifications of each contact are emitted once all the changes
+            have been applied.
+
+            @param address_book_delta: the result of an AB.FindAll call
+                with deltas_only set, or None
+            @param memberships_delta: the result of a Sharing.FindMembership
+                call with deltas_only set"""
+        frozen = []
+        def freeze(contact):
+            if contact not in frozen:
+                contact.freeze_notify()
+                frozen.append(contact)
+
+        try:
+            if address_book_delta is not None:
+                self.__apply_groups_delta(address_book_delta.groups)
+                self.__apply_contacts_delta(address_book_delta.contacts,
+                        freeze)
+            self.__apply_memberships_delta(memberships_delta, freeze)
+        finally:
+            for contact in frozen:
+                contact.thaw_notify()
+
+    def __apply_groups_delta(self, groups_delta):
+        groups = dict([(group.id, group) for group in self.groups])
+        for group_delta in groups_delta:
+            group = groups.get(group_delta.Id, None)
+            if group_delta.Deleted:
+                if group is None:
+                    continue
+                for contact in self.contacts:
+                    if group in contact.groups:
+                        contact._delete_group_ownership(group)
+                self.groups.discard(group)
+                self.emit('group-deleted', group)
+            elif group is None:
+                group = profile.Group(group_delta.Id,
+                        group_delta.Name.encode("utf-8"))
+                self.groups.add(group)
+                self.emit('group-added', group)
+            else:
+                name = group_delta.Name.encode("utf-8")
+                if name != group.name:
+                    group._server_property_changed("name", name)
+                    self.emit('group-renamed', group)
+
+    def __apply_contacts_delta(self, contacts_delta, freeze):
+        for contact_delta in contacts_delta:
+            if contact_delta.Type == ContactType.ME:
+                if self._profile is not None and not contact_delta.Deleted:
+                    freeze(self._profile)
+                    self.__update_contact(self._profile, contact_delta)
+                continue
+
+            contact = self.__find_contact(contact_delta)
+            if contact_delta.Deleted:
+                if contact is not None:
+                    self.contacts.discard(contact)
+                    self.emit('contact-deleted', contact)
+                continue
+
+            if contact is None:
+                contact = self.__build_contact(contact_delta)
+                if contact is None:
+                    continue
+                self.contacts.add(contact)
+                self.emit('messenger-contact-added', contact)
+                continue
+
+            freeze(contact)
+            self.__update_contact(contact, contact_delta)
+
+    def __apply_memberships_delta(self, memberships_delta, freeze):
+        for member in memberships_delta:
+            if isinstance(member, sharing.PassportMember):
+                network = NetworkID.MSN
+            elif isinstance(member, sharing.EmailMember):
+                network = NetworkID.EXTERNAL
+            else:
+                continue
+
+            try:
+                contact = self.contacts.search_by_account(member.Account).\
+                    search_by_network_id(network)[0]
+            except IndexError:
+                if len(member.Roles) > 0:
+                    self.__update_memberships((member,))
+                continue
+
+            memberships = contact.memberships
+            for role in member.DeletedRoles:
+                memberships &= ~self.__role_membership(role)
+            for role in member.Roles:
+                memberships |= self.__role_membership(role)
+            if memberships != contact.memberships:
+                freeze(contact)
+                contact._set_memberships(memberships)
+
+    def __find_contact(self, contact_delta):
+        try:
+            return self.contacts.search_by_id(contact_delta.Id)[0]
+        except IndexError:
+            pass
+
+        account = contact_delta.PassportName
+        network = NetworkID.MSN
+        for email in contact_delta.Emails:
+            if email.Type == ContactEmailType.EXTERNAL:
+                account = email.Email
+                network = NetworkID.EXTERNAL
+                break
+        if not account:
+            return None
+        try:
+            return self.contacts.search_by_account(account).\
+                search_by_network_id(network)[0]
+        except IndexError:
+            return None
+
+    def __update_contact(self, contact, contact_delta):
+        if contact.id != contact_delta.Id and contact in self.contacts:
+            # keep the contacts index up to date
+            self.contacts.discard(contact)
+            contact._id = contact_delta.Id
+            self.contacts.add(contact)
+        contact._id = contact_delta.Id
+        contact._cid = contact_delta.CID
+
+        display_name = contact_delta.DisplayName
+        if display_name == "":
+            display_name = contact_delta.QuickName
+        if display_name:
+            contact._server_property_changed("display-name",
+                    display_name.encode("utf-8"))
+
+        if contact_delta.IsMessengerUser and \
+                not contact.is_member(profile.Membership.FORWARD):
+            contact._add_membership(profile.Membership.FORWARD)
+
+        annotations = {}
+        for key, value in contact_delta.Annotations.iteritems():
+            annotations[key] = value.encode("utf-8")
+        if contact.infos.get(ContactGeneral.ANNOTATIONS, None) != annotations:
+            contact._server_infos_changed(
+                    {ContactGeneral.ANNOTATIONS : annotations})
+
+        if contact is self._profile:
+            return
+        for group in self.groups:
+            if group.id in contact_delta.Groups:
+                if group not in contact.groups:
+                    contact._add_group_ownership(group)
+                    self.emit('group-contact-added', group, contact)
+            elif group in contact.groups:
+                contact._delete_group_ownership(group)
+                self.emit('group-contact-deleted', group, contact)
+
     def __build_contact(self, contact):
         external_email = None
         for email in contact.Emails:
@@ -484,9 +963,9 @@ class AddressBook(gobject.GObject):
             if display_name == "":
                 display_name = external_email.Email
 
-            annotations = contact.Annotations
-            for key in annotations:
-                annotations[key] = annotations[key].encode("utf-8")
+            annotations = {}
+            for key, value in contact.Annotations.iteritems():
+                annotations[key] = value.encode("utf-8")
             contact_infos = { ContactGeneral.ANNOTATIONS : annotations }
 
             if contact.IsMessengerUser:
@@ -518,9 +997,9 @@ class AddressBook(gobject.GObject):
             if display_name == "":
                 display_name = contact.PassportName
 
-            annotations = contact.Annotations
-            for key in annotations:
-                annotations[key] = annotations[key].encode("utf-8")
+            annotations = {}
+            for key, value in contact.Annotations.iteritems():
+                annotations[key] = value.encode("utf-8")
             contact_infos = {ContactGeneral.ANNOTATIONS : annotations}
 
             if contact.IsMessengerUser:
@@ -575,21 +1054,23 @@ class AddressBook(gobject.GObject):
                 contact = c
 
             for role in member.Roles:
-                if role == "Allow":
-                    membership = profile.Membership.ALLOW
-                elif role == "Block":
-                    membership = profile.Membership.BLOCK
-                elif role == "Reverse":
-                    membership = profile.Membership.REVERSE
-                elif role == "Pending":
-                    membership = profile.Membership.PENDING
-                else:
-                    raise NotImplementedError("Unknown Membership Type : " + membership)
-                contact._add_membership(membership)
+                contact._add_membership(self.__role_membership(role))
 
             if new_contact and self.state == AddressBookState.SYNCHRONIZED:
                 self.emit('messenger-contact-added', contact)
 
+    def __role_membership(self, role):
+        if role == "Allow":
+            return profile.Membership.ALLOW
+        elif role == "Block":
+            return profile.Membership.BLOCK
+        elif role == "Reverse":
+            return profile.Membership.REVERSE
+        elif role == "Pending":
+            return profile.Membership.PENDING
+        else:
+            raise NotImplementedError("Unknown Membership Type : " + role)
+
     # Callbacks
     def __common_errback(self, error_code, *args):
         self.emit('error', error_code)
@@ -34,6 +34,8 @@ class AddressBookError(object):
 
     MEMBER_ALREADY_EXISTS   = 7
     MEMBER_DOES_NOT_EXIST   = 8
+
+    FULL_SYNC_REQUIRED      = 9
     
 
 class AddressBookState(object):
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+from pymsn.service.AddressBook.scenario.base import BaseScenario
+from pymsn.service.AddressBook.scenario.base import Scenario
+from pymsn.service.AddressBook.constants import *
+
+from pymsn.profile import ContactType
+
+__all__ = ['BulkUpdateScenario']
+
+class BulkUpdateScenario(BaseScenario):
+    """Scenario used to apply the same kind of change to many contacts.
+
+       The changes are sent as multi-item requests of at most C{batch_size}
+       items, at most C{max_requests} of them being sent at the same time.
+       Once every request completed, a single delta synchronization is
+       done and passed to the callback along with the failed items.
+
+       A batch the server refuses is split and its items are sent one by
+       one, so that a single invalid item only fails itself."""
+
+    def __init__(self, ab, sharing, callback, errback,
+                 partner_scenario=Scenario.CONTACT_SAVE):
+        """Updates many contacts at once.
+
+            @param ab: the address book service
+            @param sharing: the membership service
+            @param callback: tuple(callable, *args), called with the address
+                book delta, the memberships delta and the list of
+                (item, error_code) tuples of the failed items
+            @param errback: tuple(callable, *args)
+        """
+        BaseScenario.__init__(self, partner_scenario, callback, errback)
+        self.__ab = ab
+        self.__sharing = sharing
+
+        self.max_requests = 4
+        self.batch_size = 50
+
+        self.__queue = []
+        self.__pending = 0
+        self.__failed = []
+        self.__ab_changed = False
+        self.__sharing_changed = False
+        self.__synchronizing = False
+        self.__sync_failed = False
+
+        self.__ab_delta = None
+        self.__memberships_delta = None
+
+    def add_contacts(self, contacts, groups=(), auto_manage_allow_list=True):
+        """Queues the addition of messenger contacts.
+
+            @param contacts: a list of (contact_info, invite_info) tuples
+            @param groups: the ids of the groups to add the new contacts to
+        """
+        items = []
+        for contact_info, invite_info in contacts:
+            contact_info = contact_info.copy()
+            contact_info.setdefault('contact_type', ContactType.REGULAR)
+            contact_info.setdefault('is_messenger_user', True)
+            items.append((contact_info, invite_info))
+        self.__enqueue('ContactsAdd', (tuple(groups), auto_manage_allow_list),
+                items)
+
+    def add_contacts_to_group(self, group_guid, contact_guids):
+        """Queues the addition of contacts to a group."""
+        self.__enqueue('GroupContactsAdd', group_guid, contact_guids)
+
+    def add_members(self, member_role, type, accounts, state='Accepted'):
+        """Queues the addition of members of the given type
+        ('Passport' | 'Email') to a membership list."""
+        self.__enqueue('AddMembers', (member_role, type, state), accounts)
+
+    def delete_members(self, member_role, type, accounts, state='Accepted'):
+        """Queues the deletion of members of the given type
+        ('Passport' | 'Email') from a membership list."""
+        self.__enqueue('DeleteMembers', (member_role, type, state), accounts)
+
+    def __enqueue(self, method, key, items):
+        items = list(items)
+        for i in range(0, len(items), self.batch_size):
+            self.__queue.append((method, key, items[i:i + self.batch_size]))
+
+    def execute(self):
+        self.__process()
+
+    def __process(self):
+        while len(self.__queue) > 0 and self.__pending < self.max_requests:
+            method, key, items = self.__queue.pop(0)
+            self.__pending += 1
+            self.__send(method, key, items)
+
+        if len(self.__queue) == 0 and self.__pending == 0:
+            self.__sync()
+
+    def __send(self, method, key, items):
+        callback = (self.__request_callback, method, key, items)
+        errback = (self.__request_errback, method, key, items)
+        if method == 'ContactsAdd':
+            groups, auto_manage_allow_list = key
+            self.__ab.ContactsAdd(callback, errback, self._scenario,
+                    items, auto_manage_allow_list)
+        elif method == 'GroupContactsAdd':
+            self.__ab.GroupContactsAdd(callback, errback, Scenario.GROUP_SAVE,
+                    key, items)
+        elif method == 'AddMembers':
+            self.__sharing.AddMembers(callback, errback, self._scenario,
+                    key[0], key[1], key[2], items)
+        elif method == 'DeleteMembers':
+            self.__sharing.DeleteMembers(callback, errback, self._scenario,
+                    key[0], key[1], key[2], items)
+
+    def __request_callback(self, *args):
+        method, key, items = args[-3:]
+        self.__pending -= 1
+        if method in ('ContactsAdd', 'GroupContactsAdd'):
+            self.__ab_changed = True
+        else:
+            self.__sharing_changed = True
+
+        if method == 'ContactsAdd':
+            guids = args[0]
+            # the server manages the Allow list of the new contacts
+            if key[1]:
+                self.__sharing_changed = True
+            for group_guid in key[0]:
+                self.__queue.append(('GroupContactsAdd', group_guid, guids))
+        self.__process()
+
+    def __request_errback(self, error_code, method, key, items):
+        self.__pending -= 1
+        if len(items) > 1:
+            for item in items:
+                self.__queue.insert(0, (method, key, [item]))
+        else:
+            self.__failed.append((items[0], self.__error(error_code)))
+        self.__process()
+
+    def __error(self, error_code):
+        if error_code == 'ContactAlreadyExists':
+            return AddressBookError.CONTACT_ALREADY_EXISTS
+        elif error_code == 'InvalidPassportUser':
+            return AddressBookError.INVALID_CONTACT_ADDRESS
+        elif error_code == 'MemberAlreadyExists':
+            return AddressBookError.MEMBER_ALREADY_EXISTS
+        elif error_code == 'MemberDoesNotExist':
+            return AddressBookError.MEMBER_DOES_NOT_EXIST
+        return AddressBookError.UNKNOWN
+
+    def __sync(self):
+        if self.__synchronizing:
+            return
+        self.__synchronizing = True
+        if not self.__ab_changed and not self.__sharing_changed:
+            self.__done()
+            return
+
+        if self.__ab_changed:
+            self.__ab.FindAll((self.__ab_findall_callback,),
+                              (self.__sync_errback,),
+                              self._scenario, True)
+        if self.__sharing_changed:
+            self.__sharing.FindMembership((self.__membership_findall_callback,),
+                                          (self.__sync_errback,),
+                                          self._scenario, ['Messenger'], True)
+
+    def __ab_findall_callback(self, address_book_delta):
+        self.__ab_delta = address_book_delta
+        self.__ab_changed = False
+        if not self.__sharing_changed and not self.__sync_failed:
+            self.__done()
+
+    def __membership_findall_callback(self, memberships_delta):
+        self.__memberships_delta = memberships_delta
+        self.__sharing_changed = False
+        if not self.__ab_changed and not self.__sync_failed:
+            self.__done()
+
+    def __done(self):
+        callback = self._callback
+        callback[0](self.__ab_delta, self.__memberships_delta or [],
+                self.__failed, *callback[1:])
+
+    def __sync_errback(self, error_code):
+        # both requests may fail, only report the first failure
+        if self.__sync_failed:
+            return
+        self.__sync_failed = True
+        errback = self._errback[0]
+        args = self._errback[1:]
+        errback(AddressBookError.UNKNOWN, *args)
@@ -28,6 +28,9 @@ class InitialSyncScenario(BaseScenario):
             @param membership: the address book service
             @param callback: tuple(callable, *args)
             @param errback: tuple(callable, *args)            
+
+            When deltas_only is set, only the changes since the last
+            synchronization are requested.
         """
         BaseScenario.__init__(self, 'Initial', callback, errback)
         self.__membership = membership
@@ -35,18 +38,22 @@ class InitialSyncScenario(BaseScenario):
 
         self.__membership_response = None
         self.__ab_response = None
+        self.__failed = False
+
+        self.deltas_only = False
 
         # FIXME : get the real account for 'Me'
         self.__account = account
 
     def execute(self):
+        self.__failed = False
         self.__address_book.FindAll((self.__ab_findall_callback,),
                                     (self.__ab_findall_errback,),
-                                    self._scenario, False)
+                                    self._scenario, self.deltas_only)
         self.__membership.FindMembership((self.__membership_findall_callback,),
                                          (self.__membership_findall_errback,),
                                          self._scenario, ['Messenger'],
-                                         False)
+                                         self.deltas_only)
 
     def __membership_findall_callback(self, result):
         self.__membership_response = result
@@ -73,8 +80,16 @@ class InitialSyncScenario(BaseScenario):
         self.__sync_errback(error_code)
 
     def __sync_errback(self, error_code):
+        # both requests may fail, only report the first failure
+        if self.__failed:
+            return
+        self.__failed = True
+        self.__membership_response = None
+        self.__ab_response = None
         errcode = AddressBookError.UNKNOWN
-        if error_code == 'ABDoesNotExist':
+        if error_code == 'FullSyncRequired':
+            errcode = AddressBookError.FULL_SYNC_REQUIRED
+        elif error_code == 'ABDoesNotExist':
             self.__ab.ABAdd((self.__ab_add_callback,),
                             (self.__ab_add_errback,),
                             self._scenario,
@@ -28,6 +28,7 @@ __all__ = ['Sharing']
 class Member(object):
     def __init__(self, member):
         self.Roles = {}
+        self.DeletedRoles = {} # roles removed, only found in deltas
         self.Account = ""
         self.MembershipId = member.findtext("./ab:MembershipId")
         self.Type = member.findtext("./ab:Type")
@@ -39,11 +40,16 @@ class Member(object):
         self.Changes = [] # FIXME: extract the changes
         self.Annotations = annotations_to_dict(member.find("./ab:Annotations"))
 
+    @property
+    def Key(self):
+        """Identifies the member across the membership lists"""
+        return (self.Type, self.Account)
+
     def __hash__(self):
-        return hash(self.Type) ^ hash(self.Account)
+        return hash(self.Key)
 
     def __eq__(self, other):
-        return (self.Type == other.Type) and (self.Account == other.Account)
+        return self.Key == other.Key
 
     def __repr__(self):
         return "<%sMember account=%s roles=%r>" % (self.Type, self.Account, self.Roles)
@@ -84,8 +90,18 @@ class PhoneMember(Member):
         Member.__init__(self, member)
         self.PhoneNumber = member.findtext("./ab:PhoneNumber")
 
+    @property
+    def Key(self):
+        # the phone members have no account
+        return (self.Type, self.PhoneNumber)
+
 
 class Sharing(SOAPService):
+    RESPONSE_DECODERS = {
+        "FindMembership" : {"ab:MemberRole" : lambda role: role.text,
+                            "ab:Member" : Member.new}
+        }
+
     def __init__(self, sso, proxies=None):
         self._sso = sso
         self._tokens = {}
@@ -115,15 +131,19 @@ class Sharing(SOAPService):
 
         memberships = {}
         for role, members in response[0].iteritems():
-            for member in members:
-                membership_id = XMLTYPE.int.decode(member.find("./ab:MembershipId").text)
-                member_obj = Member.new(member)
+            # the members were decoded while parsing
+            for member_obj in members:
+                membership_id = XMLTYPE.int.decode(member_obj.MembershipId)
                 member_id = hash(member_obj)
+                deleted = member_obj.Deleted
                 if member_id in memberships:
-                    memberships[member_id].Roles[role] = membership_id
+                    member_obj = memberships[member_id]
                 else:
-                    member_obj.Roles[role] = membership_id
                     memberships[member_id] = member_obj
+                if deleted:
+                    member_obj.DeletedRoles[role] = membership_id
+                else:
+                    member_obj.Roles[role] = membership_id
         callback[0](memberships.values(), *callback[1:])
 
     @RequireSecurityTokens(LiveService.CONTACTS)
@@ -139,6 +159,21 @@ class Sharing(SOAPService):
         self.__soap_request(self._service.AddMember, scenario,
                 (member_role, type, state, account), callback, errback)
 
+    @RequireSecurityTokens(LiveService.CONTACTS)
+    def AddMembers(self, callback, errback, scenario, member_role, type,
+                   state, accounts):
+        """Adds several members of the same type to a membership list in a
+        single request.
+
+            @param scenario: 'Timer' | 'BlockUnblock' | ...
+            @param member_role: 'Allow' | ...
+            @param accounts: the accounts of the members
+            @param callback: tuple(callable, *args)
+            @param errback: tuple(callable, *args)
+        """
+        self.__soap_request(self._service.AddMember, scenario,
+                (member_role, type, state, accounts), callback, errback, True)
+
     def _HandleAddMemberResponse(self, callback, errback, response, user_data):
         callback[0](*callback[1:])
 
@@ -156,17 +191,37 @@ class Sharing(SOAPService):
                             (member_role, type, state, account),
                             callback, errback)
 
+    @RequireSecurityTokens(LiveService.CONTACTS)
+    def DeleteMembers(self, callback, errback, scenario, member_role, type,
+                      state, accounts):
+        """Deletes several members of the same type from a membership list
+        in a single request.
+
+            @param scenario: 'Timer' | 'BlockUnblock' | ...
+            @param member_role: 'Block' | ...
+            @param accounts: the accounts of the members
+            @param callback: tuple(callable, *args)
+            @param errback: tuple(callable, *args)
+        """
+        self.__soap_request(self._service.DeleteMember, scenario,
+                            (member_role, type, state, accounts),
+                            callback, errback, True)
+
     def _HandleDeleteMemberResponse(self, callback, errback, response, user_data):
         callback[0](*callback[1:])
 
-    def __soap_request(self, method, scenario, args, callback, errback):
+    def __soap_request(self, method, scenario, args, callback, errback,
+            multiple=False):
         token = str(self._tokens[LiveService.CONTACTS])
 
         http_headers = method.transport_headers()
         soap_action = method.soap_action()
 
         soap_header = method.soap_header(scenario, token)
-        soap_body = method.soap_body(*args)
+        if multiple:
+            soap_body = method.soap_body_multiple(*args)
+        else:
+            soap_body = method.soap_body(*args)
         
         method_name = method.__name__.rsplit(".", 1)[1]
         self._send_request(method_name,
@@ -179,6 +234,10 @@ class Sharing(SOAPService):
             soap_response, user_data):
         errback[0](soap_response.fault.faultcode, *errback[1:])
 
+    def _HandleInvalidResponse(self, request_id, callback, errback,
+            user_data):
+        errback[0]("InvalidResponse", *errback[1:])
+
 if __name__ == '__main__':
     import sys
     import getpass
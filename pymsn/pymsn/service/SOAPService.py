@@ -25,7 +25,6 @@ from SOAPUtils import *
 import pymsn.gnet.protocol
 import pymsn.util.element_tree as ElementTree
 import pymsn.util.string_io as StringIO
-import re
 import logging
 
 __all__ = ['SOAPService', 'SOAPResponse']
@@ -46,16 +45,7 @@ def url_split(url, default_scheme='http'):
     resource = urlunsplit(('', '', path, query, fragment))
     return protocol, host, port, resource
 
-def compress_xml(xml_string):
-    space_regex = [(re.compile('>\s+<'), '><'),
-        (re.compile('>\s+'), '>'),
-        (re.compile('\s+<'), '<')]
-
-    for regex, replacement in space_regex:
-        xml_string = regex.sub(replacement, xml_string)
-    return xml_string
-
-soap_template = """<?xml version='1.0' encoding='utf-8'?>
+soap_template = compress_xml("""<?xml version='1.0' encoding='utf-8'?>
 <soap:Envelope xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
     <soap:Header>
         %s
@@ -63,7 +53,7 @@ soap_template = """<?xml version='1.0' encoding='utf-8'?>
     <soap:Body>
         %s
     </soap:Body>
-</soap:Envelope>"""
+</soap:Envelope>""")
 
 class SOAPFault(object):
     def __init__(self, tree):
@@ -110,7 +100,21 @@ class SOAPResponse(ElementTree.XMLResponse):
             "rsi" : XMLNS.MICROSOFT.LIVE.RSI,
             "spaces" : XMLNS.MICROSOFT.LIVE.SPACES }
 
-    def __init__(self, soap_data):
+    def __init__(self, soap_data, annotate_namespaces=False, decoders=None):
+        """Initializer
+
+            @param soap_data: the SOAP xml data
+            @param annotate_namespaces: if True, each element gets an
+                "(xmlns)" attribute holding the namespace declarations
+                in scope, this is costly on large responses
+            @param decoders: a dict mapping element tags such as
+                "ab:Contact" to callables, each element with one of these
+                tags is passed to its callable as soon as it is parsed and
+                is then dropped from the tree, the results are stored in
+                L{decoded} as (tag, result) tuples in document order"""
+        self._annotate_namespaces = annotate_namespaces
+        self._decoders = decoders
+        self.decoded = []
         ElementTree.XMLResponse.__init__(self, soap_data, self.NS_SHORTHANDS)
         try:
             self.header = self.tree.find("./soap:Header")
@@ -136,22 +140,63 @@ class SOAPResponse(ElementTree.XMLResponse):
             and self.tree is not None
 
     def _parse(self, data):
-        events = ("start", "end", "start-ns", "end-ns")
+        if not self._annotate_namespaces and not self._decoders:
+            return ElementTree.XML(data)
+
+        decoders = {}
+        if self._decoders:
+            for tag, decoder in self._decoders.iteritems():
+                prefix, name = tag.split(":", 1)
+                namespace = self.NS_SHORTHANDS[prefix]
+                decoders["{%s}%s" % (namespace, name)] = (tag, decoder)
+
+        if self._annotate_namespaces:
+            events = ("start", "end", "start-ns", "end-ns")
+        else:
+            events = ("start", "end")
         ns = []
+        parents = []
         data = StringIO.StringIO(data)
         context = ElementTree.iterparse(data, events=events)
         for event, elem in context:
-            if event == "start-ns":
+            if event == "start":
+                if self._annotate_namespaces:
+                    elem.set("(xmlns)", tuple(ns))
+                parents.append(elem)
+            elif event == "end":
+                parents.pop()
+                decoder = decoders.get(elem.tag, None)
+                if decoder is None:
+                    continue
+                # a record that cannot be decoded does not invalidate the
+                # whole response, it is skipped
+                try:
+                    self.decoded.append((decoder[0],
+                        decoder[1](self._element(elem))))
+                except Exception, e:
+                    logger.warning("SOAPResponse: skipping an invalid %s "
+                            "element : %s" % (decoder[0], e))
+                # keep only one decoded element in memory at a time
+                elem.clear()
+                if len(parents) > 0:
+                    parents[-1].remove(elem)
+            elif event == "start-ns":
                 ns.append(elem)
-            elif event == "end-ns":
+            else:
                 ns.pop()
-            elif event == "start":
-                elem.set("(xmlns)", tuple(ns))
         data.close()
         return context.root
 
 class SOAPService(object):
 
+    # services whose responses handling needs the "(xmlns)" annotations
+    # of the SOAPResponse elements should set this to True
+    ANNOTATE_NAMESPACES = False
+
+    # maps request ids to the decoders of the elements of their responses
+    # which are decoded while parsing, see SOAPResponse
+    RESPONSE_DECODERS = {}
+
     def __init__(self, name, proxies=None):
         self._name = name
         self._service = getattr(description, self._name)
@@ -172,7 +217,8 @@ class SOAPService(object):
         http_headers["Proxy-Connection"] = "Keep-Alive"
         http_headers["Connection"] = "Keep-Alive"
 
-        request = compress_xml(soap_template % (soap_header, soap_body))
+        # the description modules return minified headers and bodies
+        request = soap_template % (soap_header, soap_body)
 
         transport = self._get_transport(name, scheme, host, port,
                 callback, errback, user_data)
@@ -180,11 +226,15 @@ class SOAPService(object):
 
     def _response_handler(self, transport, http_response):
         logger.debug("<<< " + str(http_response))
-        soap_response = SOAPResponse(http_response.body)
         request_id, callback, errback, user_data = self._unref_transport(transport)
+        soap_response = SOAPResponse(http_response.body,
+                self.ANNOTATE_NAMESPACES,
+                self.RESPONSE_DECODERS.get(request_id, None))
 
         if not soap_response.is_valid():
             logger.warning("Invalid SOAP Response")
+            self._HandleInvalidResponse(request_id, callback, errback,
+                    user_data)
             return #FIXME: propagate the error up
 
         if not soap_response.is_fault():
@@ -222,6 +272,10 @@ class SOAPService(object):
             soap_response, user_data):
         logger.warning("Unhandled SOAPFault to %s" % request_id)
 
+    def _HandleInvalidResponse(self, request_id, callback, errback,
+            user_data):
+        pass
+
     def _HandleUnhandledResponse(self, request_id, callback, errback,
             response, user_data):
         logger.warning("Unhandled Response to %s" % request_id)
@@ -19,8 +19,20 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
+import re
 
-__all__ = ['XMLNS']
+__all__ = ['XMLNS', 'compress_xml']
+
+_space_regex = [(re.compile('>\s+<'), '><'),
+        (re.compile('>\s+'), '>'),
+        (re.compile('\s+<'), '<')]
+
+def compress_xml(xml_string):
+    """Removes the whitespaces surrounding the tags of an xml string, the
+    description modules use it to minify their templates once at load time"""
+    for regex, replacement in _space_regex:
+        xml_string = regex.sub(replacement, xml_string)
+    return xml_string
 
 class XMLNS(object):
 
@@ -23,6 +23,8 @@ from description.SingleSignOn.RequestMultipleSecurityTokens import LiveService
 import pymsn.storage
 
 import base64
+import gobject
+import logging
 import struct
 import time
 import datetime
@@ -33,6 +35,8 @@ from Crypto.Cipher import DES3
 
 __all__ = ['SingleSignOn', 'LiveService', 'RequireSecurityTokens']
 
+logger = logging.getLogger('Service')
+
 class SecurityToken(object):
     
     def __init__(self):
@@ -115,13 +119,30 @@ class RequireSecurityTokens(object):
 
 
 class SingleSignOn(SOAPService):
+    """Security tokens provider.
+
+    Tokens are cached in the storage and refreshed REFRESH_ADVANCE seconds
+    before they expire, so that callers never wait on an expired token.
+    Only one RequestMultipleSecurityTokens is in flight at any time, callers
+    needing tokens being requested already wait for that request, and the
+    other callers are batched together into the next request."""
+
+    REFRESH_ADVANCE = 300 # seconds
+    MIN_REFRESH_DELAY = 30 # seconds
+
     def __init__(self, username, password, proxies=None):
         self.__credentials = (username, password)
         self.__storage = pymsn.storage.get_storage(username, password,
                 "security-tokens")
 
+        self.__tokens = {}
+        self.__refreshed_services = set()
+        self.__refresh_timeout = None
+
         self.__pending_response = False
         self.__pending_requests = []
+        self.__inflight_services = ()
+        self.__inflight_waiters = []
         SOAPService.__init__(self, "SingleSignOn", proxies)
         self.url = self._service.url
 
@@ -130,51 +151,144 @@ class SingleSignOn(SOAPService):
             @param callback: tuple(callable, *args)
             @param errback: tuple(callable, *args)
             @param services: one or more L{LiveService}"""
+        self.__refreshed_services.update(services)
+        self.__request_tokens(callback, errback, services, False)
+        if self.__refresh_timeout is None:
+            self.__schedule_refresh()
 
-        #FIXME: we should instead check what are the common requested tokens
-        # and if some tokens are not common then do a parallel request, needs
-        # to be fixed later, for now, we just queue the requests
-        if self.__pending_response:
-            self.__pending_requests.append((callback, errback, services))
-            return
+    def DiscardSecurityTokens(self, services):
+        for service in services:
+            self.__tokens.pop(service, None)
+            del self.__storage[service[0]]
 
-        method = self._service.RequestMultipleSecurityTokens
+    def close(self):
+        """Stops refreshing the security tokens"""
+        if self.__refresh_timeout is not None:
+            gobject.source_remove(self.__refresh_timeout)
+            self.__refresh_timeout = None
+        self.__refreshed_services.clear()
 
-        response_tokens = {}
-        
-        requested_services = services
-        services = list(services)
-        for service in services: # filter already available tokens
-            service_url = service[0]
-            if service_url in self.__storage:
+    def __cached_tokens(self, services):
+        tokens = {}
+        for service in services:
+            token = self.__tokens.get(service, None)
+            if token is None:
+                service_url = service[0]
+                if service_url not in self.__storage:
+                    continue
                 try:
                     token = self.__storage[service_url]
                 except pymsn.storage.DecryptError:
                     continue
-                if not token.is_expired():
-                    services.remove(service)
-                    response_tokens[service] = token
+                self.__tokens[service] = token
+            if not token.is_expired():
+                tokens[service] = token
+        return tokens
+
+    def __request_tokens(self, callback, errback, services, force):
+        if force:
+            missing = list(services)
+        else:
+            tokens = self.__cached_tokens(services)
+            if len(tokens) == len(services):
+                if callback is not None:
+                    callback[0](tokens, *callback[1:])
+                return
+            missing = [service for service in services \
+                    if service not in tokens]
 
-        if len(services) == 0:
-            self._HandleRequestMultipleSecurityTokensResponse(callback,
-                    errback, [], (requested_services, response_tokens))
+        if self.__pending_response:
+            if set(missing).issubset(self.__inflight_services):
+                self.__inflight_waiters.append((callback, errback, services))
+            else:
+                self.__pending_requests.append((callback, errback, services,
+                    force))
             return
 
+        self.__send_request(missing, [(callback, errback, services)])
+
+    def __send_request(self, services, waiters):
+        method = self._service.RequestMultipleSecurityTokens
+
         http_headers = method.transport_headers()
         soap_action = method.soap_action()
-        
+
         soap_header = method.soap_header(*self.__credentials)
         soap_body = method.soap_body(*services)
 
         self.__pending_response = True
+        self.__inflight_services = tuple(services)
+        self.__inflight_waiters = waiters
         self._send_request("RequestMultipleSecurityTokens", self.url,
                 soap_header, soap_body, soap_action,
-                callback, errback, http_headers, (requested_services, response_tokens))
-    
+                None, None, http_headers, services)
+
+    def __request_done(self):
+        waiters = self.__inflight_waiters
+        self.__pending_response = False
+        self.__inflight_services = ()
+        self.__inflight_waiters = []
+        return waiters
+
+    def __process_pending_requests(self):
+        if self.__pending_response or len(self.__pending_requests) == 0:
+            return
+        pending_requests = self.__pending_requests
+        self.__pending_requests = []
+
+        missing = []
+        waiters = []
+        for callback, errback, services, force in pending_requests:
+            if force:
+                tokens = {}
+            else:
+                tokens = self.__cached_tokens(services)
+            if len(tokens) == len(services):
+                if callback is not None:
+                    callback[0](tokens, *callback[1:])
+                continue
+            waiters.append((callback, errback, services))
+            for service in services:
+                if service not in tokens and service not in missing:
+                    missing.append(service)
+
+        if len(missing) > 0:
+            self.__send_request(missing, waiters)
+
+    def __schedule_refresh(self):
+        if self.__refresh_timeout is not None:
+            gobject.source_remove(self.__refresh_timeout)
+            self.__refresh_timeout = None
+
+        expiries = [token.lifetime[1] \
+                for service, token in self.__tokens.iteritems() \
+                if service in self.__refreshed_services]
+        if len(expiries) == 0:
+            return
+        delay = min(expiries) - datetime.datetime.utcnow() - \
+                datetime.timedelta(seconds=self.REFRESH_ADVANCE)
+        delay = max(delay.days * 86400 + delay.seconds, self.MIN_REFRESH_DELAY)
+        self.__refresh_timeout = gobject.timeout_add(delay * 1000,
+                self.__refresh_expiring_tokens)
+
+    def __refresh_expiring_tokens(self):
+        self.__refresh_timeout = None
+        limit = datetime.datetime.utcnow() + \
+                datetime.timedelta(seconds=self.REFRESH_ADVANCE)
+        services = [service \
+                for service, token in self.__tokens.iteritems() \
+                if service in self.__refreshed_services and \
+                    token.lifetime[1] <= limit]
+        if len(services) > 0:
+            logger.info("Refreshing security tokens : %s" % \
+                    [service[0] for service in services])
+            self.__request_tokens(None, None, services, True)
+        else:
+            self.__schedule_refresh()
+        return False
+
     def _HandleRequestMultipleSecurityTokensResponse(self, callback, errback,
             response, user_data):
-        requested_services, response_tokens = user_data
-        result = {}
         for node in response:
             token = SecurityToken()
             token.type = node.findtext("./wst:TokenType")
@@ -200,35 +314,51 @@ class SingleSignOn(SOAPService):
             assert(service != None), "Unknown service URL : " + \
                     token.service_address
             self.__storage[token.service_address] = token
-            result[service] = token
-        result.update(response_tokens)
-
-        self.__pending_response = False
-
-        if callback is not None:
-            callback[0](result, *callback[1:])
-
-        if len(self.__pending_requests):
-            callback, errback, services = self.__pending_requests.pop(0)
-            self.RequestMultipleSecurityTokens(callback, errback, *services)
-
-    def DiscardSecurityTokens(self, services):
-        for service in services:
-            del self.__storage[service[0]]
+            self.__tokens[service] = token
+
+        waiters = self.__request_done()
+        for callback, errback, services in waiters:
+            if callback is None:
+                continue
+            tokens = {}
+            for service in services:
+                if service in self.__tokens:
+                    tokens[service] = self.__tokens[service]
+            callback[0](tokens, *callback[1:])
+
+        self.__schedule_refresh()
+        self.__process_pending_requests()
+
+    def __request_failed(self):
+        waiters = self.__request_done()
+        for callback, errback, services in waiters:
+            if errback is not None:
+                errback[0](*errback[1:])
+        # the refresh of the expiring tokens is attempted again later
+        self.__schedule_refresh()
+        self.__process_pending_requests()
 
     def _HandleSOAPFault(self, request_id, callback, errback,
              soap_response, user_data):
-        if soap_response.fault.faultcode.endswith("FailedAuthentication"):
-            errback[0](*errback[1:])
-        elif soap_response.fault.faultcode.endswith("Redirect"):
-            requested_services, response_tokens = user_data
+        if soap_response.fault.faultcode.endswith("Redirect"):
             self.url = soap_response.fault.tree.findtext("psf:redirectUrl")
-            self.__pending_response = False
-            self.RequestMultipleSecurityTokens(callback, errback, *requested_services)
-            
-            
-            
-        
+            waiters = self.__request_done()
+            self.__send_request(user_data, waiters)
+        else:
+            if not soap_response.fault.faultcode.endswith(
+                    "FailedAuthentication"):
+                logger.warning("Unhandled SOAPFault to %s : %s" % \
+                        (request_id, soap_response.fault.faultcode))
+            self.__request_failed()
+
+    def _HandleInvalidResponse(self, request_id, callback, errback,
+            user_data):
+        self.__request_failed()
+
+    def _error_handler(self, transport, error):
+        SOAPService._error_handler(self, transport, error)
+        self.__request_failed()
+
 
 if __name__ == '__main__':
     import sys
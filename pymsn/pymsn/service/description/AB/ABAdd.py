@@ -19,6 +19,7 @@
 
 from common import *
 from constants import *
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -32,17 +33,19 @@ def soap_action():
 
     return "http://www.msn.com/webservices/AddressBook/ABAdd"
 
+_body_template = compress_xml("""<ABAdd xmlns="http://www.msn.com/webservices/AddressBook">
+              <abInfo>
+                  <name/>
+                  <ownerPuid>0</ownerPuid>
+                  <ownerEmail>
+                      %s
+                  </ownerEmail>
+                  <fDefault>true</fDefault>
+              </abInfo>
+          </ABAdd>""")
+
 def soap_body(account):
-    return """<ABAdd xmlns="http://www.msn.com/webservices/AddressBook">
-                  <abInfo>
-                      <name/>
-                      <ownerPuid>0</ownerPuid>
-                      <ownerEmail>
-                          %s
-                      </ownerEmail>
-                      <fDefault>true</fDefault>
-                  </abInfo>
-              </ABAdd>""" % account
+    return _body_template % account
 
 def process_response(soap_response):
     body = soap_response.body
@@ -21,6 +21,7 @@ from common import *
 from constants import *
 
 import xml.sax.saxutils as xml
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -34,11 +35,104 @@ def soap_action():
 
     return "http://www.msn.com/webservices/AddressBook/ABContactAdd"
 
+_yahoo_template = compress_xml("""<isMessengerEnabled>
+       true
+    </isMessengerEnabled>
+    <Capability>
+       %s
+    </Capability>""")
+
+_email_template = compress_xml("""<ContactEmail>
+       <contactEmailType>%s</contactEmailType>
+       <email>%s</email>
+       %s
+       <propertiesChanged>Email%s</propertiesChanged>
+    </ContactEmail>""")
+
+_phone_template = compress_xml("""<ContactPhone>
+       <contactPhoneType>%s</contactPhoneType>
+       <number>%s</number>
+       <propertiesChanged>Number</propertiesChanged>
+    </ContactPhone>""")
+
+_location_template = compress_xml("""<ContactLocation>
+       <contactLocationType>%s</contactLocationType>
+       %s
+       <Changes>%s</Changes>
+    </ContactLocation>""")
+
+_web_site_template = compress_xml("""<ContactWebSite>
+       <contactWebSiteType>%s</contactWebSiteType>
+       <webURL>%s</webURL>
+    </ContactWebSite>""")
+
+_annotation_template = compress_xml("""<Annotation>
+       <Name>%s</Name>
+       <Value>%s</Value>
+    </Annotation>""")
+
+_invite_template = compress_xml("""<MessengerMemberInfo>
+        <PendingAnnotations>
+            <Annotation>
+                <Name>
+                    MSN.IM.InviteMessage
+                </Name>
+                <Value>
+                    %(invite_message)s
+                </Value>
+            </Annotation>
+        </PendingAnnotations>
+        <DisplayName>
+            %(display_name)s
+        </DisplayName>
+    </MessengerMemberInfo>""")
+
+_contact_template = compress_xml("""
+    <Contact xmlns="http://www.msn.com/webservices/AddressBook">
+        <contactInfo>
+            %(contact_info)s%(invite_info)s
+        </contactInfo>
+    </Contact>""")
+
+_body_template = compress_xml("""
+   <ABContactAdd xmlns="http://www.msn.com/webservices/AddressBook">
+        <abId>00000000-0000-0000-0000-000000000000</abId>
+        <contacts>
+            %(contacts)s
+        </contacts>
+        <options>
+            <EnableAllowListManagement>
+                %(allow_list_management)s
+            </EnableAllowListManagement>
+        </options>
+    </ABContactAdd>""")
+
 def soap_body(passport_name, is_messenger_user, contact_type, first_name, 
               last_name, birth_date, email, phone, location, web_site,  
               annotation, comment, anniversary, display_name, invite_message,
               capability, enable_allow_list_management=True):
-    """Returns the SOAP xml body
+    """Returns the SOAP xml body"""
+
+    return soap_body_multiple([(passport_name, is_messenger_user,
+        contact_type, first_name, last_name, birth_date, email, phone,
+        location, web_site, annotation, comment, anniversary, display_name,
+        invite_message, capability)], enable_allow_list_management)
+
+def soap_body_multiple(contacts, enable_allow_list_management=True):
+    """Returns the SOAP xml body adding several contacts at once
+
+            @param contacts: a list of tuples holding the L{soap_body}
+                arguments of each contact"""
+
+    contacts = "".join([_contact(*contact) for contact in contacts])
+    return _body_template % { 'contacts' : contacts,
+                              'allow_list_management' : str(enable_allow_list_management).lower()}
+
+def _contact(passport_name, is_messenger_user, contact_type, first_name,
+             last_name, birth_date, email, phone, location, web_site,
+             annotation, comment, anniversary, display_name, invite_message,
+             capability):
+    """Returns the xml of a contact to add
 
             @param passport_name: the passport adress if the contact to add
             @param is_messenger_user: True if this is a messenger contact,
@@ -81,29 +175,15 @@ def soap_body(passport_name, is_messenger_user, contact_type, first_name,
         for type, email in email.iteritems():
             yahoo_tags = changed = ""
             if type == ContactEmailType.EXTERNAL:
-                yahoo_tags = """<isMessengerEnabled>
-                                   true
-                                </isMessengerEnabled>
-                                <Capability>
-                                   %s
-                                </Capability>""" % capability
+                yahoo_tags = _yahoo_template % capability
                 changed = " IsMessengerEnabled Capability"
-            emails += """<ContactEmail>
-                            <contactEmailType>%s</contactEmailType>
-                            <email>%s</email>
-                            %s
-                            <propertiesChanged>Email%s</propertiesChanged>
-                         </ContactEmail>""" % (type, email, yahoo_tags, changed)
+            emails += _email_template % (type, email, yahoo_tags, changed)
         contact_info += "<emails>%s</emails>" % emails
 
     if phone is not None:
         phones = ""
         for type, number in phone.iteritems():
-            phones += """<ContactPhone>
-                            <contactPhoneType>%s</contactPhoneType>
-                            <number>%s</number>
-                            <propertiesChanged>Number</propertiesChanged>
-                         </ContactPhone>""" % (type, number)
+            phones += _phone_template % (type, number)
         contact_info += "<phones>%s</phones>" % phones
 
     if location is not None:
@@ -113,29 +193,19 @@ def soap_body(passport_name, is_messenger_user, contact_type, first_name,
             for item, value in parts.iteritems():
                 items += "<%s>%s</%s>" % (item, value, item)
                 changes += " %s%s" % (item[0].upper(), item[1:len(item)]) 
-            locations += """<ContactLocation>
-                               <contactLocationType>%s</contactLocationType>
-                               %s
-                               <Changes>%s</Changes>
-                            </ContactLocation>""" % (type, items, changes)
+            locations += _location_template % (type, items, changes.lstrip())
         contact_info += "<location>%s</locations>" % locations
 
     if web_site is not None:
         web_sites = ""
         for type, url in web_site.iteritems():
-            websites += """<ContactWebSite>
-                              <contactWebSiteType>%s</contactWebSiteType>
-                              <webURL>%s</webURL>
-                           </ContactWebSite>""" % (type, xml.escape(url))
+            websites += _web_site_template % (type, xml.escape(url))
         contact_info += "<webSites>%s</webSites>" % web_sites
 
     if annotation is not None:
         annotations = ""
         for name, value in annotation.iteritems():
-            annotations += """<Annotation>
-                                 <Name>%s</Name>
-                                 <Value>%s</Value>
-                              </Annotation>""" % (name, xml.escape(value))
+            annotations += _annotation_template % (name, xml.escape(value))
         contact_info += "<annotations>%s</annotations>" % annotations
 
     if comment is not None:
@@ -144,47 +214,17 @@ def soap_body(passport_name, is_messenger_user, contact_type, first_name,
     if anniversary is not None:
         contact_info += "<Anniversary>%s</Anniversary>" % anniversary
 
-    invite_info = ''
-    invite_info += """<MessengerMemberInfo>
-                           <PendingAnnotations>
-                               <Annotation>
-                                   <Name>
-                                       MSN.IM.InviteMessage
-                                   </Name>
-                                   <Value>
-                                       %(invite_message)s
-                                   </Value>
-                               </Annotation>
-                           </PendingAnnotations>
-                           <DisplayName>
-                               %(display_name)s
-                           </DisplayName>
-                       </MessengerMemberInfo>""" % { 'invite_message' : xml.escape(invite_message),
-                                                     'display_name' : xml.escape(display_name) }
-
-    return """
-       <ABContactAdd xmlns="http://www.msn.com/webservices/AddressBook">
-            <abId>00000000-0000-0000-0000-000000000000</abId>
-            <contacts>
-                <Contact xmlns="http://www.msn.com/webservices/AddressBook">
-                    <contactInfo>
-                        %(contact_info)s
-                        %(invite_info)s
-                    </contactInfo>
-                </Contact>
-            </contacts>
-            <options>
-                <EnableAllowListManagement>
-                    %(allow_list_management)s
-                </EnableAllowListManagement>
-            </options>
-        </ABContactAdd>""" % { 'contact_info' : contact_info,
-                               'invite_info' : invite_info,
-                               'allow_list_management' : str(enable_allow_list_management).lower()}
+    invite_info = _invite_template % {
+            'invite_message' : xml.escape(invite_message),
+            'display_name' : xml.escape(display_name) }
+
+    return _contact_template % { 'contact_info' : contact_info,
+                                 'invite_info' : invite_info }
 
 def process_response(soap_response):
     body = soap_response.body
     try:
-        return body.find("./ab:ABContactAddResponse/ab:ABContactAddResult/ab:guid")
+        return body.findall("./ab:ABContactAddResponse/" \
+                "ab:ABContactAddResult/ab:guid")
     except AttributeError:
-        return None
+        return []
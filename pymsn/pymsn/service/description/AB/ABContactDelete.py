@@ -18,6 +18,7 @@
 #
 
 from common import *
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -31,22 +32,24 @@ def soap_action():
 
     return "http://www.msn.com/webservices/AddressBook/ABContactDelete"
 
+_body_template = compress_xml("""        
+    <ABContactDelete xmlns="http://www.msn.com/webservices/AddressBook">
+        <abId>
+            00000000-0000-0000-0000-000000000000
+        </abId>
+        <contacts>
+            <Contact>
+                <contactId>
+                    %(contact_id)s
+                </contactId>
+            </Contact>
+        </contacts>
+    </ABContactDelete>""")
+
 def soap_body(contact_id):
     """Returns the SOAP xml body"""
 
-    return """        
-        <ABContactDelete xmlns="http://www.msn.com/webservices/AddressBook">
-            <abId>
-                00000000-0000-0000-0000-000000000000
-            </abId>
-            <contacts>
-                <Contact>
-                    <contactId>
-                        %(contact_id)s
-                    </contactId>
-                </Contact>
-            </contacts>
-        </ABContactDelete>""" % { 'contact_id' : contact_id }
+    return _body_template % { 'contact_id' : contact_id }
 
 def process_response(soap_response):
     return None
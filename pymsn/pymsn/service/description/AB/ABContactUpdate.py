@@ -21,6 +21,7 @@ from common import *
 from constants import *
 
 import xml.sax.saxutils as xml
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -34,6 +35,57 @@ def soap_action():
 
     return "http://www.msn.com/webservices/AddressBook/ABContactUpdate"
 
+_email_template = compress_xml("""<ContactEmail>
+       <contactEmailType>%s</contactEmailType>
+       <email>%s</email>
+       <propertiesChanged>Email</propertiesChanged>
+    </ContactEmail>""")
+
+_phone_template = compress_xml("""<ContactPhone>
+       <contactPhoneType>%s</contactPhoneType>
+       <number>%s</number>
+       <propertiesChanged>Number</propertiesChanged>
+    </ContactPhone>""")
+
+_location_template = compress_xml("""<ContactLocation>
+       <contactLocationType>%s</contactLocationType>
+       %s
+       <Changes>%s</Changes>
+    </ContactLocation>""")
+
+_web_site_template = compress_xml("""<ContactWebSite>
+       <contactWebSiteType>%s</contactWebSiteType>
+       <webURL>%s</webURL>
+    </ContactWebSite>""")
+
+_annotation_template = compress_xml("""<Annotation>
+       <Name>%s</Name>
+       %s
+    </Annotation>""")
+
+_body_template = compress_xml("""
+   <ABContactUpdate xmlns="http://www.msn.com/webservices/AddressBook">
+        <abId>00000000-0000-0000-0000-000000000000</abId>
+        <contacts>
+            <Contact xmlns="http://www.msn.com/webservices/AddressBook">
+                <contactId>
+                    %(contact_id)s
+                </contactId>
+                <contactInfo>
+                    %(contact_info)s
+                </contactInfo>
+                <propertiesChanged>
+                    %(properties_changed)s
+                </propertiesChanged>
+            </Contact>
+        </contacts>
+        <options>
+            <EnableAllowListManagement>
+                %(allow_list_management)s
+            </EnableAllowListManagement>
+        </options>
+    </ABContactUpdate>""")
+
 def soap_body(contact_id, display_name, is_messenger_user, contact_type,
               first_name, last_name, birth_date, email, phone, location, 
               web_site, annotation, comment, anniversary, has_space,
@@ -90,22 +142,14 @@ def soap_body(contact_id, display_name, is_messenger_user, contact_type,
     if email is not None:
         emails = ""
         for type, email in email.iteritems():
-            emails += """<ContactEmail>
-                            <contactEmailType>%s</contactEmailType>
-                            <email>%s</email>
-                            <propertiesChanged>Email</propertiesChanged>
-                         </ContactEmail>""" % (type, email)
+            emails += _email_template % (type, email)
         contact_info += "<emails>%s</emails>" % emails
         properties_changed += " ContactEmail"
 
     if phone is not None:
         phones = ""
         for type, number in phone.iteritems():
-            phones += """<ContactPhone>
-                            <contactPhoneType>%s</contactPhoneType>
-                            <number>%s</number>
-                            <propertiesChanged>Number</propertiesChanged>
-                         </ContactPhone>""" % (type, number)
+            phones += _phone_template % (type, number)
         contact_info += "<phones>%s</phones>" % phones
         properties_changed += " ContactPhone"
 
@@ -116,21 +160,14 @@ def soap_body(contact_id, display_name, is_messenger_user, contact_type,
             for item, value in parts.iteritems():
                 items += "<%s>%s</%s>" % (item, value, item)
                 changes += " %s%s" % (item[0].upper(), item[1:len(item)]) 
-            locations += """<ContactLocation>
-                               <contactLocationType>%s</contactLocationType>
-                               %s
-                               <Changes>%s</Changes>
-                            </ContactLocation>""" % (type, items, changes)
+            locations += _location_template % (type, items, changes.lstrip())
         contact_info += "<location>%s</locations>" % locations
         properties_changed += " ContactLocation"
 
     if web_site is not None:
         web_sites = ""
         for type, url in web_site.iteritems():
-            websites += """<ContactWebSite>
-                              <contactWebSiteType>%s</contactWebSiteType>
-                              <webURL>%s</webURL>
-                           </ContactWebSite>""" % (type, xml.escape(url))
+            websites += _web_site_template % (type, xml.escape(url))
         contact_info += "<webSites>%s</webSites>" % web_sites
         properties_changed += " ContactWebSite"
 
@@ -140,11 +177,8 @@ def soap_body(contact_id, display_name, is_messenger_user, contact_type,
             if value == None or value == "":
                 value = "<Value/>"
             else:
-                value = "<Value>%s</Value>" % value
-            annotations += """<Annotation>
-                                 <Name>%s</Name>
-                                 %s
-                              </Annotation>""" % (name, value)
+                value = "<Value>%s</Value>" % xml.escape(value)
+            annotations += _annotation_template % (name, value)
         contact_info += "<annotations>%s</annotations>" % annotations
         properties_changed += " Annotation"
 
@@ -156,31 +190,10 @@ def soap_body(contact_id, display_name, is_messenger_user, contact_type,
         contact_info += "<Anniversary>%s</Anniversary>" % anniversary
         properties_changed += " Anniversary"
 
-    return """
-       <ABContactUpdate xmlns="http://www.msn.com/webservices/AddressBook">
-            <abId>00000000-0000-0000-0000-000000000000</abId>
-            <contacts>
-                <Contact xmlns="http://www.msn.com/webservices/AddressBook">
-                    <contactId>
-                        %(contact_id)s
-                    </contactId>
-                    <contactInfo>
-                        %(contact_info)s
-                    </contactInfo>
-                    <propertiesChanged>
-                        %(properties_changed)s
-                    </propertiesChanged>
-                </Contact>
-            </contacts>
-            <options>
-                <EnableAllowListManagement>
-                    %(allow_list_management)s
-                </EnableAllowListManagement>
-            </options>
-        </ABContactUpdate>""" % { 'contact_id' : contact_id,
-                                  'contact_info' : contact_info,
-                                  'properties_changed' : properties_changed,
-                                  'allow_list_management' : str(enable_allow_list_management).lower() }
+    return _body_template % { 'contact_id' : contact_id,
+                              'contact_info' : contact_info,
+                              'properties_changed' : properties_changed.lstrip(),
+                              'allow_list_management' : str(enable_allow_list_management).lower() }
 
 def process_response(soap_response):
     return None
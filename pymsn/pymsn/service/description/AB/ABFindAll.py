@@ -20,6 +20,7 @@
 from common import *
 
 import xml.sax.saxutils as xml
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -33,17 +34,19 @@ def soap_action():
 
     return "http://www.msn.com/webservices/AddressBook/ABFindAll"
 
+_body_template = compress_xml("""
+   <ABFindAll xmlns="http://www.msn.com/webservices/AddressBook">
+      <abId>00000000-0000-0000-0000-000000000000</abId>
+      <abView>Full</abView>
+      <deltasOnly>%(deltas_only)s</deltasOnly>
+      <lastChange>%(last_change)s</lastChange>
+   </ABFindAll>""")
+
 def soap_body(deltas_only, last_change):
     """Returns the SOAP xml body"""
 
-    return """
-       <ABFindAll xmlns="http://www.msn.com/webservices/AddressBook">
-          <abId>00000000-0000-0000-0000-000000000000</abId>
-          <abView>Full</abView>
-          <deltasOnly>%(deltas_only)s</deltasOnly>
-          <lastChange>%(last_change)s</lastChange>
-       </ABFindAll>""" % {'deltas_only' : deltas_only,
-                          'last_change' : last_change}
+    return _body_template % {'deltas_only' : deltas_only,
+                             'last_change' : last_change}
 
 def process_response(soap_response):
     find_all_result = soap_response.body.\
@@ -55,6 +58,13 @@ def process_response(soap_response):
     path = "./ab:contacts/ab:Contact"
     contacts = find_all_result.findall(path)
 
+    # the elements decoded while parsing are no longer in the tree
+    for tag, value in soap_response.decoded:
+        if tag == "ab:Group":
+            groups.append(value)
+        elif tag == "ab:Contact":
+            contacts.append(value)
+
     path = "./ab:ab"
     ab = find_all_result.find(path)
     
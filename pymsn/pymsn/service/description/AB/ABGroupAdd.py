@@ -20,6 +20,7 @@
 from common import *
 
 import xml.sax.saxutils as xml
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -33,39 +34,41 @@ def soap_action():
 
     return "http://www.msn.com/webservices/AddressBook/ABGroupAdd"
 
+_body_template = compress_xml("""
+    <ABGroupAdd xmlns="http://www.msn.com/webservices/AddressBook">
+        <abId>00000000-0000-0000-0000-000000000000</abId>
+        <groupAddOptions>
+            <fRenameOnMsgrConflict>false</fRenameOnMsgrConflict>
+        </groupAddOptions>
+        <groupInfo>
+            <GroupInfo>
+                <name>
+                    %(group_name)s
+                </name>
+                <groupType>
+                    C8529CE2-6EAD-434d-881F-341E17DB3FF8
+                </groupType>
+                <fMessenger>
+                    false
+                </fMessenger>
+                <annotations>
+                    <Annotation>
+                        <Name>
+                            MSN.IM.Display
+                        </Name>
+                        <Value>
+                            1
+                        </Value>
+                    </Annotation>
+                </annotations>
+            </GroupInfo>
+        </groupInfo>
+    </ABGroupAdd>""")
+
 def soap_body(group_name):
     """Returns the SOAP xml body"""
 
-    return """
-        <ABGroupAdd xmlns="http://www.msn.com/webservices/AddressBook">
-            <abId>00000000-0000-0000-0000-000000000000</abId>
-            <groupAddOptions>
-                <fRenameOnMsgrConflict>false</fRenameOnMsgrConflict>
-            </groupAddOptions>
-            <groupInfo>
-                <GroupInfo>
-                    <name>
-                        %(group_name)s
-                    </name>
-                    <groupType>
-                        C8529CE2-6EAD-434d-881F-341E17DB3FF8
-                    </groupType>
-                    <fMessenger>
-                        false
-                    </fMessenger>
-                    <annotations>
-                        <Annotation>
-                            <Name>
-                                MSN.IM.Display
-                            </Name>
-                            <Value>
-                                1
-                            </Value>
-                        </Annotation>
-                    </annotations>
-                </GroupInfo>
-            </groupInfo>
-        </ABGroupAdd>""" % { 'group_name' : xml.escape(group_name) }
+    return _body_template % { 'group_name' : xml.escape(group_name) }
 
 def process_response(soap_response):
     guid = soap_response.body.find("./ab:ABGroupAddResponse/"
@@ -19,6 +19,7 @@
 
 from common import *
 from constants import *
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -35,30 +36,42 @@ def soap_action():
 # TODO : complete the method to be able to add a contact (like ABContactAdd)
 # directly when adding him to his original group
 
+_body_template = compress_xml("""
+    <ABGroupContactAdd xmlns="http://www.msn.com/webservices/AddressBook">
+        <abId>
+            00000000-0000-0000-0000-000000000000
+        </abId>
+        <groupFilter>
+            <groupIds>
+                <guid>
+                    %(group_id)s
+                </guid>
+            </groupIds>
+        </groupFilter>
+        <contacts>
+            %(contacts)s
+        </contacts>
+    </ABGroupContactAdd>""")
+
+_contact_template = compress_xml("""
+    <Contact>
+        <contactId>
+            %s
+        </contactId>
+    </Contact>""")
+
 def soap_body(group_id, contact_id):
     """Returns the SOAP xml body"""
 
-    return """
-        <ABGroupContactAdd xmlns="http://www.msn.com/webservices/AddressBook">
-            <abId>
-                00000000-0000-0000-0000-000000000000
-            </abId>
-            <groupFilter>
-                <groupIds>
-                    <guid>
-                        %(group_id)s
-                    </guid>
-                </groupIds>
-            </groupFilter>
-            <contacts>
-                <Contact>
-                    <contactId>
-                        %(contact_id)s
-                    </contactId>
-                </Contact>
-            </contacts>
-        </ABGroupContactAdd>""" % { 'group_id' : group_id,
-                                    'contact_id' : contact_id }
+    return soap_body_multiple(group_id, [contact_id])
+
+def soap_body_multiple(group_id, contact_ids):
+    """Returns the SOAP xml body adding several contacts to a group at once"""
+
+    contacts = "".join([_contact_template % contact_id \
+            for contact_id in contact_ids])
+    return _body_template % { 'group_id' : group_id,
+                              'contacts' : contacts }
 
 def process_response(soap_response):
     body = soap_response.body
@@ -18,6 +18,7 @@
 #
 
 from common import *
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -31,29 +32,31 @@ def soap_action():
 
     return "http://www.msn.com/webservices/AddressBook/ABGroupContactDelete"
 
+_body_template = compress_xml(""" 
+    <ABGroupContactDelete xmlns="http://www.msn.com/webservices/AddressBook">
+        <abId>
+            00000000-0000-0000-0000-000000000000
+        </abId>
+        <contacts>
+            <Contact>
+                <contactId>
+                    %s
+                </contactId>
+            </Contact>
+        </contacts>
+        <groupFilter>
+            <groupIds>
+                <guid>
+                    %s
+                </guid>
+            </groupIds>
+        </groupFilter>
+    </ABGroupContactDelete>""")
+
 def soap_body(group_id, contact_id):
     """Returns the SOAP xml body"""
 
-    return """ 
-        <ABGroupContactDelete xmlns="http://www.msn.com/webservices/AddressBook">
-            <abId>
-                00000000-0000-0000-0000-000000000000
-            </abId>
-            <contacts>
-                <Contact>
-                    <contactId>
-                        %s
-                    </contactId>
-                </Contact>
-            </contacts>
-            <groupFilter>
-                <groupIds>
-                    <guid>
-                        %s
-                    </guid>
-                </groupIds>
-            </groupFilter>
-        </ABGroupContactDelete>""" % (contact_id, group_id)
+    return _body_template % (contact_id, group_id)
 
 def process_response(soap_response):
     return None
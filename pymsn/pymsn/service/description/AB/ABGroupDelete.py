@@ -18,6 +18,7 @@
 #
 
 from common import *
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -31,22 +32,24 @@ def soap_action():
 
     return "http://www.msn.com/webservices/AddressBook/ABGroupDelete"
 
+_body_template = compress_xml("""
+    <ABGroupDelete xmlns="http://www.msn.com/webservices/AddressBook">
+        <abId>
+            00000000-0000-0000-0000-000000000000
+        </abId>
+        <groupFilter>
+            <groupIds>
+                <guid>
+                    %(group_id)s
+                </guid>
+            </groupIds>
+        </groupFilter>
+    </ABGroupDelete>""")
+
 def soap_body(group_id):
     """Returns the SOAP xml body"""
 
-    return """
-        <ABGroupDelete xmlns="http://www.msn.com/webservices/AddressBook">
-            <abId>
-                00000000-0000-0000-0000-000000000000
-            </abId>
-            <groupFilter>
-                <groupIds>
-                    <guid>
-                        %(group_id)s
-                    </guid>
-                </groupIds>
-            </groupFilter>
-        </ABGroupDelete>""" % { 'group_id' : group_id }
+    return _body_template % { 'group_id' : group_id }
 
 def process_response(soap_response):
     return None
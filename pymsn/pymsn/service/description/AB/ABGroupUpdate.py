@@ -20,6 +20,7 @@
 from common import *
 
 import xml.sax.saxutils as xml
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -33,31 +34,33 @@ def soap_action():
 
     return "http://www.msn.com/webservices/AddressBook/ABGroupUpdate"
 
+_body_template = compress_xml("""
+    <ABGroupUpdate xmlns="http://www.msn.com/webservices/AddressBook">
+        <abId>
+            00000000-0000-0000-0000-000000000000
+        </abId>
+        <groups>
+            <Group>
+                <groupId>
+                    %(group_id)s
+                </groupId>
+                <groupInfo>
+                    <name>
+                        %(group_name)s
+                    </name>
+                </groupInfo>
+                <propertiesChanged>
+                    GroupName
+                </propertiesChanged>
+            </Group>
+        </groups>
+    </ABGroupUpdate>""")
+
 def soap_body(group_id, group_name):
     """Returns the SOAP xml body"""
 
-    return """
-        <ABGroupUpdate xmlns="http://www.msn.com/webservices/AddressBook">
-            <abId>
-                00000000-0000-0000-0000-000000000000
-            </abId>
-            <groups>
-                <Group>
-                    <groupId>
-                        %(group_id)s
-                    </groupId>
-                    <groupInfo>
-                        <name>
-                            %(group_name)s
-                        </name>
-                    </groupInfo>
-                    <propertiesChanged>
-                        GroupName
-                    </propertiesChanged>
-                </Group>
-            </groups>
-        </ABGroupUpdate>""" % { 'group_id' : group_id,
-                                'group_name' : xml.escape(group_name) }
+    return _body_template % { 'group_id' : group_id,
+                              'group_name' : xml.escape(group_name) }
 
 def process_response(soap_response):
     return None
@@ -18,6 +18,7 @@
 #
 
 from common import *
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -31,6 +32,13 @@ def soap_action():
 
     return "http://www.hotmail.msn.com/ws/2004/09/oim/rsi/DeleteMessages"
 
+_body_template = compress_xml("""
+  <DeleteMessages xmlns="http://www.hotmail.msn.com/ws/2004/09/oim/rsi">
+      <messageIds>
+          %s
+      </messageIds>
+  </DeleteMessages>""")
+
 def soap_body(message_ids):
     """Returns the SOAP xml body"""
 
@@ -38,12 +46,7 @@ def soap_body(message_ids):
     for message_id in message_ids:
         ids += "<messageId>%s</messageId>" %  message_id
 
-    return """
-      <DeleteMessages xmlns="http://www.hotmail.msn.com/ws/2004/09/oim/rsi">
-          <messageIds>
-              %s
-          </messageIds>
-      </DeleteMessages>""" % ids
+    return _body_template % ids
 
 def process_response(soap_response):
     return None
@@ -18,6 +18,7 @@
 #
 
 from common import *
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -31,6 +32,12 @@ def soap_action():
 
     return "http://www.hotmail.msn.com/ws/2004/09/oim/rsi/GetMessage"
 
+_body_template = compress_xml("""    
+   <GetMessage xmlns="http://www.hotmail.msn.com/ws/2004/09/oim/rsi">
+       <messageId>%s</messageId>
+       <alsoMarkAsRead>%s</alsoMarkAsRead>
+   </GetMessage>""")
+
 def soap_body(message_id, also_mark_as_read):
     """Returns the SOAP xml body
     
@@ -38,11 +45,7 @@ def soap_body(message_id, also_mark_as_read):
         @param also_mark_as_read: "true if the message should be marked as read
                                   "false else
     """
-    return """    
-       <GetMessage xmlns="http://www.hotmail.msn.com/ws/2004/09/oim/rsi">
-           <messageId>%s</messageId>
-           <alsoMarkAsRead>%s</alsoMarkAsRead>
-       </GetMessage>""" % (message_id, also_mark_as_read)
+    return _body_template % (message_id, also_mark_as_read)
 
 def process_response(soap_response):
     body = soap_response.body
@@ -18,6 +18,7 @@
 #
 
 from common import *
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -31,11 +32,13 @@ def soap_action():
 
     return "http://www.hotmail.msn.com/ws/2004/09/oim/rsi/GetMetadata"
 
+_body_template = compress_xml("""
+    <GetMetadata xmlns="http://www.hotmail.msn.com/ws/2004/09/oim/rsi" />""")
+
 def soap_body():
     """Returns the SOAP xml body"""
 
-    return """
-        <GetMetadata xmlns="http://www.hotmail.msn.com/ws/2004/09/oim/rsi" />""" 
+    return _body_template 
 
 def process_response(soap_response):
     body = soap_response.body
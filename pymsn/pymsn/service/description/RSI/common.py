@@ -19,15 +19,18 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 import xml.sax.saxutils as xml
+from pymsn.service.SOAPUtils import compress_xml
+
+_header_template = compress_xml("""
+  <PassportCookie xmlns="http://www.hotmail.msn.com/ws/2004/09/oim/rsi">
+      <t>%s</t> 
+      <p>%s</p>
+  </PassportCookie>""")
 
 def soap_header(security_token):
     """Returns the SOAP xml header"""
 
     t, p = security_token.split('&')
 
-    return """
-      <PassportCookie xmlns="http://www.hotmail.msn.com/ws/2004/09/oim/rsi">
-          <t>%s</t> 
-          <p>%s</p>
-      </PassportCookie>""" % (xml.escape(t[2:]), 
-                              xml.escape(p[2:]))
+    return _header_template % (xml.escape(t[2:]), 
+                               xml.escape(p[2:]))
@@ -18,6 +18,7 @@
 #
 
 from common import *
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -31,48 +32,50 @@ def soap_action():
 
     return "http://www.msn.com/webservices/storage/w10/CreateDocument"
 
-def soap_body(cid, photo_name, photo_mime_type, photo_data):
-    """Returns the SOAP xml body
-    """
-    return """<CreateDocument xmlns="http://www.msn.com/webservices/storage/w10">
-            <parentHandle>
-                <RelationshipName>
-                    /UserTiles
-                </RelationshipName>
-                <Alias>
-                    <Name>
-                        %s
-                    </Name>
-                    <NameSpace>
-                        MyCidStuff
-                    </NameSpace>
-                </Alias>
-            </parentHandle>
-            <document xsi:type="Photo">
+_body_template = compress_xml("""<CreateDocument xmlns="http://www.msn.com/webservices/storage/w10">
+        <parentHandle>
+            <RelationshipName>
+                /UserTiles
+            </RelationshipName>
+            <Alias>
                 <Name>
                     %s
                 </Name>
-                <DocumentStreams>
-                    <DocumentStream xsi:type="PhotoStream">
-                        <DocumentStreamType>
-                            UserTileStatic
-                        </DocumentStreamType>
-                        <MimeType>
-                            %s
-                        </MimeType>
-                        <Data>
-                            %s
-                        </Data>
-                        <DataSize>
-                            0
-                        </DataSize>
-                    </DocumentStream>
-                </DocumentStreams>
-            </document>
-            <relationshipName>
-                Messenger User Tile
-            </relationshipName>
-        </CreateDocument>""" % (cid, photo_name, photo_mime_type, photo_data) 
+                <NameSpace>
+                    MyCidStuff
+                </NameSpace>
+            </Alias>
+        </parentHandle>
+        <document xsi:type="Photo">
+            <Name>
+                %s
+            </Name>
+            <DocumentStreams>
+                <DocumentStream xsi:type="PhotoStream">
+                    <DocumentStreamType>
+                        UserTileStatic
+                    </DocumentStreamType>
+                    <MimeType>
+                        %s
+                    </MimeType>
+                    <Data>
+                        %s
+                    </Data>
+                    <DataSize>
+                        0
+                    </DataSize>
+                </DocumentStream>
+            </DocumentStreams>
+        </document>
+        <relationshipName>
+            Messenger User Tile
+        </relationshipName>
+    </CreateDocument>""")
+
+def soap_body(cid, photo_name, photo_mime_type, photo_data):
+    """Returns the SOAP xml body
+    """
+    return _body_template % (cid, photo_name, photo_mime_type, photo_data) 
 
 def process_response(soap_response):
     body = soap_response.body
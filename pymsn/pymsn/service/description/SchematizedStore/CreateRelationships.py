@@ -18,6 +18,7 @@
 #
 
 from common import *
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -31,30 +32,32 @@ def soap_action():
 
     return "http://www.msn.com/webservices/storage/w10/CreateRelationships"
 
+_body_template = compress_xml("""<CreateRelationships xmlns="http://www.msn.com/webservices/storage/w10">
+        <relationships>
+            <Relationship>
+                <SourceID>
+                    %s
+                </SourceID>
+                <SourceType>
+                    SubProfile
+                </SourceType>
+                <TargetID>
+                    %s
+                </TargetID>
+                <TargetType>
+                    Photo
+                </TargetType>
+                <RelationshipName>
+                    ProfilePhoto
+                </RelationshipName>
+            </Relationship>
+        </relationships>
+    </CreateRelationships>""")
+
 def soap_body(source_rid, target_rid):
     """Returns the SOAP xml body
     """
-    return """<CreateRelationships xmlns="http://www.msn.com/webservices/storage/w10">
-            <relationships>
-                <Relationship>
-                    <SourceID>
-                        %s
-                    </SourceID>
-                    <SourceType>
-                        SubProfile
-                    </SourceType>
-                    <TargetID>
-                        %s
-                    </TargetID>
-                    <TargetType>
-                        Photo
-                    </TargetType>
-                    <RelationshipName>
-                        ProfilePhoto
-                    </RelationshipName>
-                </Relationship>
-            </relationships>
-        </CreateRelationships>""" % (source_rid, target_rid)
+    return _body_template % (source_rid, target_rid)
 
 def process_response(soap_response):
     return None
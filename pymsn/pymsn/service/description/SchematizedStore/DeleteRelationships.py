@@ -18,6 +18,7 @@
 #
 
 from common import *
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -31,36 +32,40 @@ def soap_action():
 
     return "http://www.msn.com/webservices/storage/w10/DeleteRelationships"
 
+_alias_handle_template = compress_xml("""<RelationshipName>
+        /UserTiles
+    </RelationshipName>
+    <Alias>
+        <Name>
+            %s
+        </Name>
+        <NameSpace>
+            MyCidStuff
+        </NameSpace>
+    </Alias>""")
+
+_body_template = compress_xml("""<DeleteRelationships xmlns="http://www.msn.com/webservices/storage/w10">
+        <sourceHandle>            
+            %s
+        </sourceHandle>
+        <targetHandles>
+            <ObjectHandle>
+                <ResourceID>
+                    %s
+                </ResourceID>
+            </ObjectHandle>
+        </targetHandles>
+    </DeleteRelationships>""")
+
 def soap_body(cid, source_rid, target_rid):
     """Returns the SOAP xml body
     """
     if cid is not None:
-        source_handle = """<RelationshipName>
-                               /UserTiles
-                           </RelationshipName>
-                           <Alias>
-                               <Name>
-                                   %s
-                               </Name>
-                               <NameSpace>
-                                   MyCidStuff
-                               </NameSpace>
-                           </Alias>""" % cid
+        source_handle = _alias_handle_template % cid
     else:
         source_handle = "<ResourceID>%s</ResourceID>" % source_rid
 
-    return """<DeleteRelationships xmlns="http://www.msn.com/webservices/storage/w10">
-            <sourceHandle>            
-                %s
-            </sourceHandle>
-            <targetHandles>
-                <ObjectHandle>
-                    <ResourceID>
-                        %s
-                    </ResourceID>
-                </ObjectHandle>
-            </targetHandles>
-        </DeleteRelationships>""" % (source_handle, target_rid)
+    return _body_template % (source_handle, target_rid)
 
 def process_response(soap_response):
     return None
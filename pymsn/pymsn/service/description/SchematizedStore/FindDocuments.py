@@ -18,6 +18,7 @@
 #
 
 from common import *
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -31,50 +32,52 @@ def soap_action():
 
     return "http://www.msn.com/webservices/storage/w10/FindDocument"
 
+_body_template = compress_xml("""<FindDocuments xmlns="http://www.msn.com/webservices/storage/w10">
+        <objectHandle>
+            <RelationshipName>
+                /UserTiles
+            </RelationshipName>
+            <Alias>
+                <Name>
+                    %s
+                </Name>
+                <NameSpace>
+                    MyCidStuff
+                </NameSpace>
+            </Alias>
+        </objectHandle>
+        <documentAttributes>
+            <ResourceID>
+                true
+            </ResourceID>
+            <Name>
+                true
+            </Name>
+        </documentAttributes>
+        <documentFilter>
+            <FilterAttributes>
+                None
+            </FilterAttributes>
+        </documentFilter>
+        <documentSort>
+            <SortBy>
+                DateModified
+            </SortBy>
+        </documentSort>
+        <findContext>
+            <FindMethod>
+                Default
+            </FindMethod>
+            <ChunkSize>
+                25
+            </ChunkSize>
+        </findContext>
+    </FindDocuments>""")
+
 def soap_body(cid):
     """Returns the SOAP xml body
     """
-    return """<FindDocuments xmlns="http://www.msn.com/webservices/storage/w10">
-            <objectHandle>
-                <RelationshipName>
-                    /UserTiles
-                </RelationshipName>
-                <Alias>
-                    <Name>
-                        %s
-                    </Name>
-                    <NameSpace>
-                        MyCidStuff
-                    </NameSpace>
-                </Alias>
-            </objectHandle>
-            <documentAttributes>
-                <ResourceID>
-                    true
-                </ResourceID>
-                <Name>
-                    true
-                </Name>
-            </documentAttributes>
-            <documentFilter>
-                <FilterAttributes>
-                    None
-                </FilterAttributes>
-            </documentFilter>
-            <documentSort>
-                <SortBy>
-                    DateModified
-                </SortBy>
-            </documentSort>
-            <findContext>
-                <FindMethod>
-                    Default
-                </FindMethod>
-                <ChunkSize>
-                    25
-                </ChunkSize>
-            </findContext>
-        </FindDocuments>""" % cid
+    return _body_template % cid
 
 def process_response(soap_response):
     body = soap_response.body
@@ -18,6 +18,7 @@
 #
 
 from common import *
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -31,36 +32,38 @@ def soap_action():
 
     return "http://www.msn.com/webservices/storage/w10/GetProfile"
 
+_body_template = compress_xml("""<GetProfile xmlns="http://www.msn.com/webservices/storage/w10">
+          <profileHandle>
+              <Alias>
+                  <Name>%(cid)s</Name>
+                  <NameSpace>MyCidStuff</NameSpace>
+              </Alias>
+              <RelationshipName>MyProfile</RelationshipName>
+          </profileHandle>
+          <profileAttributes>
+              <ResourceID>%(profile_rid)s</ResourceID>
+              <DateModified>%(p_date_modified)s</DateModified>
+              <ExpressionProfileAttributes>
+                  <ResourceID>%(expression_rid)s</ResourceID>
+                  <DateModified>%(e_date_modified)s</DateModified>
+                  <DisplayName>%(display_name)s</DisplayName>
+                  <DisplayNameLastModified>%(dn_last_modified)s</DisplayNameLastModified>
+                  <PersonalStatus>%(personal_status)s</PersonalStatus>
+                  <PersonalStatusLastModified>%(ps_last_modified)s</PersonalStatusLastModified>
+                  <StaticUserTilePublicURL>%(user_tile_url)s</StaticUserTilePublicURL>
+                  <Photo>%(photo)s</Photo>
+                  <Flags>%(flags)s</Flags>
+              </ExpressionProfileAttributes>
+          </profileAttributes>
+     </GetProfile>""")
+
 def soap_body(cid, profile_rid, p_date_modified, expression_rid, 
               e_date_modified, display_name, dn_last_modified,
               personal_status, ps_last_modified, user_tile_url,
               photo, flags):
     """Returns the SOAP xml body
     """
-    return """<GetProfile xmlns="http://www.msn.com/webservices/storage/w10">
-              <profileHandle>
-                  <Alias>
-                      <Name>%(cid)s</Name>
-                      <NameSpace>MyCidStuff</NameSpace>
-                  </Alias>
-                  <RelationshipName>MyProfile</RelationshipName>
-              </profileHandle>
-              <profileAttributes>
-                  <ResourceID>%(profile_rid)s</ResourceID>
-                  <DateModified>%(p_date_modified)s</DateModified>
-                  <ExpressionProfileAttributes>
-                      <ResourceID>%(expression_rid)s</ResourceID>
-                      <DateModified>%(e_date_modified)s</DateModified>
-                      <DisplayName>%(display_name)s</DisplayName>
-                      <DisplayNameLastModified>%(dn_last_modified)s</DisplayNameLastModified>
-                      <PersonalStatus>%(personal_status)s</PersonalStatus>
-                      <PersonalStatusLastModified>%(ps_last_modified)s</PersonalStatusLastModified>
-                      <StaticUserTilePublicURL>%(user_tile_url)s</StaticUserTilePublicURL>
-                      <Photo>%(photo)s</Photo>
-                      <Flags>%(flags)s</Flags>
-                  </ExpressionProfileAttributes>
-              </profileAttributes>
-         </GetProfile>""" % { 'cid' : cid,
+    return _body_template % { 'cid' : cid,
                               'profile_rid' : profile_rid,
                               'p_date_modified' : p_date_modified,
                               'expression_rid' : expression_rid,
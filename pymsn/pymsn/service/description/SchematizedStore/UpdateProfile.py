@@ -18,6 +18,7 @@
 #
 
 from common import *
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -31,31 +32,33 @@ def soap_action():
 
     return "http://www.msn.com/webservices/storage/w10/UpdateProfile"
 
+_body_template = compress_xml("""
+    <UpdateProfile xmlns="http://www.msn.com/webservices/storage/w10">
+        <profile>
+            <ResourceID>
+                %s
+            </ResourceID>
+            <ExpressionProfile>
+                <FreeText>
+                    Update
+                </FreeText>
+                <DisplayName>
+                    %s
+                </DisplayName>
+                <PersonalStatus>
+                    %s
+                </PersonalStatus>
+                <Flags>
+                    %s
+                </Flags>
+            </ExpressionProfile>
+        </profile>
+    </UpdateProfile>""")
+
 def soap_body(profile_rid, display_name, personal_status, flags=0):
     """Returns the SOAP xml body
     """
-    return """
-        <UpdateProfile xmlns="http://www.msn.com/webservices/storage/w10">
-            <profile>
-                <ResourceID>
-                    %s
-                </ResourceID>
-                <ExpressionProfile>
-                    <FreeText>
-                        Update
-                    </FreeText>
-                    <DisplayName>
-                        %s
-                    </DisplayName>
-                    <PersonalStatus>
-                        %s
-                    </PersonalStatus>
-                    <Flags>
-                        %s
-                    </Flags>
-                </ExpressionProfile>
-            </profile>
-        </UpdateProfile>""" % (profile_rid, display_name, personal_status, flags)
+    return _body_template % (profile_rid, display_name, personal_status, flags)
 
 def process_response(soap_response):
     return None
@@ -19,19 +19,22 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 import xml.sax.saxutils as xml
+from pymsn.service.SOAPUtils import compress_xml
+
+_header_template = compress_xml("""<StorageApplicationHeader xmlns="http://www.msn.com/webservices/storage/w10">
+        <ApplicationID>Messenger Client 8.0</ApplicationID>
+        <Scenario>
+            %s
+        </Scenario>
+    </StorageApplicationHeader>
+    <StorageUserHeader xmlns="http://www.msn.com/webservices/storage/w10">
+        <Puid>0</Puid>
+        <TicketToken>
+            %s
+        </TicketToken>
+    </StorageUserHeader>""")
 
 def soap_header(scenario, security_token):
     """Returns the SOAP xml header"""
 
-    return """<StorageApplicationHeader xmlns="http://www.msn.com/webservices/storage/w10">
-            <ApplicationID>Messenger Client 8.0</ApplicationID>
-            <Scenario>
-                %s
-            </Scenario>
-        </StorageApplicationHeader>
-        <StorageUserHeader xmlns="http://www.msn.com/webservices/storage/w10">
-            <Puid>0</Puid>
-            <TicketToken>
-                %s
-            </TicketToken>
-        </StorageUserHeader>""" % (xml.escape(scenario), xml.escape(security_token))
+    return _header_template % (xml.escape(scenario), xml.escape(security_token))
@@ -18,6 +18,7 @@
 #
 
 from common import *
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -31,50 +32,66 @@ def soap_action():
 
     return "http://www.msn.com/webservices/AddressBook/AddMember"
 
+_email_template = compress_xml("""<Email>%s</Email>
+    <Annotations><Annotation>
+        <Name>MSN.IM.BuddyType</Name>
+        <Value>32:</Value>
+    </Annotation></Annotations>""")
+
+_body_template = compress_xml("""
+    <AddMember xmlns="http://www.msn.com/webservices/AddressBook">
+        <serviceHandle>
+            <Id>
+                0
+            </Id>
+            <Type>
+                Messenger
+            </Type>
+            <ForeignId>
+            </ForeignId>
+        </serviceHandle>
+        <memberships>
+            <Membership>
+                <MemberRole>
+                    %s
+                </MemberRole>
+                <Members>
+                    %s
+                </Members>
+            </Membership>
+        </memberships>
+    </AddMember>""")
+
+_member_template = compress_xml("""
+    <Member xsi:type="%sMember" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+        <Type>
+            %s
+        </Type>
+        <State>
+            %s
+        </State>
+            %s
+    </Member>""")
+
 def soap_body(member_role, type, state, account):
     """Returns the SOAP xml body"""
-    stuff = ""
 
-    if type == 'Passport':
-        stuff = "<PassportName>%s</PassportName>" % account
-    elif type == 'Email':
-        stuff = """<Email>%s</Email>
-        <Annotations><Annotation>
-            <Name>MSN.IM.BuddyType</Name>
-            <Value>32:</Value>
-        </Annotation></Annotations>""" % account
+    return soap_body_multiple(member_role, type, state, [account])
+
+def soap_body_multiple(member_role, type, state, accounts):
+    """Returns the SOAP xml body adding several members of the same type
+    to a membership list at once"""
+    members = ""
+
+    for account in accounts:
+        stuff = ""
+        if type == 'Passport':
+            stuff = "<PassportName>%s</PassportName>" % account
+        elif type == 'Email':
+            stuff = _email_template % account
+        members += _member_template % (type, type, state, stuff)
 
-    return """
-        <AddMember xmlns="http://www.msn.com/webservices/AddressBook">
-            <serviceHandle>
-                <Id>
-                    0
-                </Id>
-                <Type>
-                    Messenger
-                </Type>
-                <ForeignId>
-                </ForeignId>
-            </serviceHandle>
-            <memberships>
-                <Membership>
-                    <MemberRole>
-                        %s
-                    </MemberRole>
-                    <Members>
-                        <Member xsi:type="%sMember" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
-                            <Type>
-                                %s
-                            </Type>
-                            <State>
-                                %s
-                            </State>
-                                %s
-                        </Member>
-                    </Members>
-                </Membership>
-            </memberships>
-        </AddMember>""" % (member_role, type, type, state, stuff)
+    return _body_template % (member_role, members)
 
 def process_response(soap_response):
     return None
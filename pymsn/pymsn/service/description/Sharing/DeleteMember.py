@@ -18,6 +18,7 @@
 #
 
 from common import *
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -31,46 +32,57 @@ def soap_action():
 
     return "http://www.msn.com/webservices/AddressBook/DeleteMember"
 
+_member_template = compress_xml("""<Member xsi:type="%sMember" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+        <Type>%s</Type>
+        <State>%s</State>
+        %s
+    </Member>""")
+
+_body_template = compress_xml("""
+    <DeleteMember xmlns="http://www.msn.com/webservices/AddressBook">
+        <serviceHandle>
+            <Id>
+                0
+            </Id>
+            <Type>
+                Messenger
+            </Type>
+            <ForeignId>
+            </ForeignId>
+        </serviceHandle>
+        <memberships>
+            <Membership>
+                <MemberRole>
+                    %(member_role)s
+                </MemberRole>
+                <Members>
+                    %(member)s
+                </Members>
+            </Membership>
+        </memberships>
+    </DeleteMember>""")
+
 def soap_body(member_role, type, state, account):
     """Returns the SOAP xml body"""
-    address = ""
-    
-    if account is not None:
-        if type == 'Passport':
-            address = "<PassportName>%s</PassportName>" % account
-        elif type == 'Email':
-            address = "<Email>%s</Email>" % account
-    
-    member =  """<Member xsi:type="%sMember" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
-                     <Type>%s</Type>
-                     <State>%s</State>
-                     %s
-                 </Member>""" % (type, type, state, address)
 
-    return """
-        <DeleteMember xmlns="http://www.msn.com/webservices/AddressBook">
-            <serviceHandle>
-                <Id>
-                    0
-                </Id>
-                <Type>
-                    Messenger
-                </Type>
-                <ForeignId>
-                </ForeignId>
-            </serviceHandle>
-            <memberships>
-                <Membership>
-                    <MemberRole>
-                        %(member_role)s
-                    </MemberRole>
-                    <Members>
-                        %(member)s
-                    </Members>
-                </Membership>
-            </memberships>
-        </DeleteMember>""" % { 'member_role' : member_role,
-                               'member' : member }
+    return soap_body_multiple(member_role, type, state, [account])
+
+def soap_body_multiple(member_role, type, state, accounts):
+    """Returns the SOAP xml body deleting several members of the same type
+    from a membership list at once"""
+    member = ""
+
+    for account in accounts:
+        address = ""
+        if account is not None:
+            if type == 'Passport':
+                address = "<PassportName>%s</PassportName>" % account
+            elif type == 'Email':
+                address = "<Email>%s</Email>" % account
+        member += _member_template % (type, type, state, address)
+
+    return _body_template % { 'member_role' : member_role,
+                              'member' : member }
 
 def process_response(soap_response):
     return None
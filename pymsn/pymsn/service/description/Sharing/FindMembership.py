@@ -21,6 +21,7 @@ from common import *
 from pymsn.profile import Membership
 
 import xml.sax.saxutils as xml
+from pymsn.service.SOAPUtils import compress_xml
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -34,36 +35,42 @@ def soap_action():
 
     return "http://www.msn.com/webservices/AddressBook/FindMembership"
 
+_service_type_template = compress_xml("""<ServiceType xmlns="http://www.msn.com/webservices/AddressBook">
+         %s
+    </ServiceType>""")
+
+_deltas_template = compress_xml("""<View xmlns="http://www.msn.com/webservices/AddressBook">
+        Full
+    </View>
+    <deltasOnly xmlns="http://www.msn.com/webservices/AddressBook">
+        true
+    </deltasOnly>
+    <lastChange xmlns="http://www.msn.com/webservices/AddressBook">
+        %s
+    </lastChange>""")
+
+_body_template = compress_xml("""
+   <FindMembership xmlns="http://www.msn.com/webservices/AddressBook">
+       <serviceFilter xmlns="http://www.msn.com/webservices/AddressBook">
+           <Types xmlns="http://www.msn.com/webservices/AddressBook">
+              %(services)s
+           </Types>
+       </serviceFilter>
+       %(deltas)s
+   </FindMembership>""")
+
 def soap_body(services_types, deltas_only, last_change):
     """Returns the SOAP xml body"""
 
     services = ''
     for service in services_types:
-        services += """<ServiceType xmlns="http://www.msn.com/webservices/AddressBook">
-                     %s
-                </ServiceType>""" % xml.escape(service)
+        services += _service_type_template % xml.escape(service)
 
     deltas = ''
     if deltas_only:
-        deltas = """<View xmlns="http://www.msn.com/webservices/AddressBook">
-                        Full
-                    </View>
-                    <deltasOnly xmlns="http://www.msn.com/webservices/AddressBook">
-                        true
-                    </deltasOnly>
-                    <lastChange xmlns="http://www.msn.com/webservices/AddressBook">
-                        %s
-                    </lastChange>""" % last_change
-
-    return """
-       <FindMembership xmlns="http://www.msn.com/webservices/AddressBook">
-           <serviceFilter xmlns="http://www.msn.com/webservices/AddressBook">
-               <Types xmlns="http://www.msn.com/webservices/AddressBook">
-                  %(services)s
-               </Types>
-           </serviceFilter>
-           %(deltas)s
-       </FindMembership>""" % {'services' : services, 'deltas' : deltas}
+        deltas = _deltas_template % last_change
+
+    return _body_template % {'services' : services, 'deltas' : deltas}
 
 def process_response(soap_response):
     # FIXME: don't pick the 1st service only, we need to extract them all
@@ -81,8 +88,17 @@ def process_response(soap_response):
             result[role.text] = members
         last_changes = service.find("./ab:LastChange")
     else:
-        last_changes = {'text':"0-0-0T0:0:0.0-0:0"}
+        last_changes = None
         result = {'Allow':{},'Block':{},'Reverse':{},'Pending':{}}
+
+    # the elements decoded while parsing are no longer in the tree, the
+    # role of a membership comes before its members
+    role = None
+    for tag, value in soap_response.decoded:
+        if tag == "ab:MemberRole":
+            role = value
+        elif tag == "ab:Member" and role is not None:
+            result.setdefault(role, []).append(value)
     return (result, last_changes)
 
     
@@ -19,19 +19,22 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 import xml.sax.saxutils as xml
+from pymsn.service.SOAPUtils import compress_xml
 
 __all__ = ['soap_header']
 
+_header_template = compress_xml("""
+    <ABApplicationHeader xmlns="http://www.msn.com/webservices/AddressBook">
+       <ApplicationId xmlns="http://www.msn.com/webservices/AddressBook">996CDE1E-AA53-4477-B943-2BE802EA6166</ApplicationId>
+       <IsMigration xmlns="http://www.msn.com/webservices/AddressBook">false</IsMigration>
+       <PartnerScenario xmlns="http://www.msn.com/webservices/AddressBook">%s</PartnerScenario>
+   </ABApplicationHeader>
+   <ABAuthHeader xmlns="http://www.msn.com/webservices/AddressBook">
+       <ManagedGroupRequest xmlns="http://www.msn.com/webservices/AddressBook">false</ManagedGroupRequest>
+       <TicketToken xmlns="http://www.msn.com/webservices/AddressBook">%s</TicketToken>
+   </ABAuthHeader>""")
+
 def soap_header(scenario, security_token):
     """Returns the SOAP xml header"""
 
-    return """
-        <ABApplicationHeader xmlns="http://www.msn.com/webservices/AddressBook">
-           <ApplicationId xmlns="http://www.msn.com/webservices/AddressBook">996CDE1E-AA53-4477-B943-2BE802EA6166</ApplicationId>
-           <IsMigration xmlns="http://www.msn.com/webservices/AddressBook">false</IsMigration>
-           <PartnerScenario xmlns="http://www.msn.com/webservices/AddressBook">%s</PartnerScenario>
-       </ABApplicationHeader>
-       <ABAuthHeader xmlns="http://www.msn.com/webservices/AddressBook">
-           <ManagedGroupRequest xmlns="http://www.msn.com/webservices/AddressBook">false</ManagedGroupRequest>
-           <TicketToken xmlns="http://www.msn.com/webservices/AddressBook">%s</TicketToken>
-       </ABAuthHeader>""" % (xml.escape(scenario), xml.escape(security_token))
+    return _header_template % (xml.escape(scenario), xml.escape(security_token))
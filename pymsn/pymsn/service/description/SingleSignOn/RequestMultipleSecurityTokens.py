@@ -19,6 +19,7 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 import xml.sax.saxutils as xml
+from pymsn.service.SOAPUtils import compress_xml
 
 class LiveService(object):
     CONTACTS = ("contacts.msn.com", "?fs=1&id=24000&kv=7&rn=93S9SWWw&tw=0&ver=2.1.6000.1")
@@ -51,68 +52,73 @@ def soap_action():
 
     return None
 
+_header_template = compress_xml("""
+    <ps:AuthInfo xmlns:ps="http://schemas.microsoft.com/Passport/SoapServices/PPCRL" Id="PPAuthInfo">
+    <ps:HostingApp>{7108E71A-9926-4FCB-BCC9-9A9D3F32E423}</ps:HostingApp>
+    <ps:BinaryVersion>4</ps:BinaryVersion>
+    <ps:UIVersion>1</ps:UIVersion>
+    <ps:Cookies/>
+    <ps:RequestParams>AQAAAAIAAABsYwQAAAAxMDMz</ps:RequestParams>
+    </ps:AuthInfo>
+    <wsse:Security xmlns:wsse="http://schemas.xmlsoap.org/ws/2003/06/secext">
+    <wsse:UsernameToken Id="user">
+        <wsse:Username>%(account)s</wsse:Username>
+        <wsse:Password>%(password)s</wsse:Password>
+    </wsse:UsernameToken>
+    </wsse:Security>""")
+
 def soap_header(account, password):
     """Returns the SOAP xml header"""
 
-    return """
-        <ps:AuthInfo xmlns:ps="http://schemas.microsoft.com/Passport/SoapServices/PPCRL" Id="PPAuthInfo">
-        <ps:HostingApp>{7108E71A-9926-4FCB-BCC9-9A9D3F32E423}</ps:HostingApp>
-        <ps:BinaryVersion>4</ps:BinaryVersion>
-        <ps:UIVersion>1</ps:UIVersion>
-        <ps:Cookies/>
-        <ps:RequestParams>AQAAAAIAAABsYwQAAAAxMDMz</ps:RequestParams>
-        </ps:AuthInfo>
-        <wsse:Security xmlns:wsse="http://schemas.xmlsoap.org/ws/2003/06/secext">
-        <wsse:UsernameToken Id="user">
-            <wsse:Username>%(account)s</wsse:Username>
-            <wsse:Password>%(password)s</wsse:Password>
-        </wsse:UsernameToken>
-        </wsse:Security>""" % {'account': xml.escape(account),
-                'password': xml.escape(password)}
+    return _header_template % {'account': xml.escape(account),
+                               'password': xml.escape(password)}
+
+_token_template = compress_xml("""
+    <wst:RequestSecurityToken xmlns:wst="http://schemas.xmlsoap.org/ws/2004/04/trust" Id="RST%(id)d">
+        <wst:RequestType>http://schemas.xmlsoap.org/ws/2004/04/security/trust/Issue</wst:RequestType>
+        <wsp:AppliesTo xmlns:wsp="http://schemas.xmlsoap.org/ws/2002/12/policy">
+            <wsa:EndpointReference xmlns:wsa="http://schemas.xmlsoap.org/ws/2004/03/addressing">
+                <wsa:Address>%(address)s</wsa:Address>
+            </wsa:EndpointReference>
+        </wsp:AppliesTo>
+        %(policy_reference)s
+    </wst:RequestSecurityToken>""")
+
+_policy_reference_template = compress_xml("""
+    <wsse:PolicyReference xmlns:wsse="http://schemas.xmlsoap.org/ws/2003/06/secext" URI=%(uri)s/>""")
+
+_body_template = '<ps:RequestMultipleSecurityTokens ' \
+    'xmlns:ps="http://schemas.microsoft.com/Passport/SoapServices/PPCRL" ' \
+    'Id="RSTS">%s</ps:RequestMultipleSecurityTokens>'
 
 def soap_body(*tokens):
     """Returns the SOAP xml body"""
 
-    token_template = """
-        <wst:RequestSecurityToken xmlns:wst="http://schemas.xmlsoap.org/ws/2004/04/trust" Id="RST%(id)d">
-            <wst:RequestType>http://schemas.xmlsoap.org/ws/2004/04/security/trust/Issue</wst:RequestType>
-            <wsp:AppliesTo xmlns:wsp="http://schemas.xmlsoap.org/ws/2002/12/policy">
-                <wsa:EndpointReference xmlns:wsa="http://schemas.xmlsoap.org/ws/2004/03/addressing">
-                    <wsa:Address>%(address)s</wsa:Address>
-                </wsa:EndpointReference>
-            </wsp:AppliesTo>
-            %(policy_reference)s
-        </wst:RequestSecurityToken>"""
-    policy_reference_template = """
-        <wsse:PolicyReference xmlns:wsse="http://schemas.xmlsoap.org/ws/2003/06/secext" URI=%(uri)s/>"""
-
     tokens = list(tokens)
     if LiveService.TB in tokens:
         tokens.remove(LiveService.TB)
 
     assert(len(tokens) >= 1)
     
-    body = token_template % \
+    body = _token_template % \
             {'id': 0,
                 'address': xml.escape(LiveService.TB[0]),
                 'policy_reference': ''}
 
     for id, token in enumerate(tokens):
         if token[1] is not None:
-            policy_reference = policy_reference_template % \
+            policy_reference = _policy_reference_template % \
                     {'uri': xml.quoteattr(token[1])}
         else:
             policy_reference = ""
 
-        t = token_template % \
+        t = _token_template % \
                 {'id': id + 1,
                     'address': xml.escape(token[0]),
                     'policy_reference': policy_reference}
         body += t
 
-    return '<ps:RequestMultipleSecurityTokens ' \
-        'xmlns:ps="http://schemas.microsoft.com/Passport/SoapServices/PPCRL" ' \
-        'Id="RSTS">%s</ps:RequestMultipleSecurityTokens>' % body
+    return _body_template % body
 
 def process_response(soap_response):
     body = soap_response.body
@@ -18,17 +18,20 @@
 #
 
 import xml.sax.saxutils as xml
+from pymsn.service.SOAPUtils import compress_xml
 
 #from pymsn.util.element_tree import XMLTYPE
 
+_header_template = compress_xml("""
+     <AuthTokenHeader xmlns="http://www.msn.com/webservices/spaces/v1/">
+        <Token>%s
+        </Token>
+     </AuthTokenHeader>""")
+
 def soap_header(security_token):
     """Returns the SOAP xml header"""
 
-    return """
-         <AuthTokenHeader xmlns="http://www.msn.com/webservices/spaces/v1/">
-            <Token>%s
-            </Token>
-         </AuthTokenHeader>""" % (xml.escape(security_token))
+    return _header_template % (xml.escape(security_token))
 
 def transport_headers():
     """Returns a dictionary, containing transport (http) headers
@@ -42,26 +45,28 @@ def soap_action():
 
     return "http://www.msn.com/webservices/spaces/v1/GetXmlFeed"
 
+_body_template = compress_xml("""
+   <GetXmlFeed xmlns="http://www.msn.com/webservices/spaces/v1/">
+      <refreshInformation>
+         <cid xmlns="http://www.msn.com/webservices/spaces/v1/">%(cid)s</cid>
+         <storageAuthCache></storageAuthCache>
+         <market xmlns="http://www.msn.com/webservices/spaces/v1/">%(market)s</market>
+         <brand></brand>
+         <maxElementCount xmlns="http://www.msn.com/webservices/spaces/v1/">%(max_element_count)d</maxElementCount>
+         <maxCharacterCount xmlns="http://www.msn.com/webservices/spaces/v1/">%(max_character_count)d</maxCharacterCount>
+         <maxImageCount xmlns="http://www.msn.com/webservices/spaces/v1/">%(max_image_count)d</maxImageCount>
+      </refreshInformation>
+   </GetXmlFeed>
+   """)
+
 def soap_body(cid, market = "en-US", max_elements = 2, max_chars = 200, max_images = 6):
     """Returns the SOAP xml body"""
     # , last_viewed, app_id = "Messenger Client 8.0", update_access_time = True, is_active_contact = False
-    return """
-       <GetXmlFeed xmlns="http://www.msn.com/webservices/spaces/v1/">
-          <refreshInformation>
-             <cid xmlns="http://www.msn.com/webservices/spaces/v1/">%(cid)s</cid>
-             <storageAuthCache></storageAuthCache>
-             <market xmlns="http://www.msn.com/webservices/spaces/v1/">%(market)s</market>
-             <brand></brand>
-             <maxElementCount xmlns="http://www.msn.com/webservices/spaces/v1/">%(max_element_count)d</maxElementCount>
-             <maxCharacterCount xmlns="http://www.msn.com/webservices/spaces/v1/">%(max_character_count)d</maxCharacterCount>
-             <maxImageCount xmlns="http://www.msn.com/webservices/spaces/v1/">%(max_image_count)d</maxImageCount>
-          </refreshInformation>
-       </GetXmlFeed>
-       """ % {'cid' : cid,
-              'market' : market,
-              'max_element_count' : max_elements,
-              'max_character_count' : max_chars,
-              'max_image_count' : max_images}
+    return _body_template % {'cid' : cid,
+                             'market' : market,
+                             'max_element_count' : max_elements,
+                             'max_character_count' : max_chars,
+                             'max_image_count' : max_images}
 
 #             <applicationId>%(application_id)s</applicationId>
 #             <updateAccessedTime>%(update_accessed_time)s</updateAccessedTime>
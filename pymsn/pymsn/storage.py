@@ -27,10 +27,11 @@ except ImportError:
 import UserDict
 import anydbm
 import random
+import time
 from Crypto.Hash import SHA
 from Crypto.Cipher import Blowfish
 
-__all__ = ['MemoryStorage', 'DbmStorage', 'DecryptError']
+__all__ = ['MemoryStorage', 'DbmStorage', 'SqliteStorage', 'DecryptError']
 
 _storage = None
 
@@ -209,3 +210,182 @@ class DbmStorage(AbstractStorage):
             self._dict.sync()
         self._dict.close()
 
+
+class SqliteStorage(AbstractStorage):
+    """SQLite backed storage type.
+
+    All the storages of an account share a single database file, each
+    storage identifier being mapped to its own table indexed on the key.
+    Entries may be given an expiry time, expired entries are ignored by
+    lookups and removed by L{purge_expired}, which is called whenever a
+    storage is opened."""
+
+    STORAGE_PATH = "~/.pymsn"
+    DATABASE_NAME = "storage.db"
+
+    # file path -> [connection, number of storages using it]
+    _connections = {}
+
+    def __init__(self, account, password, identifier):
+        import os
+        AbstractStorage.__init__(self, account, password, identifier)
+
+        storage_path = os.path.expanduser(self.STORAGE_PATH)
+        file_dir = os.path.join(storage_path, self.account)
+        file_path = os.path.join(file_dir, self.DATABASE_NAME)
+        try:
+            os.makedirs(file_dir)
+        except:
+            pass
+
+        self._file_path = file_path
+        self._connection = self._open_connection(file_path)
+        self._table = '"%s"' % identifier.replace('"', '""')
+        index = '"%s_expires"' % identifier.replace('"', '""')
+        self._connection.execute("CREATE TABLE IF NOT EXISTS %s ("
+                "key TEXT PRIMARY KEY NOT NULL, "
+                "value BLOB NOT NULL, "
+                "expires INTEGER)" % self._table)
+        self._connection.execute("CREATE INDEX IF NOT EXISTS %s "
+                "ON %s (expires)" % (index, self._table))
+        self._connection.commit()
+        self.purge_expired()
+
+    def _open_connection(cls, file_path):
+        try:
+            import sqlite3 as sqlite
+        except ImportError:
+            from pysqlite2 import dbapi2 as sqlite
+        entry = cls._connections.get(file_path, None)
+        if entry is None:
+            connection = sqlite.connect(file_path)
+            connection.text_factory = str
+            entry = cls._connections[file_path] = [connection, 0]
+        entry[1] += 1
+        return entry[0]
+    _open_connection = classmethod(_open_connection)
+
+    def _release_connection(cls, file_path):
+        entry = cls._connections[file_path]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del cls._connections[file_path]
+            entry[0].close()
+    _release_connection = classmethod(_release_connection)
+
+    def keys(self):
+        cursor = self._connection.execute("SELECT key FROM %s "
+                "WHERE expires IS NULL OR expires > ?" % self._table,
+                (int(time.time()),))
+        return [row[0] for row in cursor]
+
+    def has_key(self, key):
+        cursor = self._connection.execute("SELECT 1 FROM %s "
+                "WHERE key = ? AND (expires IS NULL OR expires > ?)" %
+                self._table, (str(key), int(time.time())))
+        return cursor.fetchone() is not None
+
+    def __len__(self):
+        cursor = self._connection.execute("SELECT COUNT(*) FROM %s "
+                "WHERE expires IS NULL OR expires > ?" % self._table,
+                (int(time.time()),))
+        return cursor.fetchone()[0]
+
+    def __getitem__(self, key):
+        cursor = self._connection.execute("SELECT value FROM %s "
+                "WHERE key = ? AND (expires IS NULL OR expires > ?)" %
+                self._table, (str(key), int(time.time())))
+        row = cursor.fetchone()
+        if row is None:
+            raise KeyError(key)
+        return self._unpickle_decrypt(str(row[0]))
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        cursor = self._connection.execute("DELETE FROM %s WHERE key = ?" %
+                self._table, (str(key),))
+        self._connection.commit()
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __del__(self):
+        self.close()
+
+    def set(self, key, value, expires=None):
+        """Stores a value
+
+            @param expires: the time after which the value is discarded
+                as returned by time.time() or None for no expiry"""
+        self.set_many(((key, value),), expires)
+
+    def set_many(self, items, expires=None):
+        """Stores several values in a single transaction
+
+            @param items: a dict or a sequence of (key, value) pairs
+            @param expires: the time after which the values are discarded
+                as returned by time.time() or None for no expiry"""
+        if hasattr(items, 'iteritems'):
+            items = items.iteritems()
+        if expires is not None:
+            expires = int(expires)
+        rows = [(str(key), buffer(self._pickle_encrypt(value)), expires) \
+                    for key, value in items]
+        try:
+            self._connection.executemany("INSERT OR REPLACE INTO %s "
+                    "(key, value, expires) VALUES (?, ?, ?)" % self._table,
+                    rows)
+        except:
+            self._connection.rollback()
+            raise
+        self._connection.commit()
+
+    def get_many(self, keys):
+        """Retrieves several values at once
+
+            @return: a dict of the found keys and their values, keys which
+                are missing, expired or cannot be decrypted are left out"""
+        keys = [str(key) for key in keys]
+        result = {}
+        now = int(time.time())
+        # stay below SQLITE_MAX_VARIABLE_NUMBER
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            cursor = self._connection.execute("SELECT key, value FROM %s "
+                    "WHERE key IN (%s) AND (expires IS NULL OR expires > ?)" %
+                    (self._table, ", ".join("?" * len(chunk))),
+                    chunk + [now])
+            for key, value in cursor:
+                try:
+                    result[key] = self._unpickle_decrypt(str(value))
+                except DecryptError:
+                    continue
+        return result
+
+    def delete_many(self, keys):
+        """Removes several values in a single transaction, missing keys
+        are ignored"""
+        try:
+            self._connection.executemany("DELETE FROM %s WHERE key = ?" %
+                    self._table, [(str(key),) for key in keys])
+        except:
+            self._connection.rollback()
+            raise
+        self._connection.commit()
+
+    def purge_expired(self):
+        """Removes the expired values from the storage"""
+        self._connection.execute("DELETE FROM %s WHERE expires <= ?" %
+                self._table, (int(time.time()),))
+        self._connection.commit()
+
+    def close(self):
+        """Releases the connection, it is closed along with the last
+        storage using it"""
+        connection = getattr(self, '_connection', None)
+        if connection is None:
+            return
+        self._connection = None
+        connection.commit()
+        self._release_connection(self._file_path)
@@ -24,12 +24,16 @@ The switchboard manager is responsible for managing all the switchboards in
 use, it simplifies the complexity of the switchboard crack."""
 
 import logging
+import heapq
+import time
 import gobject
 import weakref
 
 import pymsn.msnp as msnp
+import pymsn.profile as profile
 from pymsn.transport import ServerType
 from pymsn.util.weak import WeakSet
+from pymsn.util.cache import LRUCache
 from pymsn.event import ConversationErrorType, ContactInviteError, MessageError
 
 __all__ = ['SwitchboardManager']
@@ -37,15 +41,52 @@ __all__ = ['SwitchboardManager']
 logger = logging.getLogger('protocol:switchboard_manager')
 
 class SwitchboardClient(object):
+    """Base class of the objects using a switchboard
+
+        The messages requiring an acknowledgement are tracked until the
+        server acknowledges them, at most C{max_in_flight} of them being
+        sent and not acknowledged yet. A message the server could not
+        deliver, or did not acknowledge within C{ack_timeout} seconds, is
+        sent again on a new switchboard up to C{max_retries} times, the
+        other handlers sharing the switchboard keep using it.
+
+        @ivar max_in_flight: maximum number of messages sent and waiting
+            for their acknowledgement
+        @type max_in_flight: integer
+        @ivar ack_timeout: seconds to wait for an acknowledgement
+        @type ack_timeout: integer
+        @ivar max_retries: number of times an undelivered message is sent
+            again before reporting the error
+        @type max_retries: integer
+
+        @cvar _CONTENT_TYPES: the content types of the messages the class
+            may handle, the manager only asks L{_can_handle_message} for
+            those, None to be asked for every message"""
+
+    _CONTENT_TYPES = None
+
     def __init__(self, client, contacts, priority=99):
         self._client = client
         self._switchboard_manager = weakref.proxy(self._client._switchboard_manager)
         self.__switchboard = None
+        self.__switchboard_ref = None
         self._switchboard_requested = False
         self._switchboard_priority = priority
 
+        self.max_in_flight = 8
+        self.ack_timeout = 30
+        self.max_retries = 1
+
         self._pending_invites = set(contacts)
         self._pending_messages = []
+        # id(message) -> [message, ack, retries, time sent, in the window,
+        #                 weak reference to the switchboard]
+        self._in_flight = {}
+        self.__window = 0
+        self.__ack_timeout_source = None
+        # weak reference to the switchboard not to attach again, after it
+        # failed to deliver a message
+        self._avoided_switchboard = None
 
         self.participants = set()
         self._process_pending_queues()
@@ -63,19 +104,29 @@ class SwitchboardClient(object):
         return self.__switchboard
     def __set_switchboard(self, switchboard):
         self.__switchboard = weakref.proxy(switchboard)
+        self.__switchboard_ref = weakref.ref(switchboard)
         self._switchboard_requested = False
+        self._avoided_switchboard = None
         self.participants = set(switchboard.participants.values())
 
+        # a switchboard the handler was detached from may still be used
+        # by other handlers, only its acknowledgements are of interest
         self.switchboard.connect("notify::inviting",
-                lambda sb, pspec: self.__on_user_inviting_changed())
+                lambda sb, pspec: self.__is_attached(sb) and
+                    self.__on_user_inviting_changed())
         self.switchboard.connect("user-joined",
-                lambda sb, contact: self.__on_user_joined(contact))
+                lambda sb, contact: self.__is_attached(sb) and
+                    self.__on_user_joined(contact))
         self.switchboard.connect("user-left",
-                lambda sb, contact: self.__on_user_left(contact))
+                lambda sb, contact: self.__is_attached(sb) and
+                    self.__on_user_left(contact))
         self.switchboard.connect("user-invitation-failed",
-                lambda sb, contact: self.__on_user_invitation_failed(contact))
+                lambda sb, contact: self.__is_attached(sb) and
+                    self.__on_user_invitation_failed(contact))
+        self.switchboard.connect("message-delivered",
+                lambda sb, message: self.__on_message_delivered(message))
         self.switchboard.connect("message-undelivered",
-                lambda sb, command: self.__on_message_undelivered(command))
+                lambda sb, message: self.__on_message_undelivered(message))
         logger.info("New switchboard attached")
         def process_pending_queues():
             self._process_pending_queues()
@@ -84,17 +135,25 @@ class SwitchboardClient(object):
 
     _switchboard = property(__get_switchboard, __set_switchboard)
     switchboard = property(__get_switchboard)
-    
+
+    def _detach_switchboard(self):
+        """Called by the manager when it closes the switchboard, a new one
+        will be requested for the next message"""
+        self.__switchboard = None
+        self.__switchboard_ref = None
+        self._switchboard_requested = False
+
     # protected
     def _send_message(self, content_type, body, headers={},
             ack=msnp.MessageAcknowledgement.HALF):
         message = msnp.Message(self._client.profile)
         for key, value in headers.iteritems():
             message.add_header(key, value)
-        message.content_type = content_type
+        if content_type is not None:
+            message.content_type = content_type
         message.body = body
 
-        self._pending_messages.append((message, ack))
+        self._pending_messages.append((message, ack, 0))
         self._process_pending_queues()
 
     def _invite_user(self, contact):
@@ -121,7 +180,13 @@ class SwitchboardClient(object):
         raise NotImplementedError
 
     # private
+    def __is_attached(self, switchboard):
+        return self.__switchboard_ref is not None and \
+                self.__switchboard_ref() is switchboard
+
     def __on_user_inviting_changed(self):
+        if self.switchboard is None:
+            return # detached by the manager
         if not self.switchboard.inviting:
             self._process_pending_queues()
 
@@ -145,9 +210,90 @@ class SwitchboardClient(object):
         self._on_error(ConversationErrorType.CONTACT_INVITE,
                 ContactInviteError.NOT_AVAILABLE)
 
-    def __on_message_undelivered(self, command):
-        self._on_error(ConversationErrorType.MESSAGE,
-                MessageError.DELIVERY_FAILED)
+    def __on_message_written(self, message):
+        entry = self._in_flight.get(id(message), None)
+        if entry is None or entry[1] != msnp.MessageAcknowledgement.HALF:
+            return
+        # only failures are acknowledged, the message leaves the window
+        # but stays tracked until ack_timeout in case the server NAKs it
+        if entry[4]:
+            entry[4] = False
+            self.__window -= 1
+            self._process_pending_queues()
+
+    def __on_message_delivered(self, message):
+        entry = self.__untrack(message)
+        if entry is None:
+            return
+        if entry[1] == msnp.MessageAcknowledgement.FULL:
+            self._switchboard_manager._record_delivery_latency(
+                    time.time() - entry[3])
+        self._process_pending_queues()
+
+    def __on_message_undelivered(self, message):
+        if message is None:
+            # sent before the tracking, or forgotten by the switchboard
+            self._on_error(ConversationErrorType.MESSAGE,
+                    MessageError.DELIVERY_FAILED)
+            return
+        entry = self.__untrack(message)
+        if entry is not None:
+            self.__retry(entry)
+
+    def __track(self, message, ack, retries):
+        self._in_flight[id(message)] = [message, ack, retries, time.time(),
+                True, self.__switchboard_ref]
+        self.__window += 1
+        if self.__ack_timeout_source is None:
+            self.__ack_timeout_source = gobject.timeout_add(
+                    self.ack_timeout * 1000, self.__on_ack_timeout)
+
+    def __untrack(self, message):
+        entry = self._in_flight.pop(id(message), None)
+        if entry is not None and entry[4]:
+            self.__window -= 1
+        return entry
+
+    def __retry(self, entry):
+        message, ack, retries, sent, in_window, switchboard_ref = entry
+        if retries >= self.max_retries:
+            self._on_error(ConversationErrorType.MESSAGE,
+                    MessageError.DELIVERY_FAILED)
+            return
+        logger.info("Message not delivered, sending it again")
+        # after the messages already being retried, before the new ones
+        index = 0
+        while index < len(self._pending_messages) and \
+                self._pending_messages[index][2] > 0:
+            index += 1
+        self._pending_messages.insert(index, (message, ack, retries + 1))
+        # a fresh switchboard, this one may have lost the participants
+        switchboard = switchboard_ref()
+        if switchboard is not None:
+            self._avoided_switchboard = switchboard_ref
+            self._switchboard_manager._detach_handler(self, switchboard)
+        self._process_pending_queues()
+
+    def __on_ack_timeout(self):
+        self.__ack_timeout_source = None
+        now = time.time()
+        next_deadline = None
+        for entry in self._in_flight.values():
+            deadline = entry[3] + self.ack_timeout
+            if deadline > now:
+                if next_deadline is None or deadline < next_deadline:
+                    next_deadline = deadline
+                continue
+            self.__untrack(entry[0])
+            # no news from the server is good news for HALF messages
+            if entry[1] == msnp.MessageAcknowledgement.FULL:
+                self.__retry(entry)
+        if next_deadline is not None and self.__ack_timeout_source is None:
+            self.__ack_timeout_source = gobject.timeout_add(
+                    int((next_deadline - now) * 1000) + 1,
+                    self.__on_ack_timeout)
+        self._process_pending_queues()
+        return False
 
     # Helper functions
     def _process_pending_queues(self):
@@ -163,10 +309,19 @@ class SwitchboardClient(object):
                 self.switchboard.invite_user(contact)
         self._pending_invites = set()
 
-        if not self.switchboard.inviting:
-            for message, ack in self._pending_messages:
-                self.switchboard.send_message(message, ack)
-            self._pending_messages = []
+        if self.switchboard.inviting:
+            return
+        tracked = (msnp.MessageAcknowledgement.FULL,
+                msnp.MessageAcknowledgement.HALF)
+        while len(self._pending_messages) > 0:
+            message, ack, retries = self._pending_messages[0]
+            if ack in tracked:
+                if self.__window >= self.max_in_flight:
+                    break
+                self.__track(message, ack, retries)
+            del self._pending_messages[0]
+            self.switchboard.send_message(message, ack,
+                    self.__on_message_written, (message,))
 
     def _request_switchboard(self):
         if (self.switchboard is not None) and \
@@ -184,7 +339,38 @@ class SwitchboardClient(object):
 
 class SwitchboardManager(gobject.GObject):
     """Switchboard management
-        
+
+        Opening a switchboard takes several round trips, so the manager can
+        keep switchboards ready before they are needed, within a budget of
+        connections:
+            - C{pool_size} empty switchboards are kept open, a new
+              conversation only has to invite its participants
+            - a switchboard is opened for the C{warm_contacts} contacts
+              the user talked to the most when they come online
+
+        @ivar pool_size: number of empty switchboards kept open
+        @type pool_size: integer
+        @ivar warm_contacts: number of most contacted contacts getting a
+            switchboard opened when they come online
+        @type warm_contacts: integer
+        @ivar warm_budget: maximum number of switchboards opened in advance
+            and not used yet
+        @type warm_budget: integer
+
+        Switchboards stay connected until the server closes them, the
+        manager can close them itself, their handlers getting a new one
+        through L{request_switchboard} when they need it again:
+            - after C{idle_timeout} seconds without any message
+            - the least recently used one when more than
+              C{max_switchboards} are open
+
+        @ivar idle_timeout: seconds of inactivity after which a switchboard
+            is closed, 0 to never close them
+        @type idle_timeout: integer
+        @ivar max_switchboards: maximum number of open switchboards, 0 for
+            no limit
+        @type max_switchboards: integer
+
         @undocumented: do_get_property, do_set_property
         @group Handlers: _handle_*, _default_handler, _error_handler"""
     __gsignals__ = {
@@ -193,6 +379,10 @@ class SwitchboardManager(gobject.GObject):
                 (object, object))
             }
 
+    WARM_PRIORITY = 200
+    LATENCY_SAMPLES = 1000
+    CONTACTS_USAGE_SIZE = 1024
+
     def __init__(self, client):
         """Initializer
 
@@ -201,56 +391,151 @@ class SwitchboardManager(gobject.GObject):
         self._client = weakref.proxy(client)
 
         self._handlers_class = set()
+        # content type -> handler classes which may handle it
+        self._handlers_by_content_type = {}
+        self._generic_handlers_class = []
         self._orphaned_handlers = WeakSet()
         self._switchboards = {}
         self._orphaned_switchboards = set()
         self._pending_switchboards = {}
 
+        # frozenset(participants) -> set of the switchboards not closed yet
+        self._participants_index = {}
+        self._switchboard_participants = {}
+        # frozenset(participants) -> requested switchboard
+        self._pending_index = {}
+        self._pending_participants = {}
+
+        self.pool_size = 0
+        self.warm_contacts = 0
+        self.warm_budget = 4
+        # switchboards opened in advance -> contact to invite or None
+        self._warm_switchboards = {}
+        # contacts of the switchboards being requested in advance
+        self._warm_requests = []
+        self._pool = []
+        # account -> number of conversations, for the most recently
+        # contacted accounts only
+        self._contacts_usage = LRUCache(self.CONTACTS_USAGE_SIZE)
+        # (warm_contacts, accounts of the most contacted contacts), None
+        # when the usage changed since it was computed
+        self._most_contacted = None
+
+        self.idle_timeout = 0
+        self.max_switchboards = 0
+
+        # the most recent delivery latencies, in seconds
+        self._delivery_latencies = []
+        # open switchboard -> time of the last activity, oldest first
+        self._switchboards_activity = LRUCache(0)
+        self._reaper_source = None
+
         self._client._protocol.connect("switchboard-invitation-received",
                 self._ns_switchboard_invite)
+        profile.Contact._add_change_listener(self)
 
     def close(self):
-        for switchboard in self._orphaned_switchboards:
-            switchboard.leave()
-        for switchboard in self._pending_switchboards:
-            switchboard.leave()
-        for switchboard in self._switchboards:
+        for switchboard in list(self._switchboards_activity):
             switchboard.leave()
+        self._switchboards_activity.clear()
+        self._warm_switchboards = {}
+        self._warm_requests = []
+        self._pool = []
+        if self._reaper_source is not None:
+            gobject.source_remove(self._reaper_source)
+            self._reaper_source = None
+
+    def fill_pool(self):
+        """Opens the switchboards missing from the pool, should be called
+        once the client is connected"""
+        needed = self.pool_size - len(self._pool) - \
+                self._warm_requests.count(None)
+        for i in range(needed):
+            if not self.__request_warm_switchboard(None):
+                break
+
+    def delivery_latency_percentiles(self, percentiles=(50, 90, 99)):
+        """Returns the delivery latencies of the most recent acknowledged
+        messages.
+
+            @param percentiles: the percentiles to compute
+            @return: {percentile: latency in seconds}, empty if no message
+                was acknowledged yet"""
+        latencies = sorted(self._delivery_latencies)
+        result = {}
+        if len(latencies) == 0:
+            return result
+        for percentile in percentiles:
+            index = int(round(percentile / 100.0 * (len(latencies) - 1)))
+            result[percentile] = latencies[index]
+        return result
+
+    def _record_delivery_latency(self, latency):
+        self._delivery_latencies.append(latency)
+        if len(self._delivery_latencies) > self.LATENCY_SAMPLES:
+            del self._delivery_latencies[0]
 
     def register_handler(self, handler_class, *extra_arguments):
         self._handlers_class.add((handler_class, extra_arguments))
+        content_types = handler_class._CONTENT_TYPES
+        if content_types is None:
+            self._generic_handlers_class.append(
+                    (handler_class, extra_arguments))
+            return
+        for content_type in content_types:
+            self._handlers_by_content_type.setdefault(content_type, []).\
+                    append((handler_class, extra_arguments))
 
     def request_switchboard(self, handler, priority=99):
-        handler_participants = handler.total_participants
+        handler_participants = frozenset(handler.total_participants)
+        self.__record_usage(handler_participants)
 
         # If the Handler was orphan, then it is no more
         self._orphaned_handlers.discard(handler)
 
+        switchboards = self._participants_index.get(handler_participants, ())
+        if handler._avoided_switchboard is not None:
+            avoided = handler._avoided_switchboard()
+            switchboards = [switchboard for switchboard in switchboards
+                    if switchboard is not avoided]
+
         # Check already open switchboards
-        for switchboard in self._switchboards.keys():
-            switchboard_participants = set(switchboard.participants.values())
-            if handler_participants == switchboard_participants:
+        for switchboard in switchboards:
+            if switchboard in self._switchboards:
                 self._switchboards[switchboard].add(handler)
+                self.__touch(switchboard)
                 handler._switchboard = switchboard
                 return
 
         # Check Orphaned switchboards
-        for switchboard in list(self._orphaned_switchboards):
-            switchboard_participants = set(switchboard.participants.values())
-            if handler_participants == switchboard_participants:
+        for switchboard in switchboards:
+            if switchboard in self._orphaned_switchboards:
                 self._switchboards[switchboard] = set([handler]) #FIXME: WeakSet ?
                 self._orphaned_switchboards.discard(switchboard)
+                self._warm_switchboards.pop(switchboard, None)
+                self.__touch(switchboard)
                 handler._switchboard = switchboard
                 return
 
         # Check being requested switchboards
-        for switchboard, handlers in self._pending_switchboards.iteritems():
-            pending_handler = handlers.pop()
-            handlers.add(pending_handler)
-            switchboard_participants = pending_handler.total_participants
-            if handler_participants == switchboard_participants:
-                self._pending_switchboards[switchboard].add(handler)
-                return
+        switchboard = self._pending_index.get(handler_participants, None)
+        if switchboard is not None:
+            self._pending_switchboards[switchboard].add(handler)
+            return
+
+        # Use an empty switchboard of the pool, the handler invites
+        # its participants once it is attached
+        if len(self._pool) > 0:
+            switchboard = self._pool.pop(0)
+            del self._warm_switchboards[switchboard]
+            self._orphaned_switchboards.discard(switchboard)
+            self._switchboards[switchboard] = set([handler]) #FIXME: WeakSet ?
+            # until they join, match the handlers of the same participants
+            self.__index(switchboard, handler_participants)
+            self.__touch(switchboard)
+            handler._switchboard = switchboard
+            self.fill_pool()
+            return
 
         self._client._protocol.\
                 request_switchboard(priority, self._ns_switchboard_request_response, handler)
@@ -270,11 +555,29 @@ class SwitchboardManager(gobject.GObject):
             handlers.discard(handler)
             if len(handlers) == 0:
                 del self._pending_switchboards[switchboard]
+                self.__unindex_pending(switchboard)
                 self._orphaned_switchboards.add(switchboard)
 
     def _ns_switchboard_request_response(self, session, handler):
+        if session is None:
+            # the next message of the handler requests a switchboard again
+            handler._switchboard_requested = False
+            return
         switchboard = self._build_switchboard(session)
         self._pending_switchboards[switchboard] = set([handler]) #FIXME: WeakSet ?
+        key = frozenset(handler.total_participants)
+        if key not in self._pending_index:
+            self._pending_index[key] = switchboard
+            self._pending_participants[switchboard] = key
+
+    def _ns_warm_switchboard_response(self, session, contact):
+        if contact not in self._warm_requests:
+            return # requested before close()
+        self._warm_requests.remove(contact)
+        if session is None:
+            return
+        switchboard = self._build_switchboard(session)
+        self._warm_switchboards[switchboard] = contact
 
     def _ns_switchboard_invite(self, protocol, session, inviter):
         switchboard = self._build_switchboard(session)
@@ -291,6 +594,11 @@ class SwitchboardManager(gobject.GObject):
                 session_id, key, proxies)
         switchboard.connect("notify::state", self._sb_state_changed)
         switchboard.connect("message-received", self._sb_message_received)
+        switchboard.connect("message-sent",
+                lambda sb, message: self.__touch(sb))
+        switchboard.connect("user-joined", self._sb_user_joined)
+        switchboard.connect("user-left", self._sb_user_left)
+        self.__index(switchboard, frozenset())
         transport.establish_connection()
         return switchboard
 
@@ -298,6 +606,8 @@ class SwitchboardManager(gobject.GObject):
         state = switchboard.state
         if state == msnp.ProtocolState.OPEN:
             self._switchboards[switchboard] = set() #FIXME: WeakSet ?
+            self.__touch(switchboard)
+            self.__enforce_max_switchboards(switchboard)
 
             # Requested switchboards
             if switchboard in self._pending_switchboards:
@@ -310,10 +620,11 @@ class SwitchboardManager(gobject.GObject):
                     except KeyError:
                         break
                 del self._pending_switchboards[switchboard]
-            
+                self.__unindex_pending(switchboard)
+
             # Orphaned Handlers
+            switchboard_participants = self._switchboard_participants[switchboard]
             for handler in list(self._orphaned_handlers):
-                switchboard_participants = set(switchboard.participants.values())
                 handler_participants = handler.total_participants
                 if handler_participants == switchboard_participants:
                     self._switchboards[switchboard].add(handler)
@@ -326,23 +637,88 @@ class SwitchboardManager(gobject.GObject):
                 del self._switchboards[switchboard]
                 self._orphaned_switchboards.add(switchboard)
 
+                # opened in advance
+                if switchboard in self._warm_switchboards:
+                    contact = self._warm_switchboards[switchboard]
+                    if contact is None:
+                        self._pool.append(switchboard)
+                    else:
+                        switchboard.invite_user(contact)
+            else:
+                self._warm_switchboards.pop(switchboard, None)
+
         elif state == msnp.ProtocolState.CLOSED:
-            if switchboard in self._switchboards.keys():
+            if switchboard in self._switchboards:
                 for handler in self._switchboards[switchboard]:
                     self._orphaned_handlers.add(handler)
                 del self._switchboards[switchboard]
+            if switchboard in self._pending_switchboards:
+                del self._pending_switchboards[switchboard]
+                self.__unindex_pending(switchboard)
             self._orphaned_switchboards.discard(switchboard)
+            self.__unindex(switchboard)
+            self._switchboards_activity.pop(switchboard, None)
+            if switchboard in self._warm_switchboards:
+                del self._warm_switchboards[switchboard]
+                # only replace the pool switchboards the server closed
+                # after they were opened
+                if switchboard in self._pool:
+                    self._pool.remove(switchboard)
+                    self.fill_pool()
+
+    def _sb_user_joined(self, switchboard, contact):
+        if switchboard in self._switchboard_participants:
+            self.__index(switchboard,
+                    frozenset(switchboard.participants.values()))
+
+    def _sb_user_left(self, switchboard, contact):
+        # emitted before the contact is removed from the participants
+        if switchboard in self._switchboard_participants:
+            participants = set(switchboard.participants.values())
+            participants.discard(contact)
+            self.__index(switchboard, frozenset(participants))
+
+    def __index(self, switchboard, participants):
+        self.__unindex(switchboard)
+        self._switchboard_participants[switchboard] = participants
+        self._participants_index.setdefault(participants, set()).\
+                add(switchboard)
+
+    def __unindex(self, switchboard):
+        participants = self._switchboard_participants.pop(switchboard, None)
+        if participants is None:
+            return
+        switchboards = self._participants_index[participants]
+        switchboards.discard(switchboard)
+        if len(switchboards) == 0:
+            del self._participants_index[participants]
+
+    def __unindex_pending(self, switchboard):
+        key = self._pending_participants.pop(switchboard, None)
+        if key is not None:
+            del self._pending_index[key]
 
     def _sb_message_received(self, switchboard, message):
-        switchboard_participants = set(switchboard.participants.values())
-        if switchboard in self._switchboards.keys():
+        self.__touch(switchboard)
+        content_type = message.content_type[0]
+        candidates = self._handlers_by_content_type.get(content_type, [])
+        if self._generic_handlers_class:
+            candidates = candidates + self._generic_handlers_class
+
+        if switchboard in self._switchboards:
             handlers = self._switchboards[switchboard]
-            handlers_class = [type(handler) for handler in handlers]
+            handlers_class = set()
             for handler in list(handlers):
+                handler_class = type(handler)
+                handlers_class.add(handler_class)
+                content_types = handler_class._CONTENT_TYPES
+                if content_types is not None and \
+                        content_type not in content_types:
+                    continue
                 if not handler._can_handle_message(message, handler):
                     continue
                 handler._on_message_received(message)
-            for handler_class, extra_args in self._handlers_class:
+            for handler_class, extra_args in candidates:
                 if handler_class in handlers_class:
                     continue
                 if not handler_class._can_handle_message(message):
@@ -353,14 +729,142 @@ class SwitchboardManager(gobject.GObject):
                 self.emit("handler-created", handler_class, handler)
                 handler._on_message_received(message)
 
-        if switchboard in list(self._orphaned_switchboards):
-            for handler_class, extra_args in self._handlers_class:
+        if switchboard in self._orphaned_switchboards:
+            for handler_class, extra_args in candidates:
                 if not handler_class._can_handle_message(message):
                     continue
                 handler = handler_class(self._client, (), *extra_args)
                 self._switchboards[switchboard] = set([handler]) #FIXME: WeakSet ?
                 self._orphaned_switchboards.discard(switchboard)
+                self._warm_switchboards.pop(switchboard, None)
+                self.__record_usage(self._switchboard_participants[switchboard])
                 handler._switchboard = switchboard
                 self.emit("handler-created", handler_class, handler)
                 handler._on_message_received(message)
 
+    # Switchboards opened in advance
+    def _contact_changed(self, contact, name, *args):
+        """Called by L{Contact<pymsn.profile.Contact>} for the changes of
+        every contact"""
+        if name != "presence" or self.warm_contacts <= 0:
+            return
+        if contact.account not in self._contacts_usage or \
+                contact.presence == profile.Presence.OFFLINE:
+            return
+        if frozenset([contact]) in self._participants_index or \
+                contact in self._warm_requests or \
+                contact in self._warm_switchboards.values():
+            return
+        if contact.account in self.__most_contacted():
+            self.__request_warm_switchboard(contact)
+
+    def __most_contacted(self):
+        if self._most_contacted is None or \
+                self._most_contacted[0] != self.warm_contacts:
+            usage = self._contacts_usage
+            most_contacted = heapq.nlargest(self.warm_contacts, usage,
+                    usage.peek)
+            self._most_contacted = (self.warm_contacts,
+                    frozenset(most_contacted))
+        return self._most_contacted[1]
+
+    def __record_usage(self, participants):
+        for contact in participants:
+            account = contact.account
+            self._contacts_usage[account] = \
+                    self._contacts_usage.get(account, 0) + 1
+        self._most_contacted = None
+
+    def __request_warm_switchboard(self, contact):
+        if self._client._protocol.state != msnp.ProtocolState.OPEN:
+            return False
+        if len(self._warm_switchboards) + len(self._warm_requests) >= \
+                self.warm_budget:
+            return False
+        # never at the expense of a switchboard in use
+        if self.max_switchboards > 0:
+            opened = set(self._switchboards_activity)
+            opened.update(self._warm_switchboards)
+            if len(opened) + len(self._warm_requests) >= \
+                    self.max_switchboards:
+                return False
+        self._warm_requests.append(contact)
+        # after the switchboards needed right now
+        self._client._protocol.request_switchboard(self.WARM_PRIORITY,
+                self._ns_warm_switchboard_response, contact)
+        return True
+
+    # Idle switchboards
+    def __touch(self, switchboard):
+        if switchboard not in self._switchboard_participants:
+            return # already closed
+        self._switchboards_activity[switchboard] = time.time()
+        if self.idle_timeout > 0 and self._reaper_source is None:
+            self._reaper_source = gobject.timeout_add(
+                    self.idle_timeout * 1000, self.__reap_idle_switchboards)
+
+    def __reap_idle_switchboards(self):
+        self._reaper_source = None
+        if self.idle_timeout <= 0:
+            return False
+        now = time.time()
+        next_deadline = None
+        for switchboard in list(self._switchboards_activity):
+            if switchboard in self._warm_switchboards:
+                continue # the pool is idle on purpose
+            deadline = self._switchboards_activity.peek(switchboard) + \
+                    self.idle_timeout
+            if deadline > now:
+                # the following ones were active more recently
+                next_deadline = deadline
+                break
+            self._close_switchboard(switchboard)
+        if next_deadline is not None:
+            self._reaper_source = gobject.timeout_add(
+                    int((next_deadline - now) * 1000) + 1,
+                    self.__reap_idle_switchboards)
+        return False
+
+    def __enforce_max_switchboards(self, opened):
+        if self.max_switchboards <= 0:
+            return
+        candidates = [switchboard for switchboard in
+                self._switchboards_activity if switchboard is not opened]
+        # the switchboards no handler uses go first, the warm and pool
+        # ones included, least recently used first
+        candidates.sort(key=lambda sb: sb in self._switchboards)
+        excess = len(self._switchboards_activity) - self.max_switchboards
+        for switchboard in candidates[:max(excess, 0)]:
+            logger.info("Too many switchboards open, closing the least "
+                    "recently used one")
+            self._close_switchboard(switchboard)
+
+    def _detach_handler(self, handler, switchboard):
+        """Detaches the handler from the switchboard so that it requests a
+        new one, the switchboard is only left if no other handler uses it"""
+        handlers = self._switchboards.get(switchboard, None)
+        if handlers is None or handler not in handlers:
+            return
+        handlers.discard(handler)
+        handler._detach_switchboard()
+        if len(handlers) == 0:
+            self._close_switchboard(switchboard)
+
+    def _close_switchboard(self, switchboard):
+        """Leaves the switchboard, its handlers are detached so that they
+        request a new one when they need it"""
+        if switchboard not in self._switchboard_participants or \
+                switchboard.state != msnp.ProtocolState.OPEN:
+            return # already closed or being closed
+        handlers = self._switchboards.pop(switchboard, ())
+        for handler in handlers:
+            handler._detach_switchboard()
+            self._orphaned_handlers.add(handler)
+        self._orphaned_switchboards.discard(switchboard)
+        self.__unindex(switchboard)
+        self._switchboards_activity.pop(switchboard, None)
+        if switchboard in self._warm_switchboards:
+            del self._warm_switchboards[switchboard]
+            if switchboard in self._pool:
+                self._pool.remove(switchboard)
+        switchboard.leave()
@@ -0,0 +1,54 @@
+import pymsn.msnp as msnp
+from pymsn.conversation import AbstractConversation, ConversationMessage
+
+class _Contact(object):
+    account = "contact@hotmail.com"
+    display_name = "Contact"
+
+class _Client(object):
+    profile = _Contact()
+
+class _Conversation(AbstractConversation):
+    MAX_CHUNK_SIZE = 1400
+
+    def __init__(self):
+        AbstractConversation.__init__(self, _Client())
+        self.participants = set()
+        self.sent = []
+        self.received = []
+
+    def _send_message(self, content_type, body, headers={},
+            ack=msnp.MessageAcknowledgement.HALF):
+        # built like SwitchboardClient._send_message
+        message = msnp.Message(self._client.profile)
+        for key, value in headers.iteritems():
+            message.add_header(key, value)
+        if content_type is not None:
+            message.content_type = content_type
+        message.body = body
+        self.sent.append(message)
+
+    def _dispatch(self, name, *args):
+        if name == "on_conversation_message_received":
+            self.received.append(args[1])
+
+def test_chunked_message_round_trip():
+    conversation = _Conversation()
+    content = u"".join([unichr(0x41 + i % 26) for i in range(4000)])
+    conversation.send_text_message(ConversationMessage(content))
+    assert len(conversation.sent) == 3
+
+    for message in conversation.sent:
+        payload = str(message)
+        assert "MIME-Version: 1.0" in payload or \
+                "Content-Type" in payload
+        received = msnp.Message(_Contact(), payload)
+        assert repr(received)
+        conversation._on_message_received(received)
+
+    assert len(conversation.received) == 1
+    assert conversation.received[0].content == content
+
+def test_continuation_chunk_repr():
+    message = msnp.Message(None, "Message-ID: {x}\r\nChunk: 1\r\n\r\nabc")
+    assert "abc" in repr(message)
@@ -0,0 +1,34 @@
+import time
+
+import pymsn.transport as transport
+from pymsn.msnp.command import Command
+
+class _Transport(transport.BaseTransport):
+    def __init__(self):
+        transport.BaseTransport.__init__(self, ("localhost", 1863))
+        self.written = []
+
+    def _write_command(self, command, callback, cb_args):
+        self.written.append(command.name)
+
+def _command(name, payload=None):
+    command = Command()
+    command.build(name, 0, payload)
+    return command
+
+def test_send_order_when_throttled():
+    connection = _Transport()
+    connection.command_bucket = transport.TokenBucket(1000, 1)
+    connection.command_bucket.consume()
+    connection.send_command(_command('OUT'))
+    connection.send_command(_command('MSG',
+        'MIME-Version: 1.0\r\nContent-Type: application/x-msnmsgrp2p\r\n\r\n'))
+    connection.send_command(_command('ADL', '<ml/>'))
+    connection.send_command(_command('CHG'))
+    connection.send_command(_command('PNG'))
+    while connection.queue_depth > 0:
+        time.sleep(0.002)
+        connection._process_send_queues()
+    # the login ADL stays ahead of the CHG, the logout is sent last
+    assert connection.written == ['PNG', 'ADL', 'CHG', 'MSG', 'OUT']
+    assert connection.throttled_time > 0
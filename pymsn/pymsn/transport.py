@@ -35,9 +35,10 @@ import gnet.protocol
 import msnp
 
 import logging
+import time
 import gobject
 
-__all__=['ServerType', 'DirectConnection']
+__all__=['ServerType', 'SendPriority', 'TokenBucket', 'DirectConnection']
 
 logger = logging.getLogger('Transport')
 
@@ -46,6 +47,75 @@ class ServerType(object):
     SWITCHBOARD = 'SB'
     NOTIFICATION = 'NS'
 
+class SendPriority(object):
+    """Lanes of the outgoing commands, the commands of a lane are only
+    sent once the lanes before it are empty"""
+    URGENT = 0
+    """Keep alive, login and challenges"""
+    INTERACTIVE = 1
+    """Chat messages, membership lists, profile updates and everything
+    else, in order: the server expects the first ADL before the CHG"""
+    BULK = 2
+    """P2P data"""
+    LAST = 3
+    """Logout, sent once everything queued before it was sent"""
+
+    URGENT_COMMANDS = ('PNG', 'QRY', 'VER', 'CVR', 'USR', 'ANS')
+    LAST_COMMANDS = ('OUT',)
+
+    @staticmethod
+    def of_command(command):
+        if command is None:
+            return SendPriority.URGENT # HTTP polling
+        name = command.name
+        if name in SendPriority.URGENT_COMMANDS:
+            return SendPriority.URGENT
+        elif name in SendPriority.LAST_COMMANDS:
+            return SendPriority.LAST
+        elif name == 'MSG':
+            payload = command.payload
+            if isinstance(payload, basestring):
+                p2p = 'application/x-msnmsgrp2p' in payload[:256]
+            else:
+                p2p = payload.content_type[0] == 'application/x-msnmsgrp2p'
+            if p2p:
+                return SendPriority.BULK
+        return SendPriority.INTERACTIVE
+
+
+class TokenBucket(object):
+    """Allows rate units per second on average, with bursts of up to
+    capacity units"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        if capacity is None:
+            capacity = rate
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._last_update = time.time()
+
+    def __refill(self):
+        now = time.time()
+        self._tokens = min(self.capacity,
+                self._tokens + (now - self._last_update) * self.rate)
+        self._last_update = now
+
+    def delay(self, amount=1):
+        """Returns the number of seconds to wait before amount units can
+        be consumed"""
+        self.__refill()
+        # larger than a burst, wait for a full bucket
+        amount = min(amount, self.capacity)
+        if self._tokens >= amount:
+            return 0
+        return (amount - self._tokens) / self.rate
+
+    def consume(self, amount=1):
+        self.__refill()
+        self._tokens -= amount
+
+
 TransportError = gnet.IoError
 
 class BaseTransport(gobject.GObject):
@@ -70,6 +140,29 @@ class BaseTransport(gobject.GObject):
         @ivar transaction_id: the current transaction ID
         @type transaction_id: integer
 
+        @ivar command_bucket: limits the number of commands sent per second,
+            None for no limit
+        @type command_bucket: L{TokenBucket}
+
+        @ivar byte_bucket: limits the number of bytes sent per second, None
+            for no limit
+        @type byte_bucket: L{TokenBucket}
+
+        @ivar queue_depth: the number of commands waiting to be sent
+        @type queue_depth: integer
+
+        @ivar throttled_time: the number of seconds the commands waited for
+            the rate limits
+        @type throttled_time: float
+
+        @cvar COMMAND_RATES: server type => (commands per second, burst)
+            used to build the command bucket of the new transports
+        @cvar BYTE_RATES: server type => (bytes per second, burst) used to
+            build the byte bucket of the new transports
+        @cvar switchboards_bucket: limits the number of commands sent per
+            second by all the switchboard connections together, None for no
+            limit
+        @type switchboards_bucket: L{TokenBucket}
 
         @cvar connection-failure: signal emitted when the connection fails
         @type connection-failure: ()
@@ -119,6 +212,10 @@ class BaseTransport(gobject.GObject):
                 (object,)),
             }   
 
+    COMMAND_RATES = {}
+    BYTE_RATES = {}
+    switchboards_bucket = None
+
     def __init__(self, server, server_type=ServerType.NOTIFICATION, proxies={}):
         """Connection initialization
         
@@ -136,6 +233,18 @@ class BaseTransport(gobject.GObject):
         self.server_type = server_type
         self.proxies = proxies
         self._transaction_id = 0
+
+        self.command_bucket = None
+        if server_type in self.COMMAND_RATES:
+            self.command_bucket = TokenBucket(*self.COMMAND_RATES[server_type])
+        self.byte_bucket = None
+        if server_type in self.BYTE_RATES:
+            self.byte_bucket = TokenBucket(*self.BYTE_RATES[server_type])
+        self._send_queues = ([], [], [], [])
+        self.queue_depth = 0
+        self.throttled_time = 0.0
+        self.__throttled_since = None
+        self.__throttle_source = None
    
     @property
     def transaction_id(self):
@@ -163,6 +272,9 @@ class BaseTransport(gobject.GObject):
         """
         Sends a L{msnp.Command} to the server.
 
+        The command is queued in the lane of its L{SendPriority} and sent
+        as soon as the rate limits allow it.
+
             @param command: command to send
             @type command: L{msnp.Command}
 
@@ -176,8 +288,75 @@ class BaseTransport(gobject.GObject):
             @param cb_args: callback arguments
             @type cb_args: Any, ...
         """
+        lane = SendPriority.of_command(command)
+        self._send_queues[lane].append((command, callback, cb_args))
+        self.queue_depth += 1
+        if increment:
+            self._increment_transaction_id()
+        if self.__throttle_source is None:
+            self._process_send_queues()
+
+    def _write_command(self, command, callback, cb_args):
+        """Actually sends the command, called once the rate limits allow
+        it"""
         raise NotImplementedError
 
+    def _process_send_queues(self):
+        self.__throttle_source = None
+        if self.__throttled_since is not None:
+            self.throttled_time += time.time() - self.__throttled_since
+            self.__throttled_since = None
+
+        buckets = []
+        if self.command_bucket is not None:
+            buckets.append((self.command_bucket, False))
+        if self.server_type == ServerType.SWITCHBOARD and \
+                self.switchboards_bucket is not None:
+            buckets.append((self.switchboards_bucket, False))
+        if self.byte_bucket is not None:
+            buckets.append((self.byte_bucket, True))
+
+        while self.queue_depth > 0:
+            for queue in self._send_queues:
+                if len(queue) > 0:
+                    break
+            command, callback, cb_args = queue[0]
+            if len(buckets) > 0:
+                size = 0
+                if self.byte_bucket is not None and command is not None:
+                    size = len(str(command))
+                delay = 0
+                for bucket, counts_bytes in buckets:
+                    if counts_bytes:
+                        delay = max(delay, bucket.delay(size))
+                    else:
+                        delay = max(delay, bucket.delay())
+                if delay > 0:
+                    self.__throttled_since = time.time()
+                    self.__throttle_source = gobject.timeout_add(
+                            int(delay * 1000) + 1, self._process_send_queues)
+                    return False
+                for bucket, counts_bytes in buckets:
+                    if counts_bytes:
+                        bucket.consume(size)
+                    else:
+                        bucket.consume()
+            del queue[0]
+            self.queue_depth -= 1
+            self._write_command(command, callback, cb_args)
+        return False
+
+    def _clear_send_queues(self):
+        for queue in self._send_queues:
+            del queue[:]
+        self.queue_depth = 0
+        if self.__throttle_source is not None:
+            gobject.source_remove(self.__throttle_source)
+            self.__throttle_source = None
+        if self.__throttled_since is not None:
+            self.throttled_time += time.time() - self.__throttled_since
+            self.__throttled_since = None
+
     def send_command_ex(self, command, arguments=(), payload=None, 
             increment=True, callback=None, *cb_args):
         """
@@ -250,6 +429,7 @@ class DirectConnection(BaseTransport):
         self._transport.open()
 
     def lose_connection(self):
+        self._clear_send_queues()
         self._transport.close()
         if self.__png_timeout is not None:
             gobject.source_remove(self.__png_timeout)
@@ -267,12 +447,10 @@ class DirectConnection(BaseTransport):
         self._transport.close()
         self._transport.open()
 
-    def send_command(self, command, increment=True, callback=None, *cb_args):
+    def _write_command(self, command, callback, cb_args):
         logger.debug('>>> ' + repr(command))
         our_cb_args = (command, callback, cb_args)
         self._transport.send(str(command), self.__on_command_sent, *our_cb_args)
-        if increment:
-            self._increment_transaction_id()
 
     def enable_ping(self):
         cmd = msnp.Command()
@@ -371,6 +549,7 @@ class HTTPPollConnection(BaseTransport):
         self.emit("connection-success")
 
     def lose_connection(self):
+        self._clear_send_queues()
         gobject.source_remove(self._polling_source_id)
         del self._polling_source_id
         if not self.__error:
@@ -382,8 +561,9 @@ class HTTPPollConnection(BaseTransport):
             self._target_server = server
         self.emit("connection-reset")
 
-    def send_command(self, command, increment=True, callback=None, *cb_args):
-        self._command_queue.append((command, increment, callback, cb_args))
+    def _write_command(self, command, callback, cb_args):
+        # the transaction id was incremented when the command was queued
+        self._command_queue.append((command, False, callback, cb_args))
         self._send_command()
 
     def _send_command(self):
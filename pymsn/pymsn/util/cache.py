@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+#
+# pymsn - a python client library for Msn
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+"""Bounded caches"""
+
+__all__ = ['LRUCache']
+
+_PREV, _NEXT, _KEY, _VALUE = range(4)
+
+class LRUCache(object):
+    """Mapping holding at most max_size items, the least recently used
+    item being dropped when a new one is added to a full cache"""
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._links = {}
+        # circular doubly linked list, the head is the least recently used
+        self._root = root = []
+        root[:] = [root, root, None, None]
+
+    def __len__(self):
+        return len(self._links)
+
+    def __contains__(self, key):
+        return key in self._links
+
+    def __iter__(self):
+        """Iterates over the keys, least recently used first"""
+        root = self._root
+        link = root[_NEXT]
+        while link is not root:
+            yield link[_KEY]
+            link = link[_NEXT]
+
+    def get(self, key, default=None):
+        link = self._links.get(key, None)
+        if link is None:
+            return default
+        self.__move_to_end(link)
+        return link[_VALUE]
+
+    def peek(self, key, default=None):
+        """Returns the value of key without marking it as recently used"""
+        link = self._links.get(key, None)
+        if link is None:
+            return default
+        return link[_VALUE]
+
+    def __getitem__(self, key):
+        link = self._links[key]
+        self.__move_to_end(link)
+        return link[_VALUE]
+
+    def __setitem__(self, key, value):
+        link = self._links.get(key, None)
+        if link is not None:
+            link[_VALUE] = value
+            self.__move_to_end(link)
+            return
+        while len(self._links) >= self.max_size > 0:
+            self.pop_oldest()
+        root = self._root
+        last = root[_PREV]
+        link = [last, root, key, value]
+        last[_NEXT] = root[_PREV] = link
+        self._links[key] = link
+
+    def __delitem__(self, key):
+        link = self._links.pop(key)
+        link[_PREV][_NEXT] = link[_NEXT]
+        link[_NEXT][_PREV] = link[_PREV]
+
+    def pop(self, key, *default):
+        if key not in self._links:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        value = self._links[key][_VALUE]
+        del self[key]
+        return value
+
+    def pop_oldest(self):
+        """Removes the least recently used item and returns it as a
+        (key, value) tuple"""
+        link = self._root[_NEXT]
+        if link is self._root:
+            raise KeyError("cache is empty")
+        del self[link[_KEY]]
+        return link[_KEY], link[_VALUE]
+
+    def clear(self):
+        self._links.clear()
+        root = self._root
+        root[:] = [root, root, None, None]
+
+    def __move_to_end(self, link):
+        root = self._root
+        if link[_NEXT] is root:
+            return
+        link[_PREV][_NEXT] = link[_NEXT]
+        link[_NEXT][_PREV] = link[_PREV]
+        last = root[_PREV]
+        link[_PREV] = last
+        link[_NEXT] = root
+        last[_NEXT] = root[_PREV] = link
@@ -31,6 +31,7 @@ except ImportError:
 __all__ = ["XMLTYPE", "XMLResponse"]
 
 import iso8601
+import re
 
 class XMLTYPE(object):
 
@@ -70,10 +71,33 @@ class XMLTYPE(object):
             result = iso8601.parse_date(date_str.strip())
             return result.replace(tzinfo=None) # FIXME: do not disable the timezone
 
+_path_caches = {}
+
+_namespace_regex = re.compile(r"\{[^}]*\}")
+_path_chars_regex = re.compile(r"[/*\[@.]")
+
+def _path_cache(ns_shorthands):
+    """Returns the compiled paths cache shared by all the elements using
+    the given namespace shorthands"""
+    key = tuple(sorted(ns_shorthands.iteritems()))
+    cache = _path_caches.get(key, None)
+    if cache is None:
+        cache = {}
+        _path_caches[key] = cache
+    return cache
+
 class _Element(object):
-    def __init__(self, element, ns_shorthands):
+    __slots__ = ('element', 'ns_shorthands', '_paths')
+
+    MAX_CACHED_PATHS = 512
+
+    def __init__(self, element, ns_shorthands, paths=None):
         self.element = element
-        self.ns_shorthands = ns_shorthands.copy()
+        # shared between all the elements of a tree, never modified
+        self.ns_shorthands = ns_shorthands
+        if paths is None:
+            paths = _path_cache(ns_shorthands)
+        self._paths = paths
 
     def __getattr__(self, name):
         return getattr(self.element, name)
@@ -83,7 +107,7 @@ class _Element(object):
 
     def __iter__(self):
         for node in self.element:
-            yield _Element(node, self.ns_shorthands)
+            yield _Element(node, self.ns_shorthands, self._paths)
 
     def __contains__(self, node):
         return node in self.element
@@ -92,33 +116,53 @@ class _Element(object):
         return "<Element name=\"%s\">" % (self.element.tag,)
 
     def _process_path(self, path):
+        try:
+            return self._paths[path]
+        except KeyError:
+            pass
+        result = path
         for sh, ns in self.ns_shorthands.iteritems():
-            path = path.replace("/%s:" % sh, "/{%s}" % ns)
-            if path.startswith("%s:" % sh):
-                path = path.replace("%s:" % sh, "{%s}" % ns, 1)
-        return path
+            result = result.replace("/%s:" % sh, "/{%s}" % ns)
+            if result.startswith("%s:" % sh):
+                result = result.replace("%s:" % sh, "{%s}" % ns, 1)
+        # a lone child tag is matched by cElementTree itself, without going
+        # through ElementPath
+        if result.startswith("./"):
+            tag = result[2:]
+            if tag and \
+                    not _path_chars_regex.search(_namespace_regex.sub("", tag)):
+                result = tag
+        if len(self._paths) >= self.MAX_CACHED_PATHS:
+            self._paths.clear()
+        self._paths[path] = result
+        return result
 
     def find(self, path):
-        path = self._process_path(path)
-        node = self.element.find(path)
+        node = self.element.find(self._process_path(path))
         if node is None:
             return None
-        return _Element(node, self.ns_shorthands)
+        return _Element(node, self.ns_shorthands, self._paths)
 
     def findall(self, path):
-        path = self._process_path(path)
-        
-        result = []
-        nodes = self.element.findall(path)
-        for node in nodes:
-            result.append(_Element(node, self.ns_shorthands))
+        nodes = self.element.findall(self._process_path(path))
+        ns_shorthands = self.ns_shorthands
+        paths = self._paths
+        return [_Element(node, ns_shorthands, paths) for node in nodes]
+
+    def children_text(self):
+        """Returns a dict mapping the tags of the children of this element,
+        without their namespace, to their text"""
+        result = {}
+        for node in self.element:
+            tag = node.tag
+            result[tag[tag.find("}") + 1:]] = node.text
         return result
 
     def findtext(self, path, type=None):
-        result = self.find(path)
-        if result is None:
+        node = self.element.find(self._process_path(path))
+        if node is None:
             return ""
-        result = result.text
+        result = node.text
         
         if type is None:
             return result
@@ -127,9 +171,10 @@ class _Element(object):
 class XMLResponse(object):
 
     def __init__(self, data, ns_shorthands={}):
+        self._ns_shorthands = ns_shorthands.copy()
         try:
             tree = self._parse(data)
-            self.tree = _Element(tree, ns_shorthands)
+            self.tree = _Element(tree, self._ns_shorthands)
         except:
             self.tree = None
 
@@ -148,5 +193,9 @@ class XMLResponse(object):
     def is_valid(self):
         return self.tree is not None
 
+    def _element(self, element):
+        """Wraps an element of the response being parsed"""
+        return _Element(element, self._ns_shorthands)
+
     def _parse(self, data):
         pass